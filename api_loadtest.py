@@ -0,0 +1,147 @@
+"""
+Kiểm thử tải cho api_server.py bằng client asyncio cục bộ.
+
+    python api_loadtest.py                          # tự chạy server trên CSDL tạm
+    python api_loadtest.py --url http://127.0.0.1:8765 --concurrency 200 --requests 5000
+
+Trộn truy vấn theo khoảng thời gian (GET /events?start&end) với thêm sự kiện
+(POST /events dạng JSON, không qua NLP), đồng thời đo độ trễ /health để kiểm tra
+vòng lặp sự kiện không bị chặn khi tải cao.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import database as db
+from api_server import ApiServer
+
+class _Connection:
+    """Kết nối HTTP/1.1 keep-alive tối giản."""
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self.writer.write(head.encode('latin-1') + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''): break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.lower() == 'content-length': length = int(value)
+        if length: await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer: self.writer.close()
+
+def _percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def _random_request(base):
+    start = base + timedelta(days=random.randint(0, 60), hours=random.randint(0, 23))
+    if random.random() < 0.7:
+        end = start + timedelta(days=random.choice((1, 7, 30)))
+        return 'GET', f"/events?start={start.isoformat()}&end={end.isoformat()}", None
+    return 'POST', "/events", {
+        "event": f"Sự kiện tải {random.randint(1, 10**6)}",
+        "start_time": start.isoformat(),
+        "end_time": (start + timedelta(minutes=random.choice((30, 60, 90)))).isoformat(),
+        "reminder_minutes": random.choice((None, 15, 30)),
+    }
+
+async def run_load(host, port, total_requests, concurrency):
+    base = datetime.now().replace(minute=0, second=0, microsecond=0)
+    latencies, errors = [], 0
+    remaining = iter(range(total_requests))
+
+    async def worker():
+        nonlocal errors
+        conn = _Connection(host, port)
+        try:
+            for _ in remaining:
+                method, path, payload = _random_request(base)
+                t0 = time.perf_counter()
+                try:
+                    status = await conn.request(method, path, payload)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn.close()
+                    conn = _Connection(host, port)
+                    status = 0
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if status >= 400 or status == 0: errors += 1
+        finally:
+            conn.close()
+
+    health = []
+    async def probe():
+        # Đo độ trễ /health trong lúc tải: nếu vòng lặp bị chặn, con số này sẽ tăng vọt
+        conn = _Connection(host, port)
+        try:
+            while True:
+                t0 = time.perf_counter()
+                await conn.request('GET', '/health')
+                health.append((time.perf_counter() - t0) * 1000)
+                await asyncio.sleep(0.05)
+        finally:
+            conn.close()
+
+    probe_task = asyncio.create_task(probe())
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t_start
+    probe_task.cancel()
+    await asyncio.gather(probe_task, return_exceptions=True)
+
+    print(f"Requests: {len(latencies)}, lỗi: {errors}, đồng thời: {concurrency}")
+    print(f"Thời gian: {elapsed:.2f}s, thông lượng: {len(latencies) / elapsed:.0f} req/s")
+    print(f"Độ trễ (ms): p50={_percentile(latencies, 50):.1f} p95={_percentile(latencies, 95):.1f} "
+          f"p99={_percentile(latencies, 99):.1f} max={max(latencies, default=0):.1f}")
+    print(f"/health khi tải (ms): p50={_percentile(health, 50):.1f} p99={_percentile(health, 99):.1f}")
+    return errors
+
+async def main_async(args):
+    if args.url:
+        url = urlsplit(args.url)
+        return await run_load(url.hostname, url.port or 80, args.requests, args.concurrency)
+
+    # Tự chạy server trong cùng tiến trình trên một CSDL tạm
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_NAME = os.path.join(tmp, "loadtest.db")
+        server = ApiServer(port=0)
+        await server.start()
+        try:
+            return await run_load(server.host, server.port, args.requests, args.concurrency)
+        finally:
+            await server.stop()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Kiểm thử tải cho API server")
+    parser.add_argument("--url", help="Địa chỉ server đang chạy (mặc định: tự chạy server trên CSDL tạm)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args(argv)
+    errors = asyncio.run(main_async(args))
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
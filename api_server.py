@@ -0,0 +1,385 @@
+"""
+Máy chủ HTTP/JSON cục bộ (asyncio) để các công cụ khác tạo và truy vấn nhắc nhở
+mà không cần giao diện Tk.
+
+    python api_server.py --port 8765
+
+Các endpoint:
+    GET    /health
+    GET    /events?start=ISO&end=ISO&search=...   Danh sách / truy vấn theo khoảng thời gian
+    POST   /events                                {"prompt": "..."} hoặc {"event": ..., "start_time": ...}
+                                                  (kèm "calendar_id" để thêm vào một lịch cụ thể)
+    POST   /parse                                 {"prompt": "..."} -> chỉ phân tích, không lưu
+    GET    /events/{id}
+    PUT    /events/{id}
+    DELETE /events/{id}
+    GET    /reminders/stream                      Server-sent events: nhắc nhở đến hạn
+    GET    /archive?search=...&start=ISO&end=ISO  Tìm trong mục lưu trữ (sự kiện cũ)
+
+Các endpoint /events nhận thêm ?calendar_id=N để chỉ thao tác trên một lịch.
+
+Công việc CSDL chạy trên ThreadPoolExecutor có giới hạn, NLP (underthesea) chạy trên
+ProcessPoolExecutor, nên vòng lặp sự kiện không bao giờ bị chặn bởi I/O hay CPU.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from zoneinfo import ZoneInfoNotFoundError
+
+import archive
+import database as db
+import time_utils as tu
+from reminder_service import ReminderService, REMINDER_CHECK_INTERVAL_SECONDS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Số thread cho CSDL và số tiến trình cho NLP
+DB_WORKERS = 4
+NLP_WORKERS = 2
+# Số công việc tối đa được xếp hàng cùng lúc cho mỗi executor;
+# request vượt quá sẽ chờ (await) thay vì làm phình hàng đợi của executor
+MAX_PENDING_DB_JOBS = 64
+MAX_PENDING_NLP_JOBS = 16
+# Giới hạn kích thước request
+MAX_HEADER_LINES = 100
+MAX_BODY_BYTES = 1024 * 1024
+# Giữ kết nối SSE sống bằng comment định kỳ
+SSE_KEEPALIVE_SECONDS = 15
+
+logger = logging.getLogger(__name__)
+
+EDITABLE_FIELDS = ('event', 'start_time', 'end_time', 'location', 'reminder_minutes', 'reminder_offsets', 'recurrence', 'exdates', 'calendar_id', 'timezone')
+
+REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 422: "Unprocessable Entity",
+           500: "Internal Server Error"}
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def _run_pipeline(prompt: str, timezone_name: str):
+    """Chạy trong tiến trình con: nạp pipeline NLP một lần cho mỗi tiến trình."""
+    from nlp_pipeline import pipeline_
+    if timezone_name != tu.TIMEZONE: tu.set_timezone(timezone_name)
+    return pipeline_(prompt)
+
+class _BroadcastSink:
+    """Sink cho ReminderService: chuyển nhắc nhở từ thread kiểm tra sang các client SSE."""
+    def __init__(self, loop, subscribers):
+        self.loop = loop
+        self.subscribers = subscribers
+
+    def notify(self, event):
+        for subscriber in list(self.subscribers):
+            self.loop.call_soon_threadsafe(subscriber.put_nowait, event)
+
+class ApiServer:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, db_workers=DB_WORKERS, nlp_workers=NLP_WORKERS,
+                 reminder_interval=REMINDER_CHECK_INTERVAL_SECONDS):
+        self.host = host
+        self.port = port
+        self.db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="db")
+        self.nlp_workers = nlp_workers
+        self._nlp_executor = None
+        self.reminder_interval = reminder_interval
+        self.subscribers = set()
+        self.connections = {}
+        self.server = None
+        self._db_slots = None
+        self._nlp_slots = None
+        self._reminder_task = None
+        self._maintenance_task = None
+
+    # --- Chạy công việc nặng ngoài vòng lặp sự kiện ---
+
+    async def run_db(self, func, *args):
+        async with self._db_slots:
+            return await asyncio.get_running_loop().run_in_executor(self.db_executor, func, *args)
+
+    async def run_nlp(self, prompt):
+        if self._nlp_executor is None:
+            self._nlp_executor = ProcessPoolExecutor(max_workers=self.nlp_workers)
+        async with self._nlp_slots:
+            return await asyncio.get_running_loop().run_in_executor(self._nlp_executor, _run_pipeline, prompt, tu.TIMEZONE)
+
+    # --- Vòng đời ---
+
+    async def start(self):
+        self._db_slots = asyncio.Semaphore(MAX_PENDING_DB_JOBS)
+        self._nlp_slots = asyncio.Semaphore(MAX_PENDING_NLP_JOBS)
+        await self.run_db(db.init_db)
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self._reminder_task = asyncio.create_task(self.reminder_loop())
+        self._maintenance_task = asyncio.create_task(self.maintenance_loop())
+        logger.info(f"API server đang chạy tại http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self._reminder_task: self._reminder_task.cancel()
+        if self._maintenance_task: self._maintenance_task.cancel()
+        if self.server:
+            self.server.close()
+            # Đóng các kết nối keep-alive còn mở để handler tự kết thúc
+            handlers = list(self.connections.values())
+            for writer in list(self.connections): writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+            await self.server.wait_closed()
+        self.db_executor.shutdown(wait=False)
+        if self._nlp_executor: self._nlp_executor.shutdown(wait=False)
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def reminder_loop(self):
+        """Kiểm tra nhắc nhở định kỳ (trên thread CSDL) và phát tới các client SSE."""
+        service = ReminderService([_BroadcastSink(asyncio.get_running_loop(), self.subscribers)])
+        while True:
+            # Chỉ kiểm tra (và đánh dấu đã nhắc) khi có người nghe
+            if self.subscribers:
+                try:
+                    await self.run_db(service.check_once)
+                except Exception as e:
+                    logger.error(f"Lỗi kiểm tra nhắc nhở: {e}")
+            await asyncio.sleep(self.reminder_interval)
+
+    async def maintenance_loop(self):
+        """Lưu trữ sự kiện cũ và thu gọn CSDL định kỳ (trên thread CSDL)."""
+        while True:
+            try:
+                await self.run_db(archive.run_maintenance)
+            except Exception as e:
+                logger.error(f"Lỗi bảo trì CSDL: {e}")
+            await asyncio.sleep(archive.MAINTENANCE_INTERVAL_SECONDS)
+
+    # --- HTTP ---
+
+    async def handle_connection(self, reader, writer):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None: break
+                method, path, query, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if method == 'GET' and path == '/reminders/stream':
+                    await self.stream_reminders(writer)
+                    break
+                try:
+                    status, payload = await self.dispatch(method, path, query, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": e.message}
+                except Exception as e:
+                    logger.exception("Lỗi xử lý request")
+                    status, payload = 500, {"error": str(e)}
+                await self.write_json(writer, status, payload, keep_alive)
+                if not keep_alive: break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HttpError as e:
+            await self.write_json(writer, e.status, {"error": e.message}, keep_alive=False)
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line: return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Request line không hợp lệ")
+        headers = {}
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''): break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request quá lớn")
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        return method.upper(), url.path.rstrip('/') or '/', query, headers, body
+
+    async def write_json(self, writer, status, payload, keep_alive=True):
+        body = b'' if status == 204 else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def stream_reminders(self, writer):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n")
+        await writer.drain()
+        subscriber = asyncio.Queue()
+        self.subscribers.add(subscriber)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    writer.write(b": keep-alive\n\n")
+                else:
+                    data = json.dumps(event, ensure_ascii=False)
+                    writer.write(f"event: reminder\ndata: {data}\n\n".encode('utf-8'))
+                await writer.drain()
+        finally:
+            self.subscribers.discard(subscriber)
+
+    # --- Định tuyến ---
+
+    async def dispatch(self, method, path, query, body):
+        parts = path.strip('/').split('/')
+        if path == '/health':
+            return 200, {"status": "ok", "timezone": tu.TIMEZONE}
+        if path == '/parse':
+            if method != 'POST': raise HttpError(405, "Chỉ hỗ trợ POST")
+            return 200, await self.run_nlp(self._require_prompt(self._parse_json(body)))
+        calendar_id = self._calendar_param(query)
+        if path == '/events':
+            if method == 'GET': return 200, await self.list_events(query, calendar_id)
+            if method == 'POST': return await self.create_event(self._parse_json(body), calendar_id)
+            raise HttpError(405, "Chỉ hỗ trợ GET, POST")
+        if path == '/archive':
+            if method != 'GET': raise HttpError(405, "Chỉ hỗ trợ GET")
+            range_start, range_end = self._range_params(query)
+            return 200, await self.run_db(archive.search_archive, query.get('search'), range_start, range_end, calendar_id)
+        if len(parts) == 2 and parts[0] == 'events':
+            try:
+                event_id = int(parts[1])
+            except ValueError:
+                raise HttpError(404, "Không tìm thấy")
+            if method == 'GET':
+                return 200, await self._get_existing(event_id, calendar_id)
+            if method == 'PUT':
+                current = await self._get_existing(event_id, calendar_id)
+                data = self._parse_json(body)
+                updated = {field: data.get(field, current.get(field)) for field in EDITABLE_FIELDS}
+                self._validate_event(updated)
+                try:
+                    await self.run_db(db.update_event, event_id, updated)
+                except sqlite3.IntegrityError as e:
+                    if "UNIQUE" in str(e): raise HttpError(409, "Trùng với một sự kiện khác trong lịch")
+                    raise HttpError(400, f"Không có lịch ID {updated['calendar_id']}")
+                return 200, await self.run_db(db.get_event, event_id)
+            if method == 'DELETE':
+                await self._get_existing(event_id, calendar_id)
+                await self.run_db(db.delete_event, event_id)
+                return 204, None
+            raise HttpError(405, "Chỉ hỗ trợ GET, PUT, DELETE")
+        raise HttpError(404, "Không tìm thấy")
+
+    async def list_events(self, query, calendar_id=None):
+        if query.get('start') or query.get('end'):
+            range_start, range_end = self._range_params(query)
+            range_start = range_start or tu.now_local()
+            range_end = range_end or datetime(9999, 1, 1)
+            events = await self.run_db(db.get_events_in_range, range_start, range_end, calendar_id)
+        else:
+            events = await self.run_db(db.get_all_events, calendar_id)
+        search_text = query.get('search', '').lower().strip()
+        if search_text:
+            events = [e for e in events
+                      if search_text in e['event'].lower() or (e['location'] and search_text in e['location'].lower())]
+        return events
+
+    async def create_event(self, data, calendar_id=None):
+        calendar_id = data.get('calendar_id') or calendar_id
+        if 'prompt' in data:
+            data = await self.run_nlp(self._require_prompt(data))
+            if not (data.get('event') and data.get('start_time')):
+                raise HttpError(422, "Không thể trích xuất sự kiện hoặc thời gian.")
+        event_data = {field: data.get(field) for field in EDITABLE_FIELDS}
+        event_data['calendar_id'] = calendar_id
+        self._validate_event(event_data)
+        try:
+            event_id = await self.run_db(db.add_event, event_data)
+        except sqlite3.IntegrityError:
+            raise HttpError(400, f"Không có lịch ID {calendar_id}")
+        return 201, await self.run_db(db.get_event, event_id)
+
+    async def _get_existing(self, event_id, calendar_id=None):
+        event = await self.run_db(db.get_event, event_id, calendar_id)
+        if event is None: raise HttpError(404, f"Không có sự kiện ID {event_id}")
+        return event
+
+    def _range_params(self, query):
+        try:
+            return (datetime.fromisoformat(query['start']) if query.get('start') else None,
+                    datetime.fromisoformat(query['end']) if query.get('end') else None)
+        except ValueError:
+            raise HttpError(400, "start/end phải ở dạng ISO 8601")
+
+    def _calendar_param(self, query):
+        if not query.get('calendar_id'): return None
+        try:
+            return int(query['calendar_id'])
+        except ValueError:
+            raise HttpError(400, "calendar_id phải là số nguyên")
+
+    def _parse_json(self, body):
+        try:
+            data = json.loads(body.decode('utf-8') or '{}')
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise HttpError(400, "Body không phải JSON hợp lệ")
+        if not isinstance(data, dict): raise HttpError(400, "Body phải là một object JSON")
+        return data
+
+    def _require_prompt(self, data):
+        prompt = data.get('prompt')
+        if not isinstance(prompt, str) or not prompt.strip(): raise HttpError(400, "Thiếu 'prompt'")
+        return prompt
+
+    def _validate_event(self, data):
+        if not data.get('event') or not data.get('start_time'):
+            raise HttpError(400, "Cần có 'event' và 'start_time'")
+        try:
+            datetime.fromisoformat(data['start_time'])
+            if data.get('end_time'): datetime.fromisoformat(data['end_time'])
+        except (TypeError, ValueError):
+            raise HttpError(400, "start_time/end_time phải ở dạng ISO 8601")
+        if data.get('timezone'):
+            try:
+                tu.get_zone(data['timezone'])
+            except (ValueError, ZoneInfoNotFoundError):
+                raise HttpError(400, f"Múi giờ không hợp lệ: {data['timezone']}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Máy chủ HTTP/JSON cục bộ cho Trợ lý Lịch trình")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", default=db.DB_NAME)
+    parser.add_argument("--tz", default=None, help="Múi giờ IANA, VD: Asia/Ho_Chi_Minh")
+    parser.add_argument("--db-workers", type=int, default=DB_WORKERS)
+    parser.add_argument("--nlp-workers", type=int, default=NLP_WORKERS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db.DB_NAME = args.db
+    if args.tz: tu.set_timezone(args.tz)
+    server = ApiServer(args.host, args.port, db_workers=args.db_workers, nlp_workers=args.nlp_workers)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
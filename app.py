@@ -1,16 +1,23 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, simpledialog
 import queue
-import threading
-import time
-import json
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 
+import archive
 import database as db
-from nlp_pipeline import pipeline_, parse_vietnamese_time 
+import import_export
+from calendar_view import CalendarView
+from day_index import DayIndex
+from db_writer import DatabaseWriter
+from event_store import EventStore
+from notification_center import NotificationCenter
+import recurrence as rec
+import time_utils as tu
+from nlp_pipeline import pipeline_, parse_vietnamese_time, extract_recurrence
+from reminder_service import ReminderService, QueueSink
 
-# Kiểm tra định kỳ (mỗi 60 giây)
-REMINDER_CHECK_INTERVAL_SECONDS = 60 
+# Chu kỳ kiểm tra kết quả các lệnh ghi đang chờ (ms)
+WRITE_POLL_MS = 20
 
 class ScheduleApp:
     def __init__(self, root):
@@ -21,8 +28,37 @@ class ScheduleApp:
         # Khởi tạo CSDL
         db.init_db()
 
+        # Mọi thao tác ghi từ giao diện / thread nhắc nhở đi qua một thread ghi duy nhất:
+        # CSDL bận hoặc bị khóa không làm treo giao diện
+        self.writer = DatabaseWriter()
+        self.writer.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        # Lệnh ghi đang chờ: (future, xử lý khi xong, tiêu đề lỗi, dọn trạng thái tạm)
+        self.pending_writes = []
+        self.write_poll_scheduled = False
+        # Thay đổi hiển thị trước khi CSDL xác nhận (optimistic): sự kiện đang thêm,
+        # {id: dữ liệu mới} đang sửa, và (id, occurrence_start hoặc None) đang xóa
+        self.pending_adds = []
+        self.pending_edits = {}
+        self.pending_deletes = set()
+
+        # Bộ nhớ đệm sự kiện dùng chung cho giao diện và thread nhắc nhở.
+        # Thay đổi (kể cả từ thread nhắc nhở hay tiến trình khác) chỉ đánh dấu danh sách cần vẽ lại;
+        # main thread vẽ lại trong vòng kiểm tra định kỳ (Tk không an toàn khi gọi từ thread khác).
+        self.store = EventStore()
+        self.listbox_dirty = False
+        self.store.subscribe(self.on_store_change)
+
         # Queue để giao tiếp thread-safe với UI
         self.reminder_queue = queue.Queue()
+        # Cửa sổ nhắc nhở không chặn, gom các nhắc nhở đến cùng lúc
+        self.notification_center = NotificationCenter(self.root, self.store, self.writer)
+
+        # Danh sách sự kiện đang hiển thị (cùng thứ tự với listbox)
+        self.listbox_events = []
+
+        # Lịch dạng lưới (tạo chỉ mục theo ngày khi mở lần đầu)
+        self.calendar_view = None
 
         # --- Giao diện ---
         main_frame = ttk.Frame(self.root, padding="10")
@@ -52,6 +88,11 @@ class ScheduleApp:
         self.search_entry = ttk.Entry(search_frame, width=30)
         self.search_entry.pack(side=tk.LEFT, padx=(0, 10))
         self.search_entry.bind('<KeyRelease>', self.on_search_change)
+
+        # Tìm cả trong các sự kiện cũ đã được lưu trữ (chỉ khi cần)
+        self.search_archive = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Cả mục lưu trữ", variable=self.search_archive,
+                        command=self.on_search_change).pack(side=tk.LEFT)
         
         # Bộ lọc thời gian
         view_frame = ttk.Frame(filter_frame)
@@ -103,6 +144,12 @@ class ScheduleApp:
         self.export_ics_button = ttk.Button(menu_frame, text="Xuất ICS", command=self.export_ics_handler)
         self.export_ics_button.pack(side=tk.LEFT)
 
+        self.free_slot_button = ttk.Button(menu_frame, text="Tìm giờ trống", command=self.find_free_slot_handler)
+        self.free_slot_button.pack(side=tk.RIGHT)
+
+        self.calendar_button = ttk.Button(menu_frame, text="Xem lịch", command=self.show_calendar_handler)
+        self.calendar_button.pack(side=tk.RIGHT, padx=(0, 5))
+
         # --- Khởi chạy hệ thống ---
         self.load_events_to_listbox()
         
@@ -112,6 +159,9 @@ class ScheduleApp:
         # 6. Bắt đầu kiểm tra queue pop-up
         self.check_reminder_queue()
 
+        # 7. Bảo trì CSDL định kỳ (lưu trữ sự kiện cũ, VACUUM/ANALYZE)
+        archive.MaintenanceService().start()
+
     def add_event_handler(self):
         prompt = self.prompt_entry.get()
         if not prompt:
@@ -123,10 +173,16 @@ class ScheduleApp:
             data = pipeline_(prompt)
             
             if data.get('event') and data.get('start_time'):
-                db.add_event(data)
-                messagebox.showinfo("Thành công", f"Đã thêm sự kiện: '{data['event']}'")
+                if not self.confirm_no_conflict(data):
+                    return
+                rep = f" ({rec.describe_rrule(data['recurrence'])})" if data.get('recurrence') else ""
+                # Hiện ngay trong danh sách (đang lưu), thông báo khi đã ghi xong
+                self.pending_adds.append(data)
+                self.submit_write(self.writer.add_event(data),
+                                  success=lambda _: messagebox.showinfo("Thành công", f"Đã thêm sự kiện: '{data['event']}'{rep}"),
+                                  error_title="Không thể thêm sự kiện",
+                                  cleanup=lambda: self.pending_adds.remove(data))
                 self.prompt_entry.delete(0, tk.END) # Xóa text
-                self.load_events_to_listbox() # Tải lại danh sách
             else:
                 messagebox.showerror("Lỗi NLP", "Không thể trích xuất sự kiện hoặc thời gian.")
         
@@ -138,13 +194,46 @@ class ScheduleApp:
         try:
             selected_index = self.event_listbox.curselection()[0]
             event_string = self.event_listbox.get(selected_index)
+            selected_event = self.listbox_events[selected_index]
+            if selected_event is None:
+                messagebox.showinfo("Đang lưu", "Sự kiện đang được lưu, vui lòng thử lại sau.")
+                return
             
             # Lấy ID từ chuỗi (ví dụ: "ID 1: ...")
             event_id = int(event_string.split(":")[0].replace("ID ", ""))
-            
-            db.delete_event(event_id)
-            messagebox.showinfo("Đã xóa", "Xóa sự kiện thành công.")
-            self.load_events_to_listbox() # Tải lại danh sách
+
+            # Sự kiện đã lưu trữ: xóa hẳn khỏi bảng lưu trữ
+            if selected_event.get('archived_at'):
+                if messagebox.askyesno("Sự kiện đã lưu trữ", "Xóa hẳn sự kiện này khỏi mục lưu trữ?"):
+                    self.submit_write(self.writer.delete_archived(event_id),
+                                      success=lambda _: messagebox.showinfo("Đã xóa", "Đã xóa sự kiện khỏi mục lưu trữ."),
+                                      error_title="Không thể xóa")
+                return
+
+            # Với một lần xảy ra của chuỗi lặp: hỏi xóa riêng lần này hay cả chuỗi
+            if selected_event.get('occurrence_start'):
+                only_this = messagebox.askyesnocancel(
+                    "Sự kiện lặp lại",
+                    "Chỉ xóa lần này?\n(Chọn 'No' để xóa cả chuỗi)"
+                )
+                if only_this is None:
+                    return
+                if only_this:
+                    key = (event_id, selected_event['occurrence_start'])
+                    self.pending_deletes.add(key)
+                    self.submit_write(self.writer.add_exdate(*key),
+                                      success=lambda _: messagebox.showinfo("Đã xóa", "Đã bỏ lần xảy ra này khỏi chuỗi."),
+                                      error_title="Không thể xóa",
+                                      cleanup=lambda: self.pending_deletes.discard(key))
+                    return
+            
+            # Ẩn ngay khỏi danh sách; lỗi khi ghi thì sự kiện hiện lại
+            key = (event_id, None)
+            self.pending_deletes.add(key)
+            self.submit_write(self.writer.delete_event(event_id),
+                              success=lambda _: messagebox.showinfo("Đã xóa", "Xóa sự kiện thành công."),
+                              error_title="Không thể xóa",
+                              cleanup=lambda: self.pending_deletes.discard(key))
             
         except IndexError:
             messagebox.showwarning("Lỗi", "Vui lòng chọn một sự kiện để xóa.")
@@ -156,13 +245,29 @@ class ScheduleApp:
         try:
             selected_index = self.event_listbox.curselection()[0]
             event_string = self.event_listbox.get(selected_index)
+            if self.listbox_events[selected_index] is None:
+                messagebox.showinfo("Đang lưu", "Sự kiện đang được lưu, vui lòng thử lại sau.")
+                return
             
             # Lấy ID từ chuỗi
             event_id = int(event_string.split(":")[0].replace("ID ", ""))
+            if event_id in self.pending_edits:
+                messagebox.showinfo("Đang lưu", "Thay đổi trước của sự kiện này đang được lưu, vui lòng thử lại sau.")
+                return
+
+            # Sự kiện đã lưu trữ: phải khôi phục về danh sách chính trước khi sửa
+            if self.listbox_events[selected_index].get('archived_at'):
+                if messagebox.askyesno("Sự kiện đã lưu trữ", "Khôi phục sự kiện này về danh sách chính để sửa?"):
+                    self.submit_write(self.writer.restore_archived(event_id),
+                                      success=lambda restored: messagebox.showinfo(
+                                          "Đã khôi phục",
+                                          "Đã khôi phục sự kiện, chọn lại để sửa." if restored
+                                          else "Lịch đã có sự kiện trùng nội dung, bản lưu trữ đã được bỏ."),
+                                      error_title="Không thể khôi phục")
+                return
             
             # Lấy thông tin sự kiện hiện tại
-            events = db.get_all_events()
-            current_event = next((e for e in events if e['id'] == event_id), None)
+            current_event = self.store.get_event(event_id)
             
             if not current_event:
                 messagebox.showerror("Lỗi", "Không tìm thấy sự kiện.")
@@ -171,21 +276,20 @@ class ScheduleApp:
             # Tạo cửa sổ chỉnh sửa
             edit_window = tk.Toplevel(self.root)
             edit_window.title("Chỉnh sửa sự kiện")
-            edit_window.geometry("450x500")
+            edit_window.geometry("450x600")
             
-            # Format lại ngày giờ
+            # Ngày giờ hiện và nhập theo múi giờ riêng của sự kiện (cách start_time được lưu),
+            # để lưu lại không làm lệch giờ sự kiện khác múi giờ mặc định
+            event_zone = current_event.get('timezone') or tu.TIMEZONE
+            zone_note = f" ({event_zone})" if event_zone != tu.TIMEZONE else ""
             try:
-                current_dt = datetime.fromisoformat(current_event['start_time'])
+                current_dt, current_endt = db.local_times(current_event)
                 current_date = current_dt.strftime('%d/%m/%Y')
                 current_time = current_dt.strftime('%H:%M')
+                current_end_time = current_endt.strftime('%H:%M') if current_endt else ""
             except:
                 current_date = ""
                 current_time = ""
-            
-            try:
-                current_endt = datetime.fromisoformat(current_event['end_time']) if current_event['end_time'] else None
-                current_end_time = current_endt.strftime('%H:%M') if current_endt else ""
-            except:
                 current_end_time = ""
 
             # Tạo form chỉnh sửa
@@ -205,14 +309,14 @@ class ScheduleApp:
             date_entry.pack(fill=tk.X, pady=(0,15))
             date_entry.insert(0, current_date)
             
-            ttk.Label(main_frame, text="Giờ bắt đầu:", font=('', 9, 'bold')).pack(anchor=tk.W)
+            ttk.Label(main_frame, text=f"Giờ bắt đầu{zone_note}:", font=('', 9, 'bold')).pack(anchor=tk.W)
             ttk.Label(main_frame, text="Ví dụ: 14:30, 2:30 chiều, 9h sáng, 19:00", 
                      font=('', 8), foreground='gray').pack(anchor=tk.W, pady=(0,5))
             time_entry = ttk.Entry(main_frame, width=50)
             time_entry.pack(fill=tk.X, pady=(0,15))
             time_entry.insert(0, current_time)
 
-            ttk.Label(main_frame, text="Giờ kết thúc (tùy chọn):", font=('', 9, 'bold')).pack(anchor=tk.W)
+            ttk.Label(main_frame, text=f"Giờ kết thúc{zone_note} (tùy chọn):", font=('', 9, 'bold')).pack(anchor=tk.W)
             end_time_entry = ttk.Entry(main_frame, width=50)
             end_time_entry.pack(fill=tk.X, pady=(0,15))
             end_time_entry.insert(0, current_end_time)
@@ -222,10 +326,20 @@ class ScheduleApp:
             location_entry.pack(fill=tk.X, pady=(0,15))
             location_entry.insert(0, current_event['location'] or "")
             
-            ttk.Label(main_frame, text="Nhắc nhở trước (phút):", font=('', 9, 'bold')).pack(anchor=tk.W, pady=(0,5))
+            ttk.Label(main_frame, text="Nhắc nhở trước (phút):", font=('', 9, 'bold')).pack(anchor=tk.W)
+            ttk.Label(main_frame, text="Nhiều mốc cách nhau bằng dấu phẩy, VD: 1440, 15",
+                     font=('', 8), foreground='gray').pack(anchor=tk.W, pady=(0,5))
             reminder_entry = ttk.Entry(main_frame, width=50)
             reminder_entry.pack(fill=tk.X, pady=(0,15))
-            reminder_entry.insert(0, str(current_event['reminder_minutes']) if current_event['reminder_minutes'] else "")
+            reminder_entry.insert(0, ", ".join(map(str, db._reminder_offsets(current_event))))
+
+            ttk.Label(main_frame, text="Lặp lại (tùy chọn):", font=('', 9, 'bold')).pack(anchor=tk.W)
+            ttk.Label(main_frame, text="Ví dụ: mỗi thứ 2, hàng ngày đến 31/12, hàng tháng 10 lần", 
+                     font=('', 8), foreground='gray').pack(anchor=tk.W, pady=(0,5))
+            recurrence_entry = ttk.Entry(main_frame, width=50)
+            recurrence_entry.pack(fill=tk.X, pady=(0,15))
+            if current_event.get('recurrence'):
+                recurrence_entry.insert(0, rec.describe_rrule(current_event['recurrence'], event_zone))
             
             def save_changes():
                 try:
@@ -235,6 +349,7 @@ class ScheduleApp:
                     new_end_time = end_time_entry.get()
                     new_location = location_entry.get()
                     new_reminder = reminder_entry.get()
+                    new_recurrence = recurrence_entry.get().strip()
                     
                     if not new_event or not new_date or not new_time:
                         messagebox.showwarning("Lỗi", "Tên sự kiện, ngày và giờ không được để trống.", parent=edit_window)
@@ -247,26 +362,42 @@ class ScheduleApp:
                     if new_end_time:
                         # Nếu người dùng chỉ nhập giờ cho end_time thì chỉ lấy ngày từ start_time
                         end_time_str = f"{new_date} {new_end_time}"
-                        start_datetime_obj = datetime.fromisoformat(start_dt_iso) if start_dt_iso else datetime.now()
+                        start_datetime_obj = datetime.fromisoformat(start_dt_iso) if start_dt_iso else tu.now_local()
                         end_dt_iso = parse_vietnamese_time(end_time_str, now=start_datetime_obj)
 
                     if not start_dt_iso:
                         messagebox.showerror("Lỗi", "Không thể hiểu định dạng ngày/giờ bắt đầu.", parent=edit_window)
                         return
 
+                    recurrence_rule = None
+                    if new_recurrence:
+                        recurrence_rule, _, _ = extract_recurrence(new_recurrence.lower())
+                        if not recurrence_rule:
+                            messagebox.showerror("Lỗi", "Không thể hiểu định dạng lặp lại.", parent=edit_window)
+                            return
+
                     updated_data = {
                         'event': new_event,
                         'start_time': start_dt_iso,
                         'end_time': end_dt_iso,
                         'location': new_location,
-                        'reminder_minutes': int(new_reminder) if new_reminder.isdigit() else None
+                        'reminder_offsets': [int(m) for m in new_reminder.replace(' ', '').split(',') if m.isdigit()],
+                        'recurrence': recurrence_rule,
+                        # Giữ các lần đã bỏ qua nếu chuỗi vẫn giữ nguyên giờ bắt đầu
+                        'exdates': current_event.get('exdates') if recurrence_rule and start_dt_iso == current_event['start_time'] else None,
+                        'timezone': event_zone,
                     }
                     
-                    db.update_event(event_id, updated_data)
-                    messagebox.showinfo("Thành công", "Đã cập nhật sự kiện.", parent=edit_window)
-                    
+                    if not self.confirm_no_conflict(updated_data, exclude_id=event_id, parent=edit_window):
+                        return
+
+                    # Đóng cửa sổ và hiện dữ liệu mới ngay; lỗi khi ghi (VD: trùng sự kiện khác) thì báo lại
+                    self.pending_edits[event_id] = updated_data
                     edit_window.destroy()
-                    self.load_events_to_listbox() # Tải lại danh sách chính
+                    self.submit_write(self.writer.update_event(event_id, updated_data),
+                                      success=lambda _: messagebox.showinfo("Thành công", "Đã cập nhật sự kiện."),
+                                      error_title="Không thể lưu thay đổi",
+                                      cleanup=lambda: self.pending_edits.pop(event_id, None))
                     
                 except Exception as e:
                     messagebox.showerror("Lỗi", f"Không thể lưu thay đổi: {e}", parent=edit_window)
@@ -283,10 +414,46 @@ class ScheduleApp:
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể sửa: {e}")
 
+    def confirm_no_conflict(self, event_data, exclude_id=None, parent=None):
+        """Cảnh báo nếu sự kiện bị trùng lịch. Trả về True nếu vẫn tiếp tục lưu."""
+        # find_overlapping_events nhận giờ theo múi giờ mặc định
+        zone = event_data.get('timezone')
+        start_dt = tu.from_epoch(tu.to_epoch(event_data['start_time'], zone))
+        end_dt = tu.from_epoch(tu.to_epoch(event_data['end_time'], zone)) if event_data.get('end_time') else None
+        conflicts = db.find_overlapping_events(start_dt, end_dt, exclude_id=exclude_id)
+        if not conflicts:
+            return True
+        lines = []
+        for c in conflicts[:5]:
+            c_start = tu.from_epoch(c['start_epoch'])
+            lines.append(f"- {c_start.strftime('%d/%m %H:%M')} {c['event']}")
+        if len(conflicts) > 5:
+            lines.append(f"... và {len(conflicts) - 5} sự kiện khác")
+        return messagebox.askyesno(
+            "Trùng lịch",
+            "Sự kiện bị trùng thời gian với:\n" + "\n".join(lines) + "\n\nVẫn lưu sự kiện?",
+            parent=parent or self.root
+        )
+
+    def find_free_slot_handler(self):
+        """Tìm khoảng thời gian trống gần nhất theo thời lượng người dùng nhập."""
+        minutes = simpledialog.askinteger("Tìm giờ trống", "Thời lượng cần (phút):", minvalue=5, maxvalue=24 * 60, initialvalue=60)
+        if not minutes:
+            return
+        try:
+            slot = db.find_free_slot(minutes)
+            if slot:
+                slot_start, slot_end = slot
+                messagebox.showinfo("Giờ trống", f"Khoảng trống gần nhất: {slot_start.strftime('%H:%M')} - {slot_end.strftime('%H:%M')} ngày {slot_start.strftime('%d/%m/%Y')}")
+            else:
+                messagebox.showinfo("Giờ trống", "Không tìm thấy khoảng trống phù hợp trong 2 tuần tới.")
+        except Exception as e:
+            messagebox.showerror("Lỗi", f"Không thể tìm giờ trống: {e}")
+
     def export_json_handler(self):
         """Xuất dữ liệu ra file JSON."""
         try:
-            events = db.get_all_events()
+            events = self.store.get_all_events()
             
             if not events:
                 messagebox.showwarning("Cảnh báo", "Không có sự kiện nào để xuất.")
@@ -298,19 +465,7 @@ class ScheduleApp:
             )
             
             if file_path:
-                export_data = []
-                for event in events:
-                    export_event = {
-                        "event": event.get("event"),
-                        "start_time": event.get("start_time"),
-                        "end_time": event.get("end_time"),
-                        "location": event.get("location"),
-                        "reminder_minutes": event.get("reminder_minutes")
-                    }
-                    export_data.append(export_event)
-
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(export_data, f, ensure_ascii=False, indent=4)
+                import_export.export_json(file_path, events)
                 messagebox.showinfo("Thành công", f"Đã xuất {len(events)} sự kiện ra {file_path}")
                 
         except Exception as e:
@@ -326,31 +481,17 @@ class ScheduleApp:
             if not file_path:
                 return
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                events = json.load(f)
-            
-            if not isinstance(events, list):
-                messagebox.showerror("Lỗi", "File JSON không đúng định dạng.")
+            try:
+                events = import_export.read_json(file_path)
+            except ValueError as e:
+                messagebox.showerror("Lỗi", str(e))
                 return
             
-            imported_count = 0
-            for event in events:
-                try:
-                    # Loại bỏ ID để tránh xung đột
-                    event_data = {
-                        'event': event.get('event'),
-                        'start_time': event.get('start_time'),
-                        'location': event.get('location'),
-                        'reminder_minutes': event.get('reminder_minutes')
-                    }
-                    db.add_event(event_data)
-                    imported_count += 1
-                except Exception as e:
-                    print(f"Lỗi nhập sự kiện: {e}")
-                    continue
-            
-            messagebox.showinfo("Thành công", f"Đã nhập {imported_count} sự kiện.")
-            self.load_events_to_listbox()
+            # Ghi qua thread ghi (từng lô), giao diện không chờ CSDL
+            self.submit_write(self.writer.add_events(events),
+                              success=lambda counts: messagebox.showinfo(
+                                  "Thành công", f"Đã nhập {counts['added']} sự kiện mới (sự kiện đã có được bỏ qua)."),
+                              error_title="Không thể nhập JSON")
             
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể nhập JSON: {e}")
@@ -358,7 +499,7 @@ class ScheduleApp:
     def export_ics_handler(self):
         """Xuất dữ liệu ra file ICS (iCalendar)."""
         try:
-            events = db.get_all_events()
+            events = self.store.get_all_events()
             
             if not events:
                 messagebox.showwarning("Cảnh báo", "Không có sự kiện nào để xuất.")
@@ -370,135 +511,53 @@ class ScheduleApp:
             )
             
             if file_path:
-                ics_content = self.generate_ics_content(events)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(ics_content)
+                import_export.export_ics(file_path, events)
                 messagebox.showinfo("Thành công", f"Đã xuất {len(events)} sự kiện ra {file_path}")
                 
         except Exception as e:
             messagebox.showerror("Lỗi", f"Không thể xuất ICS: {e}")
     
-    def generate_ics_content(self, events):
-        """Tạo nội dung file ICS từ danh sách sự kiện."""
-        ics_lines = [
-            "BEGIN:VCALENDAR",
-            "VERSION:2.0",
-            "PRODID:-//Trợ lý Lịch trình//Personal Schedule Assistant//VN",
-            "CALSCALE:GREGORIAN",
-            "METHOD:PUBLISH"
-        ]
-        
-        for event in events:
-            try:
-                dt_start = datetime.fromisoformat(event['start_time'])
-                
-                # Nếu không có end_time, đặt mặc định là 1 giờ sau start_time
-                if event.get('end_time'):
-                    dt_end = datetime.fromisoformat(event['end_time'])
-                else:
-                    dt_end = dt_start + timedelta(hours=1)
-
-                # Chuyển sang UTC theo chuẩn ICS
-                dt_start_utc = dt_start.astimezone(timezone.utc)
-                dt_end_utc = dt_end.astimezone(timezone.utc)
-
-                uid = f"{dt_start.strftime('%Y%m%dT%H%M%S')}-{event['id']}@personalschedule.app"
-                
-                ics_lines.append("BEGIN:VEVENT")
-                ics_lines.append(f"UID:{uid}")
-                ics_lines.append(f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
-                ics_lines.append(f"DTSTART:{dt_start_utc.strftime('%Y%m%dT%H%M%SZ')}")
-                ics_lines.append(f"DTEND:{dt_end_utc.strftime('%Y%m%dT%H%M%SZ')}")
-                ics_lines.append(f"SUMMARY:{event['event']}")
-                
-                if event['location']:
-                    ics_lines.append(f"LOCATION:{event['location']}")
-                
-                # Thêm nhắc nhở (VALARM)
-                if event['reminder_minutes'] and event['reminder_minutes'] > 0:
-                    ics_lines.append("BEGIN:VALARM")
-                    ics_lines.append("ACTION:DISPLAY")
-                    ics_lines.append(f"DESCRIPTION:{event['event']}")
-                    ics_lines.append(f"TRIGGER:-PT{event['reminder_minutes']}M") # PT = Period Time
-                    ics_lines.append("END:VALARM")
-
-                ics_lines.append("END:VEVENT")
-                
-            except Exception as e:
-                print(f"Could not process event ID {event.get('id')} for ICS export: {e}")
-        
-        ics_lines.append("END:VCALENDAR")
-        return "\r\n".join(ics_lines)
-
     def load_events_to_listbox(self):
-        """Tải lại tất cả sự kiện từ CSDL và hiển thị với bộ lọc."""
+        """Tải lại tất cả sự kiện từ bộ nhớ đệm và hiển thị với bộ lọc."""
         self.event_listbox.delete(0, tk.END) # Xóa danh sách cũ
-        events = db.get_all_events()
+        self.listbox_dirty = False
         
-        # Áp dụng bộ lọc thời gian
-        filtered_events = self.filter_events_by_time(events)
+        # Áp dụng bộ lọc thời gian: chỉ sinh các lần lặp nằm trong khoảng đang xem
+        view_range = self.get_view_range()
+        if view_range:
+            filtered_events = self.store.get_events_in_range(*view_range)
+        else:
+            filtered_events = self.store.get_all_events()
         
         # Áp dụng bộ lọc tìm kiếm
         search_text = self.search_entry.get().lower().strip()
         if search_text:
             filtered_events = self.filter_events_by_search(filtered_events, search_text)
+            if self.search_archive.get():
+                filtered_events += archive.search_archive(search_text, *(view_range or ()))
         
-        # Hiển thị sự kiện đã lọc
-        for event in filtered_events:
-            try:
-                dt_start = datetime.fromisoformat(event['start_time'])
-                dt_str = dt_start.strftime('%d/%m %H:%M')
-                if event.get('end_time'):
-                    dt_end = datetime.fromisoformat(event['end_time'])
-                    # Nếu cùng ngày thì chỉ hiện giờ kết thúc
-                    if dt_start.date() == dt_end.date():
-                        dt_str += f" - {dt_end.strftime('%H:%M')}"
-                    else: # Khác ngày thì hiện cả ngày tháng
-                        dt_str += f" - {dt_end.strftime('%d/%m %H:%M')}"
-            except:
-                dt_str = event['start_time'] # Fallback
-                
-            loc = f" - {event['location']}" if event['location'] else ""
-            rem = f" (Nhắc trước {event['reminder_minutes']}p)" if event['reminder_minutes'] else ""
-            
-            display_string = f"ID {event['id']}: [{dt_str}] {event['event']}{loc}{rem}"
-            self.event_listbox.insert(tk.END, display_string)
-    
-    def filter_events_by_time(self, events):
-        """Lọc sự kiện theo khoảng thời gian được chọn."""
-        view_mode = self.view_mode.get()
-        if view_mode == "all":
-            return events
-        
-        now = datetime.now()
-        filtered_events = []
-        
-        for event in events:
-            try:
-                event_dt = datetime.fromisoformat(event['start_time'])
-                
-                if view_mode == "today":
-                    # Hôm nay
-                    if event_dt.date() == now.date():
-                        filtered_events.append(event)
-                        
-                elif view_mode == "week":
-                    # Tuần này (Thứ 2 đến Chủ Nhật)
-                    start_of_week = now - timedelta(days=now.weekday())
-                    end_of_week = start_of_week + timedelta(days=6)
-                    if start_of_week.date() <= event_dt.date() <= end_of_week.date():
-                        filtered_events.append(event)
-                        
-                elif view_mode == "month":
-                    # Tháng này
-                    if event_dt.year == now.year and event_dt.month == now.month:
-                        filtered_events.append(event)
-                        
-            except Exception as e:
-                print(f"Lỗi lọc sự kiện: {e}")
+        # Hiển thị sự kiện đã lọc (chuỗi hiển thị được giữ sẵn trong bộ nhớ đệm),
+        # kèm các thay đổi đang chờ ghi
+        self.listbox_events = []
+        for record in self.store.records(filtered_events):
+            if (record['id'], None) in self.pending_deletes or (record['id'], record.get('occurrence_start')) in self.pending_deletes:
                 continue
-                
-        return filtered_events
+            edit = self.pending_edits.get(record['id'])
+            self.event_listbox.insert(tk.END, record.display if edit is None else self.pending_line(record['id'], edit))
+            self.listbox_events.append(record)
+        for data in self.pending_adds:
+            self.event_listbox.insert(tk.END, self.pending_line(None, data))
+            self.listbox_events.append(None)
+
+    def pending_line(self, event_id, data):
+        """Dòng hiển thị tạm cho sự kiện đang chờ ghi vào CSDL."""
+        start = datetime.fromisoformat(data['start_time']).strftime('%d/%m %H:%M')
+        prefix = f"ID {event_id}: " if event_id is not None else ""
+        return f"{prefix}[{start}] {data['event']} (đang lưu...)"
+    
+    def get_view_range(self):
+        """Khoảng thời gian [start, end) theo chế độ hiển thị, None nếu xem tất cả."""
+        return tu.view_range(self.view_mode.get())
     
     def filter_events_by_search(self, events, search_text):
         """Lọc sự kiện theo từ khóa tìm kiếm."""
@@ -525,60 +584,77 @@ class ScheduleApp:
         """Xử lý khi thay đổi chế độ hiển thị."""
         self.load_events_to_listbox()
 
+    def show_calendar_handler(self):
+        """Mở lịch dạng lưới ngày / tuần / tháng."""
+        if self.calendar_view is None:
+            self.calendar_view = CalendarView(self.root, self.store, DayIndex(self.store))
+        self.calendar_view.show()
+
+    def on_store_change(self, change, event):
+        """Nhận thay đổi từ bộ nhớ đệm (có thể ở thread khác): chỉ đánh dấu, main thread sẽ vẽ lại."""
+        self.listbox_dirty = True
+
+    # --- GHI CSDL QUA THREAD GHI ---
+
+    def submit_write(self, future, success=None, error_title="Lỗi", cleanup=None):
+        """Theo dõi một lệnh ghi đã gửi cho thread ghi; kết quả được xử lý ở main thread."""
+        self.pending_writes.append((future, success, error_title, cleanup))
+        if not self.write_poll_scheduled:
+            self.write_poll_scheduled = True
+            self.root.after(WRITE_POLL_MS, self.check_pending_writes)
+        self.load_events_to_listbox()
+
+    def check_pending_writes(self):
+        """Xử lý các lệnh ghi đã xong: bỏ trạng thái tạm, vẽ lại danh sách, báo thành công / lỗi."""
+        done, pending = [], []
+        for item in self.pending_writes:
+            (done if item[0].done() else pending).append(item)
+        self.pending_writes = pending
+        for future, success, error_title, cleanup in done:
+            if cleanup: cleanup()
+            self.listbox_dirty = True
+        if self.listbox_dirty:
+            self.load_events_to_listbox()
+        for future, success, error_title, cleanup in done:
+            if future.exception() is not None:
+                messagebox.showerror(error_title, f"{future.exception()}")
+            elif success:
+                success(future.result())
+        if self.pending_writes:
+            self.root.after(WRITE_POLL_MS, self.check_pending_writes)
+        else:
+            self.write_poll_scheduled = False
+
+    def on_close(self):
+        """Ghi nốt các thay đổi đang chờ rồi thoát."""
+        self.writer.close()
+        self.root.destroy()
+
     # --- HỆ THỐNG NHẮC NHỞ ---
     
     def start_reminder_thread(self):
-        """Khởi chạy luồng kiểm tra nhắc nhở."""
-        reminder_thread = threading.Thread(target=self.reminder_loop, daemon=True)
-        reminder_thread.start()
-
-    def reminder_loop(self):
-        while True:
-            try:
-                events_to_remind = db.get_events_to_remind()
-                
-                for event in events_to_remind:
-                    # Gửi sự kiện vào queue để main thread xử lý pop-up
-                    self.reminder_queue.put(event)
-                    # Đánh dấu là đã nhắc
-                    db.mark_as_reminded(event['id'])
-                    
-            except Exception as e:
-                print(f"Lỗi thread nhắc nhở: {e}")
-                
-            # Ngủ 60 giây
-            time.sleep(REMINDER_CHECK_INTERVAL_SECONDS) 
+        """Khởi chạy luồng kiểm tra nhắc nhở (dịch vụ dùng chung với chế độ dòng lệnh).
+        Sự kiện đến hạn được gửi vào queue để main thread xử lý pop-up."""
+        self.reminder_service = ReminderService([QueueSink(self.reminder_queue)], source=self.store, writer=self.writer)
+        self.reminder_service.start()
 
     def check_reminder_queue(self):
         """
         Kiểm tra queue (chạy ở main thread).
-        Đã cập nhật để hiển thị cả giờ kết thúc (nếu có).
+        Mọi nhắc nhở đến trong lượt này được gom vào một cửa sổ thông báo (không chặn main loop).
         """
         try:
+            due = []
             while not self.reminder_queue.empty():
-                event = self.reminder_queue.get_nowait()
-                
-                # Xử lý hiển thị thời gian
-                dt_start = datetime.fromisoformat(event['start_time'])
-                time_str = dt_start.strftime('%H:%M ngày %d/%m/%Y')
-                
-                # Nếu có giờ kết thúc, hiển thị dạng "09:00 - 21:00"
-                if event['end_time']:
-                    dt_end = datetime.fromisoformat(event['end_time'])
-                    # Nếu cùng ngày thì chỉ hiện giờ kết thúc
-                    if dt_start.date() == dt_end.date():
-                        time_str = f"{dt_start.strftime('%H:%M')} - {dt_end.strftime('%H:%M')} ngày {dt_start.strftime('%d/%m/%Y')}"
-                    else:
-                        time_str = f"{dt_start.strftime('%H:%M %d/%m')} - {dt_end.strftime('%H:%M %d/%m')}"
-                
-                # Hiển thị POP-UP
-                messagebox.showinfo(
-                    "NHẮC NHỞ SỰ KIỆN", 
-                    f"Sự kiện sắp diễn ra!\n\n"
-                    f"Nội dung: {event['event']}\n"
-                    f"Thời gian: {time_str}\n"
-                    f"Địa điểm: {event['location'] or 'Không có'}"
-                )
+                due.append(self.reminder_queue.get_nowait())
+            self.notification_center.add(due)
+
+            # CSDL bị tiến trình khác sửa -> bộ nhớ đệm tải lại và báo qua on_store_change
+            self.store.refresh_if_changed()
+            if self.listbox_dirty:
+                self.load_events_to_listbox()
+            if self.calendar_view is not None:
+                self.calendar_view.refresh_if_changed()
                 
         finally:
             self.root.after(1000, self.check_reminder_queue)
@@ -0,0 +1,181 @@
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import database as db
+import time_utils as tu
+
+# ==============================================================================
+# LƯU TRỮ SỰ KIỆN CŨ & BẢO TRÌ CSDL
+# Sự kiện đã kết thúc (và không còn nhắc nhở chờ) quá ARCHIVE_AFTER_DAYS ngày được
+# chuyển từ bảng events sang bảng events_archive, nên danh sách, tìm kiếm và bộ kiểm tra
+# nhắc nhở chỉ làm việc trên bảng "nóng" nhỏ. Mục lưu trữ vẫn tìm được khi cần
+# (search_archive) và khôi phục được (restore_event).
+# Lưu trữ / khôi phục là việc riêng của từng CSDL: cả hai chiều đều không được ghi vào
+# change_log nên không được đồng bộ sang CSDL khác (xem migrations.py, v11 và v12).
+# Định kỳ chạy incremental VACUUM (trả lại trang trống) và ANALYZE (cập nhật thống kê
+# cho bộ tối ưu truy vấn).
+# ==============================================================================
+
+# Lưu trữ sự kiện đã kết thúc quá 30 ngày
+ARCHIVE_AFTER_DAYS = 30
+# Số dòng chuyển mỗi lô (mỗi lô một transaction ngắn)
+ARCHIVE_BATCH_SIZE = 500
+# Số trang tối đa trả lại mỗi lần incremental VACUUM (0: tất cả)
+VACUUM_PAGES = 1000
+# Giới hạn số dòng ANALYZE đọc mỗi chỉ mục, để ANALYZE luôn nhanh dù bảng lớn
+ANALYSIS_LIMIT = 1000
+# Chạy bảo trì định kỳ (mỗi 6 tiếng)
+MAINTENANCE_INTERVAL_SECONDS = 6 * 60 * 60
+
+logger = logging.getLogger(__name__)
+
+def _archive_columns(conn):
+    """Các cột chung của events và events_archive (không tính archived_at)."""
+    events_cols = [row[1] for row in conn.execute("PRAGMA table_info(events)")]
+    archive_cols = {row[1] for row in conn.execute("PRAGMA table_info(events_archive)")}
+    return [c for c in events_cols if c in archive_cols]
+
+def archive_events(older_than_days: int = ARCHIVE_AFTER_DAYS, calendar_id: int = None,
+                   batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Chuyển các sự kiện đã kết thúc trước (bây giờ - older_than_days) sang bảng lưu trữ.
+    Chuỗi lặp chỉ được lưu trữ khi lần xảy ra cuối cùng đã qua mốc đó (chuỗi vô hạn thì không bao giờ).
+    Trả về số sự kiện đã chuyển.
+    """
+    cutoff = int(time.time()) - older_than_days * 24 * 60 * 60
+    where, params = db._scope_filter(calendar_id)
+    conn = db._connect()
+    cursor = conn.cursor()
+    columns = ", ".join(_archive_columns(conn))
+    moved = 0
+    while True:
+        # start_epoch < cutoff dùng được chỉ mục start_epoch, phần còn lại lọc trên các dòng đó
+        cursor.execute(f"""
+            SELECT id FROM events
+            WHERE start_epoch < ?{where}
+            AND NOT EXISTS (SELECT 1 FROM reminders WHERE reminders.event_id = events.id
+                            AND reminders.state = 'pending' AND reminders.remind_at >= ?)
+            AND CASE WHEN recurrence IS NULL THEN COALESCE(end_epoch, start_epoch) < ?
+                     ELSE recurrence_end_epoch IS NOT NULL AND recurrence_end_epoch < ? END
+            LIMIT ?
+        """, (cutoff, *params, cutoff, cutoff, cutoff, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids: break
+        placeholders = ",".join("?" * len(ids))
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO events_archive ({columns}, archived_at)
+            SELECT {columns}, ? FROM events WHERE id IN ({placeholders})
+        """, (int(time.time()), *ids))
+        # Các nhắc nhở bị xóa theo (ON DELETE CASCADE)
+        cursor.execute(f"DELETE FROM events WHERE id IN ({placeholders})", ids)
+        conn.commit()
+        db._notify('deleted', ids)
+        moved += len(ids)
+    conn.close()
+    return moved
+
+def search_archive(search_text: str = None, range_start: datetime = None, range_end: datetime = None,
+                   calendar_id: int = None, limit: int = 500):
+    """Tìm trong mục lưu trữ theo tên / địa điểm và (tùy chọn) khoảng thời gian bắt đầu [range_start, range_end)."""
+    where, params = db._scope_filter(calendar_id)
+    if range_start is not None:
+        where += " AND start_epoch >= ?"
+        params += (tu.to_epoch(range_start),)
+    if range_end is not None:
+        where += " AND start_epoch < ?"
+        params += (tu.to_epoch(range_end),)
+    if search_text:
+        where += " AND (event LIKE ? OR location LIKE ?)"
+        pattern = f"%{search_text.strip()}%"
+        params += (pattern, pattern)
+    conn = db._connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(f"SELECT * FROM events_archive WHERE 1 = 1{where} ORDER BY start_epoch DESC LIMIT ?",
+                        (*params, limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def _restore_event(cursor, event_id: int) -> bool:
+    """Phần ghi của restore_event (cursor cần row_factory = sqlite3.Row)."""
+    columns = ", ".join(_archive_columns(cursor.connection))
+    cursor.execute(f"""
+        INSERT INTO events ({columns}) SELECT {columns} FROM events_archive AS a WHERE a.id = ?
+        AND NOT EXISTS (SELECT 1 FROM events WHERE events.calendar_id = a.calendar_id AND events.content_hash = a.content_hash)
+    """, (event_id,))
+    restored = cursor.rowcount > 0
+    if restored:
+        # Lập lại các mốc nhắc (chuỗi lặp còn lần xảy ra sau này)
+        db._schedule_reminders(cursor, dict(cursor.execute("SELECT * FROM events WHERE id = ?", (event_id,)).fetchone()))
+    cursor.execute("DELETE FROM events_archive WHERE id = ?", (event_id,))
+    return restored
+
+def restore_event(event_id: int) -> bool:
+    """Đưa một sự kiện từ bảng lưu trữ về lại bảng events. Trả về False nếu không tìm thấy.
+    Nếu lịch đã có sự kiện trùng nội dung (VD: đã nhập lại) thì chỉ xóa bản lưu trữ."""
+    conn = db._connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    restored = _restore_event(cursor, event_id)
+    conn.commit()
+    conn.close()
+    if restored: db._notify('added', [event_id])
+    return restored
+
+def _delete_archived(cursor, event_id: int):
+    cursor.execute("DELETE FROM events_archive WHERE id = ?", (event_id,))
+
+def delete_archived(event_id: int):
+    """Xóa hẳn một sự kiện khỏi bảng lưu trữ."""
+    conn = db._connect()
+    _delete_archived(conn.cursor(), event_id)
+    conn.commit()
+    conn.close()
+
+def compact(vacuum_pages: int = VACUUM_PAGES):
+    """Trả lại các trang trống cho hệ điều hành (incremental VACUUM) và cập nhật thống kê (ANALYZE).
+    Trả về số trang đã giải phóng."""
+    conn = db._connect()
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # PRAGMA không nhận tham số dạng ?. incremental_vacuum giải phóng một trang mỗi bước, còn
+    # conn.execute chỉ chạy một bước: executescript chạy câu lệnh đến hết
+    conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)});")
+    free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    conn.execute(f"PRAGMA analysis_limit = {int(ANALYSIS_LIMIT)}")
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return free_before - free_after
+
+def run_maintenance(older_than_days: int = ARCHIVE_AFTER_DAYS) -> dict:
+    """Một lượt bảo trì: lưu trữ sự kiện cũ rồi thu gọn CSDL."""
+    archived = archive_events(older_than_days)
+    freed_pages = compact()
+    return {"archived": archived, "freed_pages": freed_pages}
+
+class MaintenanceService:
+    """Chạy run_maintenance định kỳ ở thread nền (giống ReminderService)."""
+    def __init__(self, interval=MAINTENANCE_INTERVAL_SECONDS, older_than_days=ARCHIVE_AFTER_DAYS):
+        self.interval = interval
+        self.older_than_days = older_than_days
+        self._stop = threading.Event()
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                result = run_maintenance(self.older_than_days)
+                if result['archived'] or result['freed_pages']:
+                    logger.info(f"Bảo trì CSDL: lưu trữ {result['archived']} sự kiện, giải phóng {result['freed_pages']} trang")
+            except Exception as e:
+                logger.error(f"Lỗi bảo trì CSDL: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,162 @@
+import tkinter as tk
+from tkinter import ttk
+from datetime import timedelta
+
+import time_utils as tu
+
+# ==============================================================================
+# LỊCH DẠNG LƯỚI (NGÀY / TUẦN / THÁNG)
+# Cửa sổ riêng đọc sự kiện theo ngày từ DayIndex (day_index.py): vẽ một tháng chỉ
+# duyệt các sự kiện của tháng đó, chuyển tháng không phải đọc lại bảng events.
+# Các ô được tạo một lần và dùng lại khi chuyển ngày / tuần / tháng.
+# ==============================================================================
+
+WEEKDAY_NAMES = ("Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật")
+GRID_WEEKS = 6  # Số hàng của lưới tháng
+
+class CalendarView:
+    def __init__(self, root, store, index):
+        self.root = root
+        self.store = store
+        self.index = index    # DayIndex
+        self.window = None    # Tạo khi mở lần đầu, đóng thì chỉ ẩn đi
+        self.anchor = tu.now_local().date()  # Ngày đang xem
+        self._version = None  # index.version lúc vẽ gần nhất
+
+    def _build_window(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.geometry("900x600")
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
+
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        nav_frame = ttk.Frame(main_frame)
+        nav_frame.pack(fill=tk.X)
+        ttk.Button(nav_frame, text="<", width=3, command=lambda: self.move(-1)).pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="Hôm nay", command=self.go_today).pack(side=tk.LEFT, padx=5)
+        ttk.Button(nav_frame, text=">", width=3, command=lambda: self.move(1)).pack(side=tk.LEFT)
+        self.title_label = ttk.Label(nav_frame, font=("", 12, "bold"))
+        self.title_label.pack(side=tk.LEFT, padx=15)
+
+        self.mode = tk.StringVar(value="month")
+        for value, text in (("month", "Tháng"), ("week", "Tuần"), ("day", "Ngày")):
+            ttk.Radiobutton(nav_frame, text=text, variable=self.mode, value=value,
+                            command=self.render).pack(side=tk.RIGHT, padx=2)
+
+        # Lưới tuần / tháng: hàng tiêu đề thứ + GRID_WEEKS hàng ô ngày
+        self.grid_frame = ttk.Frame(main_frame)
+        for col, name in enumerate(WEEKDAY_NAMES):
+            ttk.Label(self.grid_frame, text=name, anchor=tk.CENTER).grid(row=0, column=col, sticky="ew")
+            self.grid_frame.columnconfigure(col, weight=1, uniform="day")
+        self.cells = []
+        for row in range(GRID_WEEKS):
+            for col in range(7):
+                cell = ttk.Frame(self.grid_frame, relief=tk.GROOVE, borderwidth=1)
+                cell.grid(row=row + 1, column=col, sticky="nsew")
+                header = ttk.Label(cell, anchor=tk.W)
+                header.pack(fill=tk.X)
+                listbox = tk.Listbox(cell, height=3, borderwidth=0, highlightthickness=0, activestyle="none")
+                listbox.pack(fill=tk.BOTH, expand=True)
+                listbox.bind('<Double-Button-1>', lambda e, i=len(self.cells): self.open_day(i))
+                self.cells.append((cell, header, listbox))
+
+        # Xem theo ngày: danh sách đầy đủ (chuỗi hiển thị giống danh sách chính)
+        self.day_frame = ttk.Frame(main_frame)
+        scrollbar = ttk.Scrollbar(self.day_frame, orient=tk.VERTICAL)
+        self.day_listbox = tk.Listbox(self.day_frame, yscrollcommand=scrollbar.set)
+        scrollbar.config(command=self.day_listbox.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.day_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    def show(self):
+        if self.window is None: self._build_window()
+        self.render()
+        self.window.deiconify()
+        self.window.lift()
+
+    def refresh_if_changed(self):
+        """Gọi định kỳ từ main thread: vẽ lại nếu đang mở và chỉ mục đã thay đổi."""
+        if self.window is not None and self.window.winfo_viewable() and self.index.version != self._version:
+            self.render()
+
+    # --- Điều hướng ---
+
+    def _first_day(self):
+        """Ngày đầu tiên hiển thị (thứ 2 của tuần đầu tiên với lưới tháng / tuần)."""
+        mode = self.mode.get()
+        if mode == "day": return self.anchor
+        first = self.anchor.replace(day=1) if mode == "month" else self.anchor
+        return first - timedelta(days=first.weekday())
+
+    def move(self, step: int):
+        mode = self.mode.get()
+        if mode == "day":
+            self.anchor += timedelta(days=step)
+        elif mode == "week":
+            self.anchor += timedelta(days=7 * step)
+        else:
+            # Sang ngày 1 của tháng trước / sau
+            first = self.anchor.replace(day=1)
+            self.anchor = (first - timedelta(days=1)).replace(day=1) if step < 0 else (first + timedelta(days=32)).replace(day=1)
+        self.render()
+
+    def go_today(self):
+        self.anchor = tu.now_local().date()
+        self.render()
+
+    def open_day(self, cell_index: int):
+        """Nhấp đúp vào một ô: xem riêng ngày đó."""
+        self.anchor = self._first_day() + timedelta(days=cell_index)
+        self.mode.set("day")
+        self.render()
+
+    # --- Vẽ ---
+
+    def render(self):
+        self.store.refresh_if_changed()
+        # Đọc version trước khi lấy dữ liệu: có thay đổi xen vào thì lần kiểm tra sau vẽ lại
+        self._version = self.index.version
+        if self.mode.get() == "day":
+            self._render_day()
+        else:
+            self._render_grid()
+
+    def _render_day(self):
+        self.grid_frame.pack_forget()
+        self.day_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        self.title_label.config(text=f"{WEEKDAY_NAMES[self.anchor.weekday()]}, {self.anchor.strftime('%d/%m/%Y')}")
+        self.day_listbox.delete(0, tk.END)
+        for record in self.store.records(self.index.events_on(self.anchor)):
+            self.day_listbox.insert(tk.END, record.display)
+
+    def _render_grid(self):
+        self.day_frame.pack_forget()
+        self.grid_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 0))
+        weeks = GRID_WEEKS if self.mode.get() == "month" else 1
+        first = self._first_day()
+        last = first + timedelta(days=7 * weeks - 1)
+        if weeks == 1:
+            self.title_label.config(text=f"{first.strftime('%d/%m')} - {last.strftime('%d/%m/%Y')}")
+        else:
+            self.title_label.config(text=f"Tháng {self.anchor.month}/{self.anchor.year}")
+
+        by_day = self.index.events_between(first, last)
+        today = tu.now_local().date()
+        for row in range(GRID_WEEKS):
+            self.grid_frame.rowconfigure(row + 1, weight=1 if row < weeks else 0)
+        for i, (cell, header, listbox) in enumerate(self.cells):
+            if i >= 7 * weeks:
+                cell.grid_remove()
+                continue
+            cell.grid()
+            day = first + timedelta(days=i)
+            # Ngày của tháng khác trong lưới tháng: chữ mờ; hôm nay: chữ đậm
+            header.config(text=str(day.day) if weeks > 1 else day.strftime('%d/%m'),
+                          foreground="gray" if weeks > 1 and day.month != self.anchor.month else "",
+                          font=("", 9, "bold") if day == today else "")
+            listbox.delete(0, tk.END)
+            for record in self.store.records(by_day.get(day, [])):
+                # Sự kiện kéo dài từ ngày trước: không hiện giờ bắt đầu
+                when = record.start.strftime('%H:%M') if record.start.date() == day else "..."
+                listbox.insert(tk.END, f"{when} {record['event']}")
@@ -0,0 +1,272 @@
+"""
+Giao diện dòng lệnh (không cần tkinter) cho Trợ lý Lịch trình.
+
+Ví dụ:
+    python cli.py add "Nhắc tôi họp nhóm lúc 8h sáng mai ở phòng 301"
+    python cli.py list --view week
+    python cli.py import events.json
+    python cli.py export events.ics
+    python cli.py archive --days 30
+    python cli.py list --archived --search họp
+    python cli.py migrate
+    python cli.py vacuum
+    python cli.py sync --with /mnt/usb/schedule.db
+    python cli.py sync --export changes.json --since 120
+    python cli.py run-daemon --sink stdout --sink log --log-file reminders.log
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+
+import archive
+import database as db
+import import_export
+import recurrence as rec
+import sync
+import time_utils as tu
+from reminder_service import ReminderService, StdoutSink, LogFileSink, WebhookSink, REMINDER_CHECK_INTERVAL_SECONDS, format_offsets
+
+def format_event_line(event: dict) -> str:
+    """Một dòng mô tả sự kiện, cùng định dạng với danh sách trên giao diện."""
+    dt_start = tu.from_epoch(event['start_epoch'])
+    dt_str = dt_start.strftime('%d/%m/%Y %H:%M')
+    if event.get('end_epoch') is not None:
+        dt_end = tu.from_epoch(event['end_epoch'])
+        dt_str += f" - {dt_end.strftime('%H:%M') if dt_start.date() == dt_end.date() else dt_end.strftime('%d/%m %H:%M')}"
+    loc = f" - {event['location']}" if event['location'] else ""
+    offsets = format_offsets(event)
+    rem = f" (Nhắc trước {offsets})" if offsets else ""
+    rep = f" (Lặp {rec.describe_rrule(event['recurrence'], event.get('timezone'))})" if event.get('recurrence') else ""
+    return f"ID {event['id']}: [{dt_str}] {event['event']}{loc}{rem}{rep}"
+
+def _parse_date(value: str) -> datetime:
+    """Nhận ngày dạng YYYY-MM-DD[THH:MM] hoặc DD/MM/YYYY."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return datetime.strptime(value, '%d/%m/%Y')
+
+# --- Các lệnh con ---
+
+def cmd_add(args):
+    # Chỉ nạp pipeline NLP (underthesea) khi thật sự cần
+    from nlp_pipeline import pipeline_
+
+    data = pipeline_(" ".join(args.prompt))
+    if not (data.get('event') and data.get('start_time')):
+        print("Không thể trích xuất sự kiện hoặc thời gian.", file=sys.stderr)
+        return 1
+
+    start_dt = datetime.fromisoformat(data['start_time'])
+    end_dt = datetime.fromisoformat(data['end_time']) if data.get('end_time') else None
+    data['calendar_id'] = args.calendar
+    for c in db.find_overlapping_events(start_dt, end_dt, calendar_id=args.calendar):
+        print(f"Cảnh báo trùng lịch: {format_event_line(c)}", file=sys.stderr)
+
+    if args.dry_run:
+        print(data)
+        return 0
+    db.add_event(data)
+    print(f"Đã thêm sự kiện: '{data['event']}' lúc {start_dt.strftime('%H:%M %d/%m/%Y')}")
+    return 0
+
+def cmd_list(args):
+    if args.archived:
+        # Tìm trong mục lưu trữ (sự kiện cũ đã chuyển khỏi bảng chính)
+        range_start = _parse_date(args.start) if args.start else None
+        range_end = _parse_date(args.end) if args.end else None
+        for event in archive.search_archive(args.search, range_start, range_end, calendar_id=args.calendar):
+            print(f"{format_event_line(event)} [Lưu trữ]")
+        return 0
+
+    if args.start or args.end:
+        range_start = _parse_date(args.start) if args.start else tu.now_local()
+        range_end = _parse_date(args.end) if args.end else datetime(9999, 1, 1)
+        events = db.get_events_in_range(range_start, range_end, calendar_id=args.calendar)
+    else:
+        view_range = tu.view_range(args.view)
+        events = (db.get_events_in_range(*view_range, calendar_id=args.calendar) if view_range
+                  else db.get_all_events(args.calendar))
+
+    if args.search:
+        search_text = args.search.lower().strip()
+        events = [e for e in events
+                  if search_text in e['event'].lower() or (e['location'] and search_text in e['location'].lower())]
+
+    for event in events:
+        print(format_event_line(event))
+    return 0
+
+def cmd_import(args):
+    count = import_export.import_json(args.file, calendar_id=args.calendar)
+    print(f"Đã nhập {count} sự kiện mới (sự kiện đã có được bỏ qua).")
+    return 0
+
+def cmd_export(args):
+    fmt = args.format or ('ics' if args.file.lower().endswith('.ics') else 'json')
+    events = db.get_all_events(args.calendar)
+    if fmt == 'ics':
+        count = import_export.export_ics(args.file, events)
+    else:
+        count = import_export.export_json(args.file, events)
+    print(f"Đã xuất {count} sự kiện ra {args.file}")
+    return 0
+
+def cmd_archive(args):
+    if args.restore is not None:
+        if not archive.restore_event(args.restore):
+            print(f"Không có sự kiện ID {args.restore} trong mục lưu trữ.", file=sys.stderr)
+            return 1
+        print(f"Đã khôi phục sự kiện ID {args.restore}.")
+        return 0
+    count = archive.archive_events(args.days, calendar_id=args.calendar)
+    freed_pages = archive.compact()
+    print(f"Đã lưu trữ {count} sự kiện kết thúc quá {args.days} ngày, giải phóng {freed_pages} trang.")
+    return 0
+
+def cmd_migrate(args):
+    # Việc nâng cấp đã chạy trong main() (db.init_db); lệnh này chỉ báo phiên bản hiện tại
+    import migrations
+    conn = db._connect()
+    version = migrations.get_version(conn)
+    conn.close()
+    print(f"CSDL {db.DB_NAME} đang ở phiên bản lược đồ v{version} (mới nhất: v{migrations.SCHEMA_VERSION}).")
+    return 0
+
+def cmd_vacuum(args):
+    import migrations
+    conn = db._connect()
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            print("CSDL đã dùng incremental VACUUM, không cần chạy lại.")
+            return 0
+        size_mb = migrations.database_bytes(conn) / (1024 * 1024)
+        print(f"VACUUM toàn bộ {db.DB_NAME} ({size_mb:.1f} MB), có thể mất vài phút...", flush=True)
+        migrations.enable_incremental_vacuum(conn)
+    finally:
+        conn.close()
+    print("Đã bật incremental VACUUM.")
+    return 0
+
+def _format_counts(counts) -> str:
+    return (f"thêm {counts['added']}, sửa {counts['updated']}, xóa {counts['deleted']}, "
+            f"không đổi {counts['unchanged']}, lỗi {counts['failed']}")
+
+def cmd_sync(args):
+    if args.export:
+        change_set = sync.export_changes_file(args.export, args.since)
+        print(f"Đã xuất {len(change_set['changes'])} thay đổi (seq {args.since} -> {change_set['last_seq']}) ra {args.export}")
+        print(f"Lần sau chỉ cần: --since {change_set['last_seq']}")
+    elif args.apply:
+        counts = sync.apply_changes_file(args.apply)
+        print(f"Đã áp dụng thay đổi từ {args.apply}: {_format_counts(counts)}")
+    else:
+        result = sync.sync_with(args.other)
+        print(f"Gửi tới {args.other}: {_format_counts(result['pushed'])}")
+        print(f"Nhận về: {_format_counts(result['pulled'])}")
+    return 0
+
+def cmd_run_daemon(args):
+    sinks = []
+    for name in args.sink or ['stdout']:
+        if name == 'stdout':
+            sinks.append(StdoutSink())
+        elif name == 'log':
+            sinks.append(LogFileSink(args.log_file))
+        elif name == 'webhook':
+            if not args.webhook_url:
+                print("Cần --webhook-url khi dùng --sink webhook.", file=sys.stderr)
+                return 2
+            sinks.append(WebhookSink(args.webhook_url))
+
+    service = ReminderService(sinks, interval=args.interval, calendar_id=args.calendar)
+    if args.once:
+        service.check_once()
+        return 0
+
+    # Bảo trì CSDL định kỳ chạy song song ở thread nền
+    archive.MaintenanceService().start()
+    logging.info(f"Đang chạy dịch vụ nhắc nhở (CSDL: {db.DB_NAME}, múi giờ: {tu.TIMEZONE}, chu kỳ: {args.interval}s)")
+    try:
+        service.run_forever()
+    except KeyboardInterrupt:
+        service.stop()
+    return 0
+
+# --- Khởi tạo ---
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Trợ lý Lịch trình - chế độ dòng lệnh")
+    parser.add_argument("--db", default=db.DB_NAME, help="Đường dẫn file CSDL (mặc định: schedule.db)")
+    parser.add_argument("--tz", default=None, help="Múi giờ IANA, VD: Asia/Ho_Chi_Minh")
+    parser.add_argument("--calendar", type=int, default=None,
+                        help="ID lịch cần thao tác (mặc định: mọi lịch; thêm mới vào lịch cá nhân)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("add", help="Thêm sự kiện từ câu tiếng Việt")
+    p.add_argument("prompt", nargs="+")
+    p.add_argument("--dry-run", action="store_true", help="Chỉ in kết quả phân tích, không lưu")
+    p.set_defaults(func=cmd_add)
+
+    p = sub.add_parser("list", help="Liệt kê sự kiện")
+    p.add_argument("--view", choices=["all", "today", "week", "month"], default="all")
+    p.add_argument("--from", dest="start", help="Từ ngày (YYYY-MM-DD hoặc DD/MM/YYYY)")
+    p.add_argument("--to", dest="end", help="Đến ngày (không bao gồm)")
+    p.add_argument("--search", help="Lọc theo tên sự kiện / địa điểm")
+    p.add_argument("--archived", action="store_true", help="Tìm trong mục lưu trữ (sự kiện cũ)")
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("import", help="Nhập sự kiện từ file JSON")
+    p.add_argument("file")
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="Xuất sự kiện ra file JSON hoặc ICS")
+    p.add_argument("file")
+    p.add_argument("--format", choices=["json", "ics"], help="Mặc định: theo phần mở rộng của file")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("archive", help="Lưu trữ sự kiện cũ và thu gọn CSDL")
+    p.add_argument("--days", type=int, default=archive.ARCHIVE_AFTER_DAYS,
+                   help=f"Lưu trữ sự kiện kết thúc quá số ngày này (mặc định: {archive.ARCHIVE_AFTER_DAYS})")
+    p.add_argument("--restore", type=int, metavar="ID", help="Khôi phục một sự kiện từ mục lưu trữ")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("migrate", help="Nâng cấp CSDL lên phiên bản lược đồ mới nhất")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("vacuum", help="Bật incremental VACUUM cho CSDL cũ (VACUUM toàn bộ một lần, có thể lâu)")
+    p.set_defaults(func=cmd_vacuum)
+
+    p = sub.add_parser("sync", help="Đồng bộ tăng dần với CSDL khác (chỉ gửi các thay đổi mới)")
+    group = p.add_mutually_exclusive_group(required=True)
+    group.add_argument("--with", dest="other", metavar="DB", help="Đồng bộ hai chiều với file CSDL khác")
+    group.add_argument("--export", metavar="FILE", help="Xuất các thay đổi ra file JSON")
+    group.add_argument("--apply", metavar="FILE", help="Áp dụng file thay đổi (từ --export của CSDL khác)")
+    p.add_argument("--since", type=int, default=0, help="Với --export: chỉ lấy thay đổi có seq lớn hơn (mặc định: 0 = tất cả)")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("run-daemon", help="Chạy dịch vụ nhắc nhở không cần giao diện")
+    p.add_argument("--sink", action="append", choices=["stdout", "log", "webhook"],
+                   help="Kênh thông báo, có thể lặp lại (mặc định: stdout)")
+    p.add_argument("--log-file", default="reminders.log")
+    p.add_argument("--webhook-url", help="VD: http://127.0.0.1:8765/notify")
+    p.add_argument("--interval", type=int, default=REMINDER_CHECK_INTERVAL_SECONDS, help="Chu kỳ kiểm tra (giây)")
+    p.add_argument("--once", action="store_true", help="Chỉ kiểm tra một lượt rồi thoát")
+    p.set_defaults(func=cmd_run_daemon)
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    db.DB_NAME = args.db
+    if args.tz: tu.set_timezone(args.tz)
+    db.init_db()
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"Lỗi: {e}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,115 +1,812 @@
+import hashlib
 import sqlite3
-from datetime import datetime
+import time
+import unicodedata
+import uuid
+from datetime import datetime, timedelta
+
+import recurrence as rec
+import time_utils as tu
 
 DB_NAME = "schedule.db"
 
-def init_db():
-    """Tạo bảng events nếu chưa tồn tại.
-    Thêm cột 'reminded' để theo dõi các pop-up.
-    """
+# Người dùng / lịch mặc định: dữ liệu cũ và các lệnh không chỉ định lịch sẽ thuộc về lịch này
+DEFAULT_USER_ID = 1
+DEFAULT_CALENDAR_ID = 1
+DEFAULT_CALENDAR_NAME = "Cá nhân"
+
+# Sự kiện không có giờ kết thúc được coi là kéo dài 1 tiếng (giống khi xuất ICS)
+DEFAULT_DURATION_MINUTES = 60
+# Mốc "vô cực" cho chuỗi lặp không giới hạn (31/12/9999)
+MAX_TIMESTAMP = 253402300799
+# Số sự kiện mỗi transaction khi nhập hàng loạt (add_events)
+IMPORT_BATCH_SIZE = 500
+
+def _connect():
+    """Mở kết nối tới CSDL (bật kiểm tra khóa ngoại, SQLite mặc định tắt)."""
     conn = sqlite3.connect(DB_NAME)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+# --- Thông báo thay đổi ---
+# Mọi hàm ghi vào bảng events gọi _notify sau khi commit, để các bộ nhớ đệm
+# (event_store.py) cập nhật theo mà không phải đọc lại toàn bộ CSDL.
+_listeners = []
+
+def add_listener(callback):
+    """Đăng ký callback(change, event_ids), gọi sau mỗi thao tác ghi vào events.
+    change: 'added' | 'updated' | 'deleted' | 'reset' (không rõ các dòng bị ảnh hưởng, cần tải lại)."""
+    _listeners.append(callback)
+
+def remove_listener(callback):
+    if callback in _listeners: _listeners.remove(callback)
+
+def _notify(change: str, event_ids=()):
+    for callback in list(_listeners):
+        try:
+            callback(change, list(event_ids))
+        except Exception as e:
+            print(f"Lỗi xử lý thông báo thay đổi ({change}): {e}")
+
+def init_db(progress=None):
+    """Tạo / nâng cấp CSDL lên phiên bản lược đồ mới nhất (xem migrations.py).
+    progress(version, description, done, total): báo tiến độ khi chuyển dữ liệu (mặc định in ra màn hình).
+    Một CSDL phục vụ được nhiều người: mỗi sự kiện thuộc một lịch (calendar_id),
+    mỗi lịch thuộc một người dùng; các truy vấn nhận tham số calendar_id để lọc theo lịch.
+    """
+    # Import trong hàm vì migrations.py dùng lại các hàm của module này
+    import migrations
+    migrations.migrate(progress=progress or migrations.print_progress)
+
+# --- Chuyển đổi thời gian (chỉ thực hiện ở biên API) ---
+
+def _zone(event: dict) -> str:
+    """Múi giờ IANA của sự kiện (dữ liệu cũ chưa có thì dùng múi giờ mặc định)."""
+    return event.get('timezone') or tu.TIMEZONE
+
+def _time_columns(event_data: dict, reminded: bool = False) -> dict:
+    """Tính các cột epoch từ dữ liệu ISO (giờ địa phương) của sự kiện."""
+    zone = _zone(event_data)
+    start = datetime.fromisoformat(event_data['start_time'])
+    cols = {
+        'start_epoch': tu.to_epoch(start, zone),
+        'end_epoch': tu.to_epoch(event_data.get('end_time'), zone),
+        'tz_offset': tu.utc_offset_minutes(start, zone),
+        'timezone': zone,
+        'recurrence_end_epoch': None,
+        'remind_at': None,
+    }
+    rule = event_data.get('recurrence')
+    if rule:
+        # Cận trên của chuỗi lặp để lọc nhanh bằng SQL (None nếu lặp vô hạn)
+        series_end = rec.series_end(start, rule, zone)
+        cols['recurrence_end_epoch'] = tu.to_epoch(series_end, zone) if series_end else None
+    # Cột remind_at chỉ còn dùng khi nâng cấp dữ liệu cũ (migrations v4 -> v9),
+    # từ v9 mốc nhắc nằm trong bảng reminders (xem _schedule_reminders)
+    minutes = event_data.get('reminder_minutes')
+    if minutes and minutes > 0 and not reminded:
+        if rule:
+            cols['remind_at'] = _next_series_remind_at(dict(event_data, timezone=zone, start_epoch=cols['start_epoch']), tu.now_local(zone))
+        else:
+            cols['remind_at'] = cols['start_epoch'] - minutes * 60
+    return cols
+
+def _format_exdates(exdates):
+    if not exdates: return None
+    if isinstance(exdates, str): return exdates
+    return ",".join(d.isoformat() if isinstance(d, datetime) else d for d in exdates)
+
+def _normalize_text(value) -> str:
+    """Chuẩn hóa chuỗi để so trùng: Unicode NFC, không phân biệt hoa thường, gộp khoảng trắng."""
+    return " ".join(unicodedata.normalize('NFC', value or "").casefold().split())
+
+def _content_hash(event: dict) -> str:
+    """
+    Mã băm nội dung (tên sự kiện + giờ bắt đầu + địa điểm) để phát hiện sự kiện trùng,
+    VD: nhập lại cùng một file JSON. event cần có 'start_epoch'.
+    Chỉ mục duy nhất (calendar_id, content_hash) đảm bảo mỗi lịch không có hai sự kiện trùng.
+    """
+    key = "\x1f".join((_normalize_text(event.get('event')), str(event['start_epoch']), _normalize_text(event.get('location'))))
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def _reminder_offsets(event_data: dict) -> list:
+    """
+    Các mốc nhắc trước (phút), giảm dần, không trùng. VD: [1440, 15] = trước 1 ngày và trước 15 phút.
+    Lấy từ 'reminder_offsets' (list hoặc chuỗi '1440,15'), không có thì từ 'reminder_minutes'.
+    """
+    offsets = event_data.get('reminder_offsets')
+    if offsets is None: offsets = [event_data.get('reminder_minutes')]
+    elif isinstance(offsets, str): offsets = offsets.split(',')
+    return sorted({int(m) for m in offsets if m not in (None, '') and int(m) > 0}, reverse=True)
+
+# --- Người dùng & lịch ---
+
+def _scope_filter(value, column="calendar_id"):
+    """Điều kiện SQL lọc theo lịch / người dùng (rỗng nếu value là None, tức không lọc)."""
+    if value is None: return "", ()
+    return f" AND {column} = ?", (value,)
+
+def add_user(name: str) -> int:
+    """Thêm người dùng (kèm một lịch cá nhân). Trả về ID người dùng."""
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        event TEXT NOT NULL,
-        start_time TEXT NOT NULL,
-        end_time TEXT,
-        location TEXT,
-        reminder_minutes INTEGER,
-        reminded INTEGER DEFAULT 0 
-    )
-    """)
+    cursor.execute("INSERT INTO users (name) VALUES (?)", (name,))
+    user_id = cursor.lastrowid
+    cursor.execute("INSERT INTO calendars (user_id, name) VALUES (?, ?)", (user_id, DEFAULT_CALENDAR_NAME))
     conn.commit()
     conn.close()
+    return user_id
 
-def add_event(event_data: dict):
-    """Thêm một sự kiện mới vào CSDL."""
-    conn = sqlite3.connect(DB_NAME)
+def get_user(name: str):
+    """Lấy người dùng theo tên (None nếu không tồn tại)."""
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM users WHERE name = ?", (name,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def add_calendar(user_id: int, name: str) -> int:
+    """Thêm một lịch cho người dùng. Trả về ID lịch."""
+    conn = _connect()
     cursor = conn.cursor()
+    cursor.execute("INSERT INTO calendars (user_id, name) VALUES (?, ?)", (user_id, name))
+    calendar_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return calendar_id
+
+def get_calendars(user_id: int = None):
+    """Lấy các lịch (của một người dùng nếu có user_id)."""
+    where, params = _scope_filter(user_id, "user_id")
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(f"SELECT * FROM calendars WHERE 1 = 1{where} ORDER BY id", params).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+def delete_calendar(calendar_id: int):
+    """Xóa một lịch cùng toàn bộ sự kiện của lịch đó."""
+    conn = _connect()
+    conn.execute("DELETE FROM calendars WHERE id = ?", (calendar_id,))
+    conn.commit()
+    conn.close()
+    # Các sự kiện của lịch bị xóa theo (ON DELETE CASCADE)
+    _notify('reset')
+
+# --- Sự kiện ---
+
+def _upsert_event(cursor, event_data: dict):
+    """
+    Thêm sự kiện, hoặc nếu lịch đã có sự kiện trùng nội dung (cùng content_hash) thì cập nhật
+    các trường còn lại (giờ kết thúc, nhắc nhở, lặp lại) của sự kiện đó (INSERT ... ON CONFLICT).
+    Cần chạy trong transaction BEGIN IMMEDIATE để bước kiểm tra trùng và bước ghi không bị xen ngang.
+    Trả về (id, thay đổi) với thay đổi là 'added', 'updated' hoặc None (trùng hoàn toàn).
+    """
+    cols = _time_columns(event_data)
+    offsets = _reminder_offsets(event_data)
+    calendar_id = event_data.get('calendar_id') or DEFAULT_CALENDAR_ID
+    content_hash = _content_hash(dict(event_data, **cols))
+    cursor.execute("SELECT id FROM events WHERE calendar_id = ? AND content_hash = ?", (calendar_id, content_hash))
+    existing = cursor.fetchone()
     cursor.execute("""
-    INSERT INTO events (event, start_time, end_time, location, reminder_minutes)
-    VALUES (?, ?, ?, ?, ?)
+    INSERT INTO events (event, start_time, end_time, location, reminder_minutes, reminder_offsets, recurrence, exdates,
+                        start_epoch, end_epoch, tz_offset, recurrence_end_epoch, timezone, calendar_id, content_hash, uid)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (calendar_id, content_hash) DO UPDATE SET
+        end_time = excluded.end_time, end_epoch = excluded.end_epoch,
+        reminder_minutes = excluded.reminder_minutes, reminder_offsets = excluded.reminder_offsets,
+        recurrence = excluded.recurrence, exdates = excluded.exdates,
+        recurrence_end_epoch = excluded.recurrence_end_epoch
+    WHERE events.end_epoch IS NOT excluded.end_epoch
+       OR events.reminder_offsets IS NOT excluded.reminder_offsets
+       OR events.recurrence IS NOT excluded.recurrence
+       OR events.exdates IS NOT excluded.exdates
     """, (
         event_data.get('event'),
         event_data.get('start_time'),
         event_data.get('end_time'),
         event_data.get('location'),
-        event_data.get('reminder_minutes')
+        # Mốc gần giờ bắt đầu nhất (tương thích với nơi chỉ dùng một mốc, VD: hiển thị cũ)
+        offsets[-1] if offsets else None,
+        ",".join(map(str, offsets)) or None,
+        event_data.get('recurrence'),
+        _format_exdates(event_data.get('exdates')),
+        cols['start_epoch'],
+        cols['end_epoch'],
+        cols['tz_offset'],
+        cols['recurrence_end_epoch'],
+        cols['timezone'],
+        calendar_id,
+        content_hash,
+        # Mã định danh không đổi giữa các CSDL (đồng bộ, xem sync.py)
+        event_data.get('uid') or uuid.uuid4().hex
     ))
+    if existing is None:
+        event_id, change = cursor.lastrowid, 'added'
+    else:
+        event_id, change = existing[0], ('updated' if cursor.rowcount > 0 else None)
+    if change:
+        _schedule_reminders(cursor, dict(event_data, **cols, id=event_id, reminder_offsets=offsets))
+    return event_id, change
+
+def add_event(event_data: dict) -> int:
+    """Thêm một sự kiện mới vào CSDL (vào lịch event_data['calendar_id'], mặc định là lịch cá nhân).
+    Nếu lịch đã có sự kiện trùng (cùng tên, giờ bắt đầu, địa điểm) thì cập nhật sự kiện đó thay vì thêm mới.
+    Trả về ID của sự kiện vừa thêm (hoặc của sự kiện trùng)."""
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        event_id, change = _upsert_event(cursor, event_data)
+    except sqlite3.Error:
+        # VD: lịch không tồn tại (khóa ngoại) -> đóng kết nối để không giữ khóa ghi
+        conn.close()
+        raise
     conn.commit()
     conn.close()
+    if change: _notify(change, [event_id])
+    return event_id
 
-def get_all_events():
-    """Lấy tất cả sự kiện, sắp xếp theo thời gian bắt đầu."""
-    conn = sqlite3.connect(DB_NAME)
+def _upsert_events(cursor, events, counts: dict, calendar_id: int = None):
+    """Phần ghi của add_events cho một lô (cộng dồn vào counts); sự kiện lỗi bị bỏ qua."""
+    for event_data in events:
+        try:
+            if calendar_id is not None: event_data = dict(event_data, calendar_id=calendar_id)
+            _, change = _upsert_event(cursor, event_data)
+            counts[change or 'unchanged'] += 1
+        except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+            print(f"Lỗi nhập sự kiện: {e}")
+            counts['failed'] += 1
+
+def add_events(events, calendar_id: int = None, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Nhập hàng loạt (VD: từ file JSON): đọc lần lượt từ `events` (list hoặc iterator),
+    mỗi lô batch_size sự kiện một transaction; sự kiện trùng được gộp như add_event.
+    Sự kiện lỗi (thiếu giờ, lịch không tồn tại, ...) bị bỏ qua.
+    Trả về số sự kiện {'added', 'updated', 'unchanged', 'failed'}.
+    """
+    counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+    conn = _connect()
+    cursor = conn.cursor()
+    batch = []
+    def flush():
+        cursor.execute("BEGIN IMMEDIATE")
+        _upsert_events(cursor, batch, counts, calendar_id)
+        conn.commit()
+        batch.clear()
+    try:
+        for event_data in events:
+            batch.append(event_data)
+            if len(batch) >= batch_size: flush()
+        if batch: flush()
+    finally:
+        conn.close()
+        # Nhiều dòng thay đổi: báo tải lại một lần thay vì từng sự kiện
+        if counts['added'] or counts['updated']: _notify('reset')
+    return counts
+
+def get_all_events(calendar_id: int = None):
+    """Lấy tất cả sự kiện (của một lịch nếu có calendar_id), sắp xếp theo thời gian bắt đầu.
+    Dòng cũ có thời gian không đọc được (nâng cấp v4 bỏ qua, start_epoch NULL) không được trả về."""
+    where, params = _scope_filter(calendar_id)
+    conn = _connect()
     conn.row_factory = sqlite3.Row # Trả về kết quả dạng dict
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events ORDER BY start_time ASC")
+    cursor.execute(f"SELECT * FROM events WHERE start_epoch IS NOT NULL{where} ORDER BY start_epoch ASC", params)
     events = [dict(row) for row in cursor.fetchall()]
     conn.close()
     return events
 
+def get_event(event_id: int, calendar_id: int = None):
+    """Lấy một sự kiện theo ID (None nếu không tồn tại hoặc không thuộc lịch calendar_id)."""
+    where, params = _scope_filter(calendar_id)
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM events WHERE id = ?{where}", (event_id, *params))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+def _delete_event(cursor, event_id: int):
+    cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
 def delete_event(event_id: int):
     """Xóa một sự kiện theo ID."""
-    conn = sqlite3.connect(DB_NAME)
+    conn = _connect()
     cursor = conn.cursor()
-    cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
+    _delete_event(cursor, event_id)
     conn.commit()
     conn.close()
+    _notify('deleted', [event_id])
 
-def update_event(event_id: int, event_data: dict):
-    """Cập nhật thông tin sự kiện theo ID."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def _update_event(cursor, event_id: int, event_data: dict):
+    """Ghi dữ liệu mới cho sự kiện và lập lại các mốc nhắc (dùng chung cho update_event và sync.py).
+    Sửa thành trùng với sự kiện khác trong lịch -> sqlite3.IntegrityError (chỉ mục content_hash).
+    Không có 'timezone' thì giữ múi giờ đang lưu của sự kiện (giờ ISO được hiểu theo múi giờ đó)."""
+    if not event_data.get('timezone'):
+        cursor.execute("SELECT timezone FROM events WHERE id = ?", (event_id,))
+        row = cursor.fetchone()
+        if row and row[0]: event_data = dict(event_data, timezone=row[0])
+    cols = _time_columns(event_data)
+    offsets = _reminder_offsets(event_data)
     cursor.execute("""
-    UPDATE events 
-    SET event = ?, start_time = ?, end_time = ?, location = ?, reminder_minutes = ?, reminded = 0
+    UPDATE events
+    SET event = ?, start_time = ?, end_time = ?, location = ?, reminder_minutes = ?, reminder_offsets = ?, reminded = 0,
+        recurrence = ?, exdates = ?, last_reminded = NULL,
+        start_epoch = ?, end_epoch = ?, tz_offset = ?, recurrence_end_epoch = ?, timezone = ?,
+        calendar_id = COALESCE(?, calendar_id), content_hash = ?
     WHERE id = ?
     """, (
         event_data.get('event'),
         event_data.get('start_time'),
         event_data.get('end_time'),
         event_data.get('location'),
-        event_data.get('reminder_minutes'),
+        offsets[-1] if offsets else None,
+        ",".join(map(str, offsets)) or None,
+        event_data.get('recurrence'),
+        _format_exdates(event_data.get('exdates')),
+        cols['start_epoch'],
+        cols['end_epoch'],
+        cols['tz_offset'],
+        cols['recurrence_end_epoch'],
+        cols['timezone'],
+        event_data.get('calendar_id'),
+        _content_hash(dict(event_data, **cols)),
         event_id
     ))
+    if cursor.rowcount:
+        _schedule_reminders(cursor, dict(event_data, **cols, id=event_id, reminder_offsets=offsets))
+
+def update_event(event_id: int, event_data: dict):
+    """Cập nhật thông tin sự kiện theo ID (giữ nguyên lịch / múi giờ nếu không có 'calendar_id' / 'timezone').
+    Các mốc nhắc được lập lại từ đầu theo thời gian mới."""
+    conn = _connect()
+    cursor = conn.cursor()
+    try:
+        _update_event(cursor, event_id, event_data)
+    except sqlite3.Error:
+        # VD: lịch không tồn tại (khóa ngoại) -> đóng kết nối để không giữ khóa ghi
+        conn.close()
+        raise
     conn.commit()
     conn.close()
+    _notify('updated', [event_id])
 
-# --- Chức năng quan trọng cho Hệ thống nhắc nhở (Mục 4) ---
+# --- Sự kiện lặp lại ---
+
+def expand_occurrence(event: dict, occ_start: datetime) -> dict:
+    """Tạo bản sao của chuỗi lặp cho một lần xảy ra cụ thể.
+    Giữ nguyên 'id' của chuỗi để sửa/xóa vẫn tác động lên chuỗi.
+    """
+    zone = _zone(event)
+    occ = dict(event)
+    occ['start_time'] = occ_start.isoformat()
+    occ['start_epoch'] = tu.to_epoch(occ_start, zone)
+    occ['tz_offset'] = tu.utc_offset_minutes(occ_start, zone)
+    if event.get('end_epoch') is not None:
+        # Thời lượng tính theo giờ địa phương để lần lặp giữ nguyên giờ kết thúc trên đồng hồ
+        occ_end = occ_start + (tu.from_epoch(event['end_epoch'], zone) - tu.from_epoch(event['start_epoch'], zone))
+        occ['end_time'] = occ_end.isoformat()
+        occ['end_epoch'] = tu.to_epoch(occ_end, zone)
+    occ['occurrence_start'] = occ_start.isoformat()
+    return occ
+
+def _series_start(event: dict) -> datetime:
+    """Giờ bắt đầu của chuỗi lặp theo giờ địa phương của chính chuỗi đó."""
+    return tu.from_epoch(event['start_epoch'], _zone(event))
+
+def local_times(event: dict):
+    """(bắt đầu, kết thúc hoặc None) theo giờ địa phương của múi giờ riêng của sự kiện, là cách
+    start_time / end_time được hiểu khi ghi (dùng cho form sửa để sửa xong không bị lệch giờ)."""
+    zone = _zone(event)
+    return tu.from_epoch(event['start_epoch'], zone), tu.from_epoch(event.get('end_epoch'), zone)
 
-def get_events_to_remind():
+def _series_window(event: dict, range_start: datetime, range_end: datetime):
+    """Đổi khoảng xem (theo múi giờ mặc định) sang giờ địa phương của chuỗi lặp."""
+    zone = _zone(event)
+    if zone == tu.TIMEZONE: return range_start, range_end
+    return tu.from_epoch(tu.to_epoch(range_start), zone), tu.from_epoch(tu.to_epoch(range_end), zone)
+
+def _next_series_remind_at(event: dict, after: datetime):
+    """Epoch cần nhắc cho lần xảy ra kế tiếp (sau mốc `after`, giờ địa phương của chuỗi), hoặc None."""
+    start = datetime.fromisoformat(event['start_time']) if event.get('start_epoch') is None else _series_start(event)
+    occ_start = rec.next_occurrence(start, event['recurrence'], after, event.get('exdates'), _zone(event))
+    if occ_start is None: return None
+    return tu.to_epoch(occ_start, _zone(event)) - event['reminder_minutes'] * 60
+
+def get_events_in_range(range_start: datetime, range_end: datetime, calendar_id: int = None):
     """
-    Lấy các sự kiện cần hiển thị pop-up.
-    Điều kiện:
-    1. Chưa được nhắc (reminded = 0)
-    2. Có đặt lịch nhắc (reminder_minutes > 0)
-    3. Sự kiện chưa diễn ra (start_time > now)
-    4. Thời gian nhắc nhở đã đến (now >= start_time - reminder_minutes)
+    Lấy các sự kiện trong khoảng [range_start, range_end), sắp xếp theo thời gian.
+    Chuỗi lặp chỉ được sinh ra các lần xảy ra nằm trong khoảng này.
+    Có calendar_id thì chỉ quét chỉ mục (calendar_id, start_epoch) của lịch đó.
     """
-    conn = sqlite3.connect(DB_NAME)
+    where, params = _scope_filter(calendar_id)
+    conn = _connect()
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    
-    cursor.execute("""
+    start_epoch, end_epoch = tu.to_epoch(range_start), tu.to_epoch(range_end)
+
+    cursor.execute(f"""
         SELECT * FROM events
-        WHERE reminded = 0
-        AND reminder_minutes IS NOT NULL
-        AND reminder_minutes > 0
-        AND start_time > strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')
-        AND strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime') >= 
-            strftime('%Y-%m-%d %H:%M:%S', start_time, '-' || reminder_minutes || ' minutes')
-    """)
-    
+        WHERE recurrence IS NULL{where}
+        AND start_epoch < ?
+        AND COALESCE(end_epoch, start_epoch) >= ?
+    """, (*params, end_epoch, start_epoch))
     events = [dict(row) for row in cursor.fetchall()]
+
+    # Chỉ lấy các chuỗi còn hiệu lực trong khoảng cần xem
+    cursor.execute(f"""
+        SELECT * FROM events
+        WHERE recurrence IS NOT NULL{where}
+        AND start_epoch < ?
+        AND (recurrence_end_epoch IS NULL OR recurrence_end_epoch >= ?)
+    """, (*params, end_epoch, start_epoch))
+    series = [dict(row) for row in cursor.fetchall()]
     conn.close()
+    return select_in_range(events + series, range_start, range_end)
+
+def select_in_range(rows, range_start: datetime, range_end: datetime):
+    """
+    Lọc các dòng (sự kiện / chuỗi lặp) giao với [range_start, range_end) và sinh các lần lặp
+    trong khoảng đó, sắp xếp theo thời gian. Dùng chung cho truy vấn CSDL và bộ nhớ đệm (event_store.py).
+    """
+    start_epoch, end_epoch = tu.to_epoch(range_start), tu.to_epoch(range_end)
+    events = []
+    for s in rows:
+        if s['start_epoch'] >= end_epoch: continue
+        if not s.get('recurrence'):
+            if (s['end_epoch'] if s.get('end_epoch') is not None else s['start_epoch']) >= start_epoch:
+                events.append(s)
+            continue
+        if s.get('recurrence_end_epoch') is not None and s['recurrence_end_epoch'] < start_epoch: continue
+        try:
+            series_start = _series_start(s)
+            duration = timedelta(seconds=s['end_epoch'] - s['start_epoch']) if s.get('end_epoch') is not None else None
+            window_start, window_end = _series_window(s, range_start, range_end)
+            # Lùi mốc bắt đầu theo thời lượng để lấy cả lần xảy ra đang diễn ra dở
+            if duration: window_start -= duration
+            for occ_start in rec.iter_occurrences(series_start, s['recurrence'], window_start, window_end, s.get('exdates'), _zone(s)):
+                events.append(expand_occurrence(s, occ_start))
+        except Exception as e:
+            print(f"Lỗi sinh lịch lặp cho sự kiện {s.get('id')}: {e}")
+
+    events.sort(key=lambda e: e['start_epoch'])
     return events
 
-def mark_as_reminded(event_id: int):
-    """Đánh dấu sự kiện là đã nhắc (reminded = 1)."""
-    conn = sqlite3.connect(DB_NAME)
+def _add_exdate(cursor, event_id: int, occurrence_start: str) -> bool:
+    """Thêm ngoại lệ cho chuỗi lặp (cursor cần row_factory = sqlite3.Row). Trả về False nếu không có sự kiện."""
+    cursor.execute("SELECT * FROM events WHERE id = ?", (event_id,))
+    row = cursor.fetchone()
+    if row is None: return False
+    event = dict(row)
+    exdates = [d for d in (event['exdates'] or "").split(',') if d]
+    if occurrence_start not in exdates:
+        exdates.append(occurrence_start)
+    event['exdates'] = ",".join(exdates)
+    cursor.execute("UPDATE events SET exdates = ? WHERE id = ?", (event['exdates'], event_id))
+    # Nhắc nhở đang chờ cho lần bị bỏ thì chuyển sang lần kế tiếp
+    occ_epoch = tu.to_epoch(datetime.fromisoformat(occurrence_start), _zone(event))
+    cursor.execute("SELECT id FROM reminders WHERE event_id = ? AND occurrence_epoch = ? AND state = 'pending'",
+                   (event_id, occ_epoch))
+    _finish_reminders(cursor, [r[0] for r in cursor.fetchall()])
+    return True
+
+def add_exdate(event_id: int, occurrence_start: str):
+    """Bỏ qua một lần xảy ra của chuỗi lặp (ngoại lệ)."""
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    found = _add_exdate(cursor, event_id, occurrence_start)
+    conn.commit()
+    conn.close()
+    if found: _notify('updated', [event_id])
+
+# --- Phát hiện trùng lịch & tìm giờ trống ---
+
+def _event_bounds(event: dict):
+    """Khoảng [bắt đầu, kết thúc) của sự kiện theo giờ địa phương của múi giờ mặc định."""
+    start = tu.from_epoch(event['start_epoch'])
+    if event.get('end_epoch') is not None:
+        end = start + timedelta(seconds=max(0, event['end_epoch'] - event['start_epoch']))
+    else:
+        end = start + timedelta(minutes=DEFAULT_DURATION_MINUTES)
+    return start, end
+
+def _overlaps(event: dict, start_epoch: int, end_epoch: int) -> bool:
+    ev_end_epoch = event['end_epoch'] if event.get('end_epoch') is not None else event['start_epoch'] + DEFAULT_DURATION_MINUTES * 60
+    return event['start_epoch'] < end_epoch and ev_end_epoch > start_epoch
+
+def get_occurrences_between(event: dict, range_start: datetime, range_end: datetime):
+    """Các lần xảy ra của một chuỗi lặp có thể giao với [range_start, range_end) (giờ mặc định)."""
+    series_start = _series_start(event)
+    if event.get('end_epoch') is not None:
+        duration = timedelta(seconds=max(0, event['end_epoch'] - event['start_epoch']))
+    else:
+        duration = timedelta(minutes=DEFAULT_DURATION_MINUTES)
+    window_start, window_end = _series_window(event, range_start, range_end)
+    return [expand_occurrence(event, occ_start)
+            for occ_start in rec.iter_occurrences(series_start, event['recurrence'], window_start - duration, window_end, event.get('exdates'),
+                                                    _zone(event))]
+
+def find_overlapping_events(start_time: datetime, end_time: datetime = None, exclude_id: int = None,
+                            calendar_id: int = None):
+    """
+    Tìm các sự kiện (kể cả từng lần xảy ra của chuỗi lặp) giao với khoảng [start_time, end_time),
+    trong lịch calendar_id nếu có.
+    Dùng R*Tree để lọc ứng viên, sau đó kiểm tra chính xác
+    (R*Tree lưu số thực 32-bit nên chỉ dùng làm bộ lọc thô).
+    """
+    where, params = _scope_filter(calendar_id, "events_rtree.calendar_lo")
+    if end_time is None or end_time <= start_time:
+        end_time = start_time + timedelta(minutes=DEFAULT_DURATION_MINUTES)
+    start_epoch, end_epoch = tu.to_epoch(start_time), tu.to_epoch(end_time)
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT events.* FROM events_rtree
+        JOIN events ON events.id = events_rtree.id
+        WHERE events_rtree.start_ts < ? AND events_rtree.end_ts > ?{where}
+    """, (end_epoch, start_epoch, *params))
+    candidates = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    overlaps = []
+    for event in candidates:
+        if exclude_id is not None and event['id'] == exclude_id: continue
+        try:
+            if not event.get('recurrence'):
+                if _overlaps(event, start_epoch, end_epoch): overlaps.append(event)
+                continue
+            occurrences = get_occurrences_between(event, start_time, end_time)
+            overlaps.extend(o for o in occurrences if _overlaps(o, start_epoch, end_epoch))
+        except Exception as e:
+            print(f"Lỗi kiểm tra trùng lịch cho sự kiện {event.get('id')}: {e}")
+
+    overlaps.sort(key=lambda e: e['start_epoch'])
+    return overlaps
+
+def find_free_slot(duration_minutes: int, after: datetime = None, search_days: int = 14,
+                   day_start_hour: int = 8, day_end_hour: int = 22, calendar_id: int = None):
+    """
+    Tìm khoảng trống đầu tiên dài ít nhất duration_minutes, trong khung giờ
+    [day_start_hour, day_end_hour) mỗi ngày, bắt đầu từ mốc `after`.
+    Chỉ đọc các sự kiện trong khoảng tìm kiếm (1 truy vấn R*Tree). Trả về (start, end) hoặc None.
+    """
+    if after is None: after = tu.now_local()
+    after = after.replace(second=0, microsecond=0)
+    duration = timedelta(minutes=duration_minutes)
+    horizon = after + timedelta(days=search_days)
+
+    busy = sorted(_event_bounds(e) for e in find_overlapping_events(after, horizon, calendar_id=calendar_id))
+
+    day = after.date()
+    while datetime.combine(day, datetime.min.time()) < horizon:
+        day_start = datetime.combine(day, datetime.min.time()) + timedelta(hours=day_start_hour)
+        day_end = datetime.combine(day, datetime.min.time()) + timedelta(hours=day_end_hour)
+        cursor_time = max(day_start, after)
+        for busy_start, busy_end in busy:
+            if busy_end <= cursor_time: continue
+            if busy_start >= day_end: break
+            if busy_start - cursor_time >= duration: break
+            cursor_time = max(cursor_time, busy_end)
+        if cursor_time + duration <= day_end:
+            return cursor_time, cursor_time + duration
+        day += timedelta(days=1)
+    return None
+
+# --- Chức năng quan trọng cho Hệ thống nhắc nhở (Mục 4) ---
+# Mỗi mốc nhắc là một dòng trong bảng reminders (event_id, offset_minutes, occurrence_epoch,
+# remind_at, state), nên một sự kiện có thể nhắc nhiều lần ("trước 1 ngày và 15 phút")
+# và việc kiểm tra chỉ quét chỉ mục của các nhắc nhở đang chờ (state = 'pending'),
+# không phụ thuộc vào số sự kiện.
+# - occurrence_epoch: giờ bắt đầu của sự kiện / lần xảy ra mà mốc này nhắc tới
+# - offset_minutes NULL: nhắc nhở báo lại (snooze), chỉ dùng một lần
+# - chuỗi lặp: mỗi mốc luôn trỏ tới lần xảy ra kế tiếp (sau khi nhắc thì dời sang lần sau)
+
+def _schedule_reminders(cursor, event: dict):
+    """Lập lại các nhắc nhở của một sự kiện (dòng của events hoặc dữ liệu kèm cột epoch)."""
+    cursor.execute("DELETE FROM reminders WHERE event_id = ?", (event['id'],))
+    offsets = _reminder_offsets(event)
+    if not offsets: return
+    now = int(time.time())
+    if event.get('recurrence'):
+        # Chuỗi lặp: mỗi mốc nhắc gắn với lần xảy ra đầu tiên mà mốc đó còn ở tương lai
+        # (VD: tạo chuỗi hàng ngày 2 tiếng trước lần đầu, mốc "trước 1 ngày" bắt đầu từ lần thứ hai)
+        zone = _zone(event)
+        series_start = tu.from_epoch(event['start_epoch'], zone)
+        exdates = _format_exdates(event.get('exdates'))
+        rows = []
+        for m in offsets:
+            occ_start = rec.next_occurrence(series_start, event['recurrence'], tu.from_epoch(now + m * 60, zone), exdates, zone)
+            if occ_start is None: continue
+            occ_epoch = tu.to_epoch(occ_start, zone)
+            rows.append((event['id'], m, occ_epoch, occ_epoch - m * 60))
+    else:
+        occ_epoch = event['start_epoch']
+        if occ_epoch <= now: return
+        # Mốc đã qua thì bỏ, trừ khi mọi mốc đều đã qua: khi đó nhắc ngay một lần
+        offsets = [m for m in offsets if occ_epoch - m * 60 > now] or offsets[-1:]
+        rows = [(event['id'], m, occ_epoch, occ_epoch - m * 60) for m in offsets]
+    cursor.executemany("INSERT INTO reminders (event_id, offset_minutes, occurrence_epoch, remind_at) VALUES (?, ?, ?, ?)", rows)
+
+def _finish_reminders(cursor, reminder_ids, after_epoch: int = 0):
+    """
+    Kết thúc các nhắc nhở (đã nhắc hoặc đã lỡ): báo lại thì xóa, chuỗi lặp chuyển sang
+    lần xảy ra kế tiếp (sau occurrence_epoch và sau after_epoch), còn lại chuyển sang 'sent'.
+    Trả về ID các sự kiện bị ảnh hưởng.
+    """
+    if not reminder_ids: return []
+    placeholders = ",".join("?" * len(reminder_ids))
+    cursor.execute(f"""
+        SELECT reminders.id, reminders.offset_minutes, reminders.occurrence_epoch,
+               events.id, events.start_epoch, events.recurrence, events.exdates, events.timezone
+        FROM reminders JOIN events ON events.id = reminders.event_id
+        WHERE reminders.id IN ({placeholders})
+    """, list(reminder_ids))
+    deleted, sent, advanced, event_ids = [], [], [], set()
+    now = int(time.time())
+    for rid, offset, occ_epoch, event_id, start_epoch, rule, exdates, zone in cursor.fetchall():
+        event_ids.add(event_id)
+        if offset is None:
+            deleted.append((rid,))
+        elif rule:
+            zone = zone or tu.TIMEZONE
+            try:
+                # Lần kế tiếp mà mốc nhắc này chưa qua (mốc lớn hơn chu kỳ lặp thì bỏ qua vài lần)
+                next_start = rec.next_occurrence(tu.from_epoch(start_epoch, zone), rule,
+                                                 tu.from_epoch(max(occ_epoch, after_epoch, now + offset * 60), zone), exdates, zone)
+            except Exception as e:
+                print(f"Lỗi tính lần nhắc kế tiếp cho chuỗi lặp {event_id}: {e}")
+                next_start = None
+            if next_start is None:
+                sent.append((rid,))
+            else:
+                next_epoch = tu.to_epoch(next_start, zone)
+                advanced.append((next_epoch, next_epoch - offset * 60, rid))
+        else:
+            sent.append((rid,))
+    cursor.executemany("DELETE FROM reminders WHERE id = ?", deleted)
+    cursor.executemany("UPDATE reminders SET state = 'sent' WHERE id = ?", sent)
+    cursor.executemany("UPDATE reminders SET occurrence_epoch = ?, remind_at = ?, state = 'pending' WHERE id = ?", advanced)
+    return list(event_ids)
+
+def _pending_filter(calendar_id):
+    """Điều kiện lọc nhắc nhở theo lịch (qua event_id, không cần JOIN khi không lọc)."""
+    if calendar_id is None: return "", ()
+    return " AND event_id IN (SELECT id FROM events WHERE calendar_id = ?)", (calendar_id,)
+
+def next_remind_at(calendar_id: int = None):
+    """Mốc nhắc sớm nhất đang chờ (epoch), MAX_TIMESTAMP nếu không có. Chỉ đọc đầu chỉ mục."""
+    where, params = _pending_filter(calendar_id)
+    conn = _connect()
+    row = conn.execute(f"SELECT MIN(remind_at) FROM reminders WHERE state = 'pending'{where}", params).fetchone()
+    conn.close()
+    return row[0] if row[0] is not None else MAX_TIMESTAMP
+
+def _expire_reminders(cursor, expired, now: int = None) -> list:
+    """
+    Kết thúc các nhắc nhở đã lỡ [(id, occurrence_epoch)] (chuỗi lặp chuyển sang lần kế tiếp).
+    Mốc đã được xử lý trong lúc chờ ghi (không còn chờ hoặc đã sang lần khác) thì bỏ qua,
+    để gửi lại cùng danh sách không làm chuỗi lặp nhảy qua một lần.
+    Trả về ID các sự kiện bị ảnh hưởng.
+    """
+    reminder_ids = [rid for rid, occ_epoch in expired
+                    if cursor.execute("SELECT 1 FROM reminders WHERE id = ? AND occurrence_epoch = ? AND state = 'pending'",
+                                      (rid, occ_epoch)).fetchone()]
+    return _finish_reminders(cursor, reminder_ids, now or int(time.time()))
+
+def get_events_to_remind(calendar_id: int = None, writer=None):
+    """
+    Lấy các sự kiện cần hiển thị pop-up: quét các nhắc nhở đang chờ có remind_at <= now
+    (chỉ mục một phần idx_reminders_pending), chi phí tỉ lệ với số nhắc nhở đến hạn.
+    Nhiều mốc của cùng một lần xảy ra đến hạn cùng lúc chỉ tạo một thông báo;
+    mỗi sự kiện trả về kèm 'reminder_ids' để mark_as_reminded đánh dấu đúng các mốc đó.
+    Sự kiện đã bắt đầu mà chưa kịp nhắc (VD: ứng dụng bị tắt) sẽ được bỏ qua.
+    Có calendar_id thì chỉ kiểm tra lịch đó.
+    Có writer (DatabaseWriter) thì hàm chỉ đọc: các mốc đã lỡ được gửi cho thread ghi xử lý.
+    """
+    where, params = _pending_filter(calendar_id)
+    now = int(time.time())
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    cursor.execute(f"""
+        SELECT id, event_id, occurrence_epoch FROM reminders
+        WHERE state = 'pending' AND remind_at <= ?{where}
+    """, (now, *params))
+    groups = {}
+    for row in cursor.fetchall():
+        groups.setdefault((row['event_id'], row['occurrence_epoch']), []).append(row['id'])
+    if not groups:
+        conn.close()
+        return []
+    event_ids = list({event_id for event_id, _ in groups})
+    cursor.execute(f"SELECT * FROM events WHERE id IN ({','.join('?' * len(event_ids))})", event_ids)
+    rows = {row['id']: dict(row) for row in cursor.fetchall()}
+
+    events, expired = [], []
+    for (event_id, occ_epoch), reminder_ids in groups.items():
+        event = rows[event_id]
+        if occ_epoch <= now:
+            # Đã lỡ -> chuỗi lặp chuyển sang lần kế tiếp
+            expired.extend((rid, occ_epoch) for rid in reminder_ids)
+            continue
+        try:
+            if event.get('recurrence'):
+                event = expand_occurrence(event, tu.from_epoch(occ_epoch, _zone(event)))
+            events.append(dict(event, reminder_ids=reminder_ids))
+        except Exception as e:
+            print(f"Lỗi kiểm tra nhắc nhở sự kiện {event_id}: {e}")
+
+    if writer is not None:
+        conn.close()
+        if expired: writer.expire_reminders(expired)
+    else:
+        changed = _expire_reminders(cursor, expired, now)
+        if changed: conn.commit()
+        conn.close()
+        if changed: _notify('updated', changed)
+    events.sort(key=lambda e: e['start_epoch'])
+    return events
+
+def _mark_as_reminded(cursor, event_id: int, occurrence_start: str = None, reminder_ids=None):
+    """Phần ghi của mark_as_reminded (cursor cần row_factory = sqlite3.Row)."""
+    if reminder_ids is None:
+        cursor.execute("SELECT * FROM events WHERE id = ?", (event_id,))
+        row = cursor.fetchone()
+        occ_filter, params = "", ()
+        if row is not None and occurrence_start:
+            occ_filter, params = " AND occurrence_epoch = ?", (tu.to_epoch(datetime.fromisoformat(occurrence_start), _zone(dict(row))),)
+        cursor.execute(f"SELECT id FROM reminders WHERE event_id = ? AND state = 'pending' AND remind_at <= ?{occ_filter}",
+                       (event_id, int(time.time()), *params))
+        reminder_ids = [r[0] for r in cursor.fetchall()]
+    _finish_reminders(cursor, reminder_ids)
+    # Cột cũ, giữ lại để biết sự kiện / lần xảy ra gần nhất đã được nhắc
+    if occurrence_start:
+        cursor.execute("UPDATE events SET last_reminded = ? WHERE id = ?", (occurrence_start, event_id))
+    else:
+        cursor.execute("UPDATE events SET reminded = 1 WHERE id = ?", (event_id,))
+
+def mark_as_reminded(event_id: int, occurrence_start: str = None, reminder_ids=None):
+    """
+    Đánh dấu đã nhắc: các mốc reminder_ids (từ get_events_to_remind), hoặc nếu không có
+    thì mọi mốc đã đến hạn của sự kiện / lần xảy ra occurrence_start.
+    Với chuỗi lặp, các mốc được dời sang lần xảy ra kế tiếp.
+    """
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
-    cursor.execute("UPDATE events SET reminded = 1 WHERE id = ?", (event_id,))
+    _mark_as_reminded(cursor, event_id, occurrence_start, reminder_ids)
     conn.commit()
-    conn.close()
\ No newline at end of file
+    conn.close()
+    _notify('updated', [event_id])
+
+def _snooze_reminders(cursor, events, minutes: int) -> list:
+    """Phần ghi của snooze_reminders. Trả về id các sự kiện đã được hẹn báo lại."""
+    now = int(time.time())
+    rows = [(min(now + minutes * 60, e['start_epoch'] - 1), e['start_epoch'], e['id'])
+            for e in events if e['start_epoch'] > now]
+    # INSERT ... SELECT: sự kiện vừa bị xóa thì bỏ qua thay vì lỗi khóa ngoại
+    cursor.executemany("""
+        INSERT INTO reminders (event_id, offset_minutes, occurrence_epoch, remind_at)
+        SELECT id, NULL, ?2, ?1 FROM events WHERE id = ?3
+    """, rows)
+    return [event_id for _, _, event_id in rows]
+
+def snooze_reminders(events, minutes: int) -> list:
+    """
+    Báo lại các sự kiện / lần xảy ra (dict có 'id' và 'start_epoch') sau `minutes` phút:
+    thêm một nhắc nhở dùng một lần cho mỗi sự kiện, một transaction cho cả nhóm.
+    Mốc nhắc mới không vượt quá lúc sự kiện bắt đầu (sự kiện đã bắt đầu thì không báo lại nữa).
+    Trả về id các sự kiện đã được hẹn báo lại.
+    """
+    conn = _connect()
+    cursor = conn.cursor()
+    snoozed = _snooze_reminders(cursor, events, minutes)
+    conn.commit()
+    conn.close()
+    if snoozed: _notify('updated', snoozed)
+    return snoozed
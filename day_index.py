@@ -0,0 +1,158 @@
+import bisect
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import database as db
+import time_utils as tu
+
+# ==============================================================================
+# CHỈ MỤC THEO NGÀY CHO LỊCH DẠNG LƯỚI (NGÀY / TUẦN / THÁNG)
+# Mỗi ngày -> danh sách khóa sự kiện sắp xếp theo giờ bắt đầu, dựng theo từng tháng
+# khi cần xem và cập nhật từng sự kiện qua EventStore.subscribe (không dựng lại cả tháng).
+# - Sự kiện không lặp được xếp sẵn theo tháng (_by_month), nên dựng một tháng chỉ
+#   duyệt các sự kiện của tháng đó cộng với các chuỗi lặp, không quét toàn bộ bảng.
+# - Chỉ giữ tối đa MAX_CACHED_MONTHS tháng đã dựng (tháng ít dùng nhất bị bỏ trước),
+#   để bộ nhớ không tăng theo số tháng đã xem.
+# Ngày tính theo múi giờ mặc định (time_utils.TIMEZONE).
+# ==============================================================================
+
+MAX_CACHED_MONTHS = 6
+
+def _month_range(year, month):
+    """Khoảng [ngày 1 của tháng, ngày 1 của tháng sau)."""
+    start = datetime(year, month, 1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def _months_between(first: date, last: date):
+    """Các tháng (năm, tháng) từ ngày first đến ngày last."""
+    year, month = first.year, first.month
+    while (year, month) <= (last.year, last.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+def _span(event, range_start: datetime = None, range_end: datetime = None):
+    """Ngày đầu và ngày cuối (giờ địa phương) sự kiện chiếm, cắt theo [range_start, range_end) nếu có."""
+    start = tu.from_epoch(event['start_epoch'])
+    end_epoch = event.get('end_epoch')
+    # Kết thúc đúng 0h thì không tính sang ngày đó
+    last = (tu.from_epoch(end_epoch) - timedelta(microseconds=1)) if end_epoch is not None and end_epoch > event['start_epoch'] else start
+    if range_start is not None: start = max(start, range_start)
+    if range_end is not None: last = min(last, range_end - timedelta(microseconds=1))
+    return start.date(), last.date()
+
+class _Month:
+    """Các ngày của một tháng đã dựng: ngày -> [khóa (start_epoch, id, occurrence_start)]."""
+    __slots__ = ('start', 'end', 'days', 'events')
+
+    def __init__(self, year, month):
+        self.start, self.end = _month_range(year, month)
+        self.days = {}
+        # id -> {khóa: (sự kiện / lần lặp, ngày đầu, ngày cuối)} để gỡ đúng các ngày khi sự kiện đổi
+        self.events = {}
+
+    def add(self, event):
+        key = (event['start_epoch'], event['id'], event.get('occurrence_start') or '')
+        first, last = _span(event, self.start, self.end)
+        day = first
+        while day <= last:
+            bisect.insort(self.days.setdefault(day, []), key)
+            day += timedelta(days=1)
+        self.events.setdefault(event['id'], {})[key] = (event, first, last)
+
+    def remove(self, event_id):
+        for key, (_, first, last) in self.events.pop(event_id, {}).items():
+            day = first
+            while day <= last:
+                keys = self.days[day]
+                del keys[bisect.bisect_left(keys, key)]
+                if not keys: del self.days[day]
+                day += timedelta(days=1)
+
+    def get(self, key):
+        return self.events[key[1]][key][0]
+
+class DayIndex:
+    def __init__(self, store, max_months: int = MAX_CACHED_MONTHS):
+        self.store = store
+        self.max_months = max_months
+        self._lock = threading.RLock()
+        self._by_month = {}             # (năm, tháng) -> {id: sự kiện không lặp}
+        self._months_of = {}            # id -> các tháng của sự kiện trong _by_month
+        self._series = {}               # id -> chuỗi lặp
+        self._months = OrderedDict()    # (năm, tháng) -> _Month đã dựng, theo thứ tự dùng gần nhất
+        # Tăng mỗi khi có thay đổi: giao diện so sánh để biết cần vẽ lại
+        self.version = 0
+        with self._lock:
+            for event in store.get_all_events():
+                self._place(event)
+        store.subscribe(self._on_change)
+
+    def close(self):
+        self.store.unsubscribe(self._on_change)
+
+    # --- Cập nhật từng sự kiện ---
+
+    def _place(self, event):
+        event_id = event['id']
+        if event.get('recurrence'):
+            self._series[event_id] = event
+            targets = list(self._months.values())
+        else:
+            first, last = _span(event)
+            months = list(_months_between(first, last))
+            for ym in months:
+                self._by_month.setdefault(ym, {})[event_id] = event
+            self._months_of[event_id] = months
+            targets = [self._months[ym] for ym in months if ym in self._months]
+        for month in targets:
+            for occ in db.select_in_range([event], month.start, month.end):
+                month.add(occ)
+
+    def _unplace(self, event_id):
+        if self._series.pop(event_id, None) is None:
+            for ym in self._months_of.pop(event_id, ()):
+                events = self._by_month[ym]
+                events.pop(event_id, None)
+                if not events: del self._by_month[ym]
+        for month in self._months.values():
+            month.remove(event_id)
+
+    def _on_change(self, change, event):
+        """Nhận thay đổi từ EventStore (có thể ở thread khác): chỉ sửa các ngày của sự kiện này."""
+        with self._lock:
+            self._unplace(event['id'])
+            if change != 'deleted':
+                self._place(event)
+            self.version += 1
+
+    # --- Đọc ---
+
+    def _month(self, ym):
+        """Tháng đã dựng (dựng nếu chưa có, bỏ tháng ít dùng nhất khi vượt giới hạn)."""
+        month = self._months.get(ym)
+        if month is not None:
+            self._months.move_to_end(ym)
+            return month
+        month = _Month(*ym)
+        candidates = list(self._by_month.get(ym, {}).values()) + list(self._series.values())
+        for occ in db.select_in_range(candidates, month.start, month.end):
+            month.add(occ)
+        self._months[ym] = month
+        while len(self._months) > self.max_months:
+            self._months.popitem(last=False)
+        return month
+
+    def events_between(self, first_day: date, last_day: date) -> dict:
+        """{ngày: [sự kiện / lần lặp theo giờ bắt đầu]} cho các ngày có sự kiện trong [first_day, last_day]."""
+        result = {}
+        with self._lock:
+            for ym in _months_between(first_day, last_day):
+                month = self._month(ym)
+                for day, keys in month.days.items():
+                    if first_day <= day <= last_day:
+                        result[day] = [month.get(key) for key in keys]
+        return result
+
+    def events_on(self, day: date) -> list:
+        return self.events_between(day, day).get(day, [])
@@ -0,0 +1,242 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import archive
+import database as db
+
+# ==============================================================================
+# THREAD GHI CSDL (WRITE-BEHIND)
+# Giao diện và thread nhắc nhở không ghi trực tiếp vào schedule.db nữa mà gửi lệnh ghi
+# vào hàng đợi; một thread duy nhất giữ kết nối ghi, gom các lệnh đang chờ vào một
+# transaction (group commit) và trả kết quả qua Future.
+# - CSDL đang bận / bị khóa (VD: đang nhập file, ổ mạng chậm) chỉ làm thread này chờ,
+#   giao diện không bị treo với lỗi "database is locked".
+# - Mỗi lệnh chạy trong một SAVEPOINT: lệnh lỗi bị hoàn tác riêng, không kéo theo cả nhóm.
+# - Sau khi commit, thay đổi được báo qua db._notify như các hàm ghi của database.py
+#   (EventStore cập nhật theo), gộp theo loại thay đổi cho cả nhóm.
+# ==============================================================================
+
+# Số lệnh tối đa trong một transaction
+GROUP_COMMIT_MAX = 200
+# Sau lệnh đầu tiên, chờ thêm chừng này giây để gom các lệnh gửi tới gần như cùng lúc
+GROUP_COMMIT_WAIT_SECONDS = 0.005
+# SQLite tự chờ khóa ghi tối đa chừng này giây trước khi báo "database is locked"
+BUSY_TIMEOUT_SECONDS = 10
+# CSDL vẫn bị khóa sau BUSY_TIMEOUT_SECONDS: thử lại bao nhiêu lần trước khi báo lỗi cho các lệnh
+MAX_LOCKED_RETRIES = 6
+
+class _Command:
+    __slots__ = ('fn', 'args', 'future')
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+
+# --- Các lệnh ghi: fn(cursor, *args) -> (kết quả, [(change, event_ids)] cần thông báo) ---
+
+def _add_event(cursor, event_data):
+    event_id, change = db._upsert_event(cursor, event_data)
+    return event_id, [(change, [event_id])] if change else []
+
+def _update_event(cursor, event_id, event_data):
+    db._update_event(cursor, event_id, event_data)
+    return None, [('updated', [event_id])]
+
+def _delete_event(cursor, event_id):
+    db._delete_event(cursor, event_id)
+    return None, [('deleted', [event_id])]
+
+def _add_exdate(cursor, event_id, occurrence_start):
+    found = db._add_exdate(cursor, event_id, occurrence_start)
+    return found, [('updated', [event_id])] if found else []
+
+def _mark_as_reminded(cursor, event_id, occurrence_start, reminder_ids):
+    db._mark_as_reminded(cursor, event_id, occurrence_start, reminder_ids)
+    return None, [('updated', [event_id])]
+
+def _snooze_reminders(cursor, events, minutes):
+    snoozed = db._snooze_reminders(cursor, events, minutes)
+    return snoozed, [('updated', snoozed)] if snoozed else []
+
+def _add_events(cursor, events, calendar_id):
+    counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+    db._upsert_events(cursor, events, counts, calendar_id)
+    # Nhiều dòng thay đổi: báo tải lại một lần như db.add_events
+    return counts, [('reset', [])] if counts['added'] or counts['updated'] else []
+
+def _restore_archived(cursor, event_id):
+    restored = archive._restore_event(cursor, event_id)
+    return restored, [('added', [event_id])] if restored else []
+
+def _delete_archived(cursor, event_id):
+    archive._delete_archived(cursor, event_id)
+    return None, []
+
+def _expire_reminders(cursor, expired):
+    changed = db._expire_reminders(cursor, expired)
+    return changed, [('updated', changed)] if changed else []
+
+class DatabaseWriter:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def close(self, timeout: float = None):
+        """Ghi nốt các lệnh đang chờ rồi dừng thread (gọi khi thoát ứng dụng)."""
+        if self._thread is None: return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def pending(self) -> int:
+        """Số lệnh đang chờ ghi (ước lượng)."""
+        return self._queue.qsize()
+
+    # --- Gửi lệnh (gọi từ thread bất kỳ, không chờ CSDL) ---
+
+    def submit(self, fn, *args) -> Future:
+        command = _Command(fn, args)
+        self._queue.put(command)
+        return command.future
+
+    def add_event(self, event_data: dict) -> Future:
+        """Như db.add_event; Future trả về ID sự kiện."""
+        return self.submit(_add_event, event_data)
+
+    def update_event(self, event_id: int, event_data: dict) -> Future:
+        return self.submit(_update_event, event_id, event_data)
+
+    def delete_event(self, event_id: int) -> Future:
+        return self.submit(_delete_event, event_id)
+
+    def add_exdate(self, event_id: int, occurrence_start: str) -> Future:
+        return self.submit(_add_exdate, event_id, occurrence_start)
+
+    def mark_as_reminded(self, event_id: int, occurrence_start: str = None, reminder_ids=None) -> Future:
+        return self.submit(_mark_as_reminded, event_id, occurrence_start, reminder_ids)
+
+    def snooze_reminders(self, events, minutes: int) -> Future:
+        """Như db.snooze_reminders; Future trả về id các sự kiện đã được hẹn báo lại."""
+        # Chép lại các trường cần dùng: bản ghi của giao diện có thể bị thay trước khi lệnh chạy
+        events = [{'id': e['id'], 'start_epoch': e['start_epoch']} for e in events]
+        return self.submit(_snooze_reminders, events, minutes)
+
+    def add_events(self, events, calendar_id: int = None, batch_size: int = db.IMPORT_BATCH_SIZE) -> Future:
+        """
+        Như db.add_events: mỗi lô batch_size sự kiện là một lệnh (transaction riêng, không giữ
+        khóa ghi lâu). Future trả về tổng số đếm {'added', 'updated', 'unchanged', 'failed'}.
+        """
+        events = list(events)
+        futures = [self.submit(_add_events, events[i:i + batch_size], calendar_id)
+                   for i in range(0, len(events), batch_size)]
+        result = Future()
+        def finish(_):
+            # Các lệnh chạy theo thứ tự gửi: lô cuối xong thì mọi lô đã xong
+            counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'failed': 0}
+            for future in futures:
+                if future.exception() is not None:
+                    result.set_exception(future.exception())
+                    return
+                for key, value in future.result().items(): counts[key] += value
+            result.set_result(counts)
+        if futures:
+            futures[-1].add_done_callback(finish)
+        else:
+            finish(None)
+        return result
+
+    def restore_archived(self, event_id: int) -> Future:
+        """Như archive.restore_event; Future trả về False nếu không tìm thấy."""
+        return self.submit(_restore_archived, event_id)
+
+    def delete_archived(self, event_id: int) -> Future:
+        return self.submit(_delete_archived, event_id)
+
+    def expire_reminders(self, expired) -> Future:
+        """Các nhắc nhở đã lỡ [(id, occurrence_epoch)] từ db.get_events_to_remind; Future trả về id các sự kiện bị ảnh hưởng."""
+        return self.submit(_expire_reminders, list(expired))
+
+    # --- Thread ghi ---
+
+    def _run(self):
+        conn = db._connect()
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_SECONDS * 1000}")
+        stopping = False
+        try:
+            while not stopping:
+                command = self._queue.get()
+                if command is None: break
+                batch = [command]
+                deadline = time.monotonic() + GROUP_COMMIT_WAIT_SECONDS
+                while len(batch) < GROUP_COMMIT_MAX:
+                    try:
+                        command = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if command is None:
+                        stopping = True
+                        break
+                    batch.append(command)
+                self._commit(conn, batch)
+        finally:
+            conn.close()
+
+    def _begin(self, cursor):
+        """BEGIN IMMEDIATE, thử lại khi CSDL bị khóa lâu (các lệnh vẫn nằm chờ, giao diện không bị ảnh hưởng)."""
+        for attempt in range(MAX_LOCKED_RETRIES):
+            try:
+                cursor.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == MAX_LOCKED_RETRIES - 1 or 'locked' not in str(e): raise
+                print(f"CSDL đang bị khóa, thử ghi lại ({attempt + 1}/{MAX_LOCKED_RETRIES - 1})...")
+
+    def _commit(self, conn, batch):
+        """Chạy một nhóm lệnh trong một transaction, rồi báo kết quả / thay đổi."""
+        batch = [c for c in batch if c.future.set_running_or_notify_cancel()]
+        if not batch: return
+        cursor = conn.cursor()
+        try:
+            self._begin(cursor)
+        except sqlite3.Error as e:
+            for command in batch: command.future.set_exception(e)
+            return
+
+        done = []
+        for command in batch:
+            cursor.execute("SAVEPOINT command")
+            try:
+                result, changes = command.fn(cursor, *command.args)
+            except Exception as e:
+                cursor.execute("ROLLBACK TO command")
+                cursor.execute("RELEASE command")
+                command.future.set_exception(e)
+                continue
+            cursor.execute("RELEASE command")
+            done.append((command, result, changes))
+        try:
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            for command, _, _ in done: command.future.set_exception(e)
+            return
+
+        # Gộp thông báo cùng loại của cả nhóm (giữ thứ tự xuất hiện)
+        notifications = {}
+        for _, _, changes in done:
+            for change, event_ids in changes:
+                notifications.setdefault(change, []).extend(event_ids)
+        for change, event_ids in notifications.items():
+            db._notify(change, event_ids)
+        for command, result, _ in done:
+            command.future.set_result(result)
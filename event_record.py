@@ -0,0 +1,56 @@
+import recurrence as rec
+import time_utils as tu
+from reminder_service import format_offsets, format_reminder
+
+# ==============================================================================
+# BẢN GHI SỰ KIỆN ĐỂ HIỂN THỊ
+# Giữ sẵn thời gian đã đổi sang giờ địa phương và chuỗi hiển thị (chỉ tạo lần đầu
+# cần dùng), để mỗi lần vẽ lại danh sách không phải định dạng lại mọi sự kiện.
+# EventStore giữ các bản ghi này và chỉ bỏ đi khi sự kiện bị sửa (xem DISPLAY_FIELDS).
+# ==============================================================================
+
+# Các trường ảnh hưởng tới chuỗi hiển thị: thay đổi trường khác (VD: reminded, remind_at)
+# không làm mất bản ghi đã lưu
+DISPLAY_FIELDS = ('event', 'start_epoch', 'end_epoch', 'location', 'reminder_minutes', 'reminder_offsets',
+                  'recurrence', 'exdates', 'timezone', 'archived_at')
+
+class EventRecord:
+    """Bọc dict sự kiện (đọc được như dict: record['id'], record.get(...)) kèm giá trị đã tính sẵn."""
+    __slots__ = ('data', 'start', 'end', '_display', '_reminder_text')
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.start = tu.from_epoch(data['start_epoch'])
+        self.end = tu.from_epoch(data['end_epoch']) if data.get('end_epoch') is not None else None
+        self._display = None
+        self._reminder_text = None
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    @property
+    def display(self) -> str:
+        """Dòng hiển thị trong danh sách, VD: 'ID 3: [20/11 09:00 - 10:00] Họp nhóm - P301'."""
+        if self._display is None:
+            event = self.data
+            dt_str = self.start.strftime('%d/%m %H:%M')
+            if self.end is not None:
+                # Nếu cùng ngày thì chỉ hiện giờ kết thúc, khác ngày thì hiện cả ngày tháng
+                dt_str += f" - {self.end.strftime('%H:%M') if self.start.date() == self.end.date() else self.end.strftime('%d/%m %H:%M')}"
+            loc = f" - {event['location']}" if event['location'] else ""
+            offsets = format_offsets(event)
+            rem = f" (Nhắc trước {offsets})" if offsets else ""
+            rep = f" (Lặp {rec.describe_rrule(event['recurrence'], event.get('timezone'))})" if event.get('recurrence') else ""
+            arc = " [Lưu trữ]" if event.get('archived_at') else ""
+            self._display = f"ID {event['id']}: [{dt_str}] {event['event']}{loc}{rem}{rep}{arc}"
+        return self._display
+
+    @property
+    def reminder_text(self) -> str:
+        """Nội dung pop-up nhắc nhở."""
+        if self._reminder_text is None:
+            self._reminder_text = format_reminder(self.data)
+        return self._reminder_text
@@ -0,0 +1,216 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import database as db
+from event_record import EventRecord, DISPLAY_FIELDS
+
+# ==============================================================================
+# BỘ NHỚ ĐỆM SỰ KIỆN (EVENT STORE)
+# Nạp bảng events một lần rồi giữ trong bộ nhớ; giao diện (danh sách, tìm kiếm, sửa,
+# xuất file) và thread nhắc nhở cùng đọc từ đây thay vì truy vấn CSDL mỗi lần.
+# Bộ nhớ đệm tự cập nhật qua thông báo của các hàm ghi trong database.py
+# (db.add_listener), và tải lại khi file CSDL bị tiến trình khác sửa
+# (PRAGMA data_version thay đổi, VD: cli.py import, api_server.py).
+# ==============================================================================
+
+# Số bản ghi hiển thị tối đa giữ lại cho các lần lặp (lần dùng lâu nhất bị bỏ trước):
+# chuỗi lặp vô hạn có thể sinh bản ghi mới mỗi lần xem sang tháng / tuần khác
+MAX_OCCURRENCE_RECORDS = 2000
+
+class EventStore:
+    def __init__(self, calendar_id: int = None):
+        # None: mọi lịch trong CSDL
+        self.calendar_id = calendar_id
+        self._lock = threading.RLock()
+        self._events = {}          # id -> dict (dòng của bảng events)
+        self._sorted = None        # Danh sách sắp xếp theo start_epoch (tính lại khi có thay đổi)
+        self._next_remind_at = None
+        # Bản ghi hiển thị: id -> EventRecord của sự kiện không lặp / cả chuỗi,
+        # (id, occurrence_start) -> EventRecord của từng lần lặp (theo thứ tự dùng gần nhất)
+        self._records = {}
+        self._occurrence_records = OrderedDict()
+        self._subscribers = []
+        # Kết nối riêng chỉ để đọc PRAGMA data_version: giá trị này đổi khi có
+        # kết nối khác (kể cả trong cùng tiến trình) commit vào CSDL
+        self._conn = sqlite3.connect(db.DB_NAME, check_same_thread=False)
+        self._data_version = None
+        self.reload()
+        db.add_listener(self._on_db_change)
+
+    def close(self):
+        db.remove_listener(self._on_db_change)
+        with self._lock:
+            self._conn.close()
+
+    # --- Đăng ký nhận thay đổi ---
+
+    def subscribe(self, callback):
+        """Đăng ký callback(change, event) với change là 'added' / 'updated' / 'deleted'.
+        Callback được gọi trên thread đã ghi vào CSDL (giao diện Tk cần tự chuyển về main thread)."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers: self._subscribers.remove(callback)
+
+    def _publish(self, changes):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for change, event in changes:
+            for callback in subscribers:
+                try:
+                    callback(change, event)
+                except Exception as e:
+                    print(f"Lỗi xử lý thay đổi sự kiện {event.get('id')}: {e}")
+
+    # --- Đồng bộ với CSDL ---
+
+    def _read_data_version(self):
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _invalidate(self):
+        self._sorted = None
+        self._next_remind_at = None
+
+    def _forget_record(self, old, new):
+        """Bỏ bản ghi hiển thị của sự kiện nếu nội dung hiển thị thay đổi."""
+        if new is None or any(old.get(f) != new.get(f) for f in DISPLAY_FIELDS):
+            self._records.pop(old['id'], None)
+            for key in [k for k in self._occurrence_records if k[0] == old['id']]:
+                del self._occurrence_records[key]
+
+    def reload(self):
+        """Đọc lại toàn bộ bảng events, so sánh với bộ nhớ đệm và thông báo các dòng thay đổi."""
+        # Đọc data_version trước: nếu có ghi xen vào giữa, lần kiểm tra sau sẽ tải lại lần nữa
+        version = self._read_data_version()
+        rows = {e['id']: e for e in db.get_all_events(self.calendar_id)}
+        changes = []
+        with self._lock:
+            for event_id, event in rows.items():
+                old = self._events.get(event_id)
+                if old is None: changes.append(('added', event))
+                elif old != event:
+                    changes.append(('updated', event))
+                    self._forget_record(old, event)
+            for event_id, old in self._events.items():
+                if event_id not in rows:
+                    changes.append(('deleted', old))
+                    self._forget_record(old, None)
+            self._events = rows
+            self._data_version = version
+            self._invalidate()
+        self._publish(changes)
+
+    def refresh_if_changed(self) -> bool:
+        """Tải lại nếu CSDL bị thay đổi ngoài các hàm ghi của tiến trình này. Trả về True nếu đã tải lại."""
+        if self._read_data_version() == self._data_version:
+            return False
+        self.reload()
+        return True
+
+    def _on_db_change(self, change, event_ids):
+        """Nhận thông báo từ database.py: chỉ đọc lại đúng các dòng vừa ghi."""
+        if change == 'reset':
+            self.reload()
+            return
+        fresh = {} if change == 'deleted' else {i: db.get_event(i, self.calendar_id) for i in event_ids}
+        changes = []
+        with self._lock:
+            for event_id in event_ids:
+                event = fresh.get(event_id)
+                old = self._events.pop(event_id, None)
+                if old is not None: self._forget_record(old, event)
+                if event is not None:
+                    self._events[event_id] = event
+                    changes.append(('added' if old is None else 'updated', event))
+                elif old is not None:
+                    changes.append(('deleted', old))
+            # Lần ghi này đã được áp dụng nên không cần tải lại toàn bộ. (Nếu đúng lúc đó có tiến trình
+            # khác cũng ghi thì thay đổi ấy sẽ được nhận ở lần data_version đổi tiếp theo.)
+            self._data_version = self._read_data_version()
+            self._invalidate()
+        self._publish(changes)
+
+    # --- Đọc (từ bộ nhớ) ---
+    # Các dict trả về dùng chung với bộ nhớ đệm: chỉ đọc, không sửa trực tiếp
+    # (khi có thay đổi, bộ nhớ đệm thay bằng dict mới chứ không sửa dict cũ).
+
+    def _sorted_events(self):
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._events.values(), key=lambda e: e['start_epoch'])
+            return self._sorted
+
+    def get_all_events(self):
+        """Tất cả sự kiện, sắp xếp theo thời gian bắt đầu (giống db.get_all_events)."""
+        self.refresh_if_changed()
+        return list(self._sorted_events())
+
+    def get_event(self, event_id: int):
+        self.refresh_if_changed()
+        with self._lock:
+            return self._events.get(event_id)
+
+    def get_events_in_range(self, range_start, range_end):
+        """Sự kiện trong khoảng [range_start, range_end), kể cả các lần lặp (giống db.get_events_in_range)."""
+        self.refresh_if_changed()
+        return db.select_in_range(self._sorted_events(), range_start, range_end)
+
+    def search(self, search_text: str, events=None):
+        """Lọc sự kiện theo tên / địa điểm."""
+        search_text = search_text.lower().strip()
+        if events is None: events = self.get_all_events()
+        return [e for e in events
+                if search_text in e['event'].lower() or (e['location'] and search_text in e['location'].lower())]
+
+    # --- Bản ghi hiển thị ---
+
+    def record(self, event) -> EventRecord:
+        """Bản ghi hiển thị của một sự kiện / lần lặp (dùng lại bản đã tạo nếu sự kiện chưa bị sửa)."""
+        if isinstance(event, EventRecord): return event
+        if event.get('archived_at'):
+            # Sự kiện đã lưu trữ không nằm trong bộ nhớ đệm
+            return EventRecord(event)
+        with self._lock:
+            occurrence_start = event.get('occurrence_start')
+            if occurrence_start:
+                key = (event['id'], occurrence_start)
+                record = self._occurrence_records.get(key)
+                if record is None:
+                    record = self._occurrence_records[key] = EventRecord(event)
+                    while len(self._occurrence_records) > MAX_OCCURRENCE_RECORDS:
+                        self._occurrence_records.popitem(last=False)
+                    return record
+                self._occurrence_records.move_to_end(key)
+            else:
+                record = self._records.get(event['id'])
+                if record is None:
+                    record = self._records[event['id']] = EventRecord(event)
+                    return record
+            # Các trường hiển thị giống nhau (nếu không bản ghi đã bị bỏ), chỉ cập nhật dữ liệu gốc
+            record.data = event
+            return record
+
+    def records(self, events):
+        return [self.record(e) for e in events]
+
+    # --- Nhắc nhở ---
+
+    def get_events_to_remind(self, calendar_id: int = None, writer=None):
+        """
+        Thay cho db.get_events_to_remind trong ReminderService: mốc nhắc sớm nhất được giữ sẵn
+        trong bộ nhớ, nên các lượt kiểm tra chưa đến hạn không cần truy vấn CSDL.
+        """
+        self.refresh_if_changed()
+        with self._lock:
+            if self._next_remind_at is None:
+                # Chỉ đọc lại sau khi có thay đổi (đầu chỉ mục nhắc nhở đang chờ)
+                self._next_remind_at = db.next_remind_at(self.calendar_id)
+            next_remind_at = self._next_remind_at
+        if next_remind_at > time.time():
+            return []
+        return db.get_events_to_remind(self.calendar_id if calendar_id is None else calendar_id, writer)
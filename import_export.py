@@ -0,0 +1,198 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import database as db
+import recurrence as rec
+import time_utils as tu
+
+# ==============================================================================
+# NHẬP / XUẤT DỮ LIỆU (JSON, ICS)
+# Dùng chung cho giao diện (app.py) và dòng lệnh (cli.py), không phụ thuộc tkinter.
+# ==============================================================================
+
+# Các trường được xuất/nhập (không có ID để tránh xung đột giữa các CSDL)
+EXPORT_FIELDS = ('event', 'start_time', 'end_time', 'location', 'reminder_minutes', 'reminder_offsets', 'recurrence', 'exdates')
+
+def events_to_json(events) -> list:
+    """Chuyển danh sách sự kiện sang dạng dict để ghi JSON."""
+    return [{field: event.get(field) for field in EXPORT_FIELDS} for event in events]
+
+def export_json(file_path, events=None) -> int:
+    """Ghi sự kiện ra file JSON. Trả về số sự kiện đã xuất."""
+    if events is None: events = db.get_all_events()
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(events_to_json(events), f, ensure_ascii=False, indent=4)
+    return len(events)
+
+def read_json(file_path) -> list:
+    """Đọc các sự kiện (chỉ các trường EXPORT_FIELDS) từ file JSON. Báo ValueError nếu file không đúng định dạng."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        events = json.load(f)
+
+    if not isinstance(events, list):
+        raise ValueError("File JSON không đúng định dạng.")
+    return [{field: event.get(field) for field in EXPORT_FIELDS} for event in events if isinstance(event, dict)]
+
+def import_json(file_path, calendar_id=None) -> int:
+    """Đọc file JSON và thêm các sự kiện vào CSDL (vào lịch calendar_id nếu có). Trả về số sự kiện mới đã nhập.
+    Sự kiện đã có (cùng tên, giờ bắt đầu, địa điểm) không bị thêm lần nữa, nên nhập lại cùng file là an toàn.
+    Báo ValueError nếu file không đúng định dạng.
+    """
+    counts = db.add_events(read_json(file_path), calendar_id=calendar_id)
+    return counts['added']
+
+def export_ics(file_path, events=None) -> int:
+    """Ghi sự kiện ra file ICS. Trả về số sự kiện đã xuất."""
+    if events is None: events = db.get_all_events()
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(generate_ics_content(events))
+    return len(events)
+
+# VTIMEZONE liệt kê các lần đổi giờ từ năm của sự kiện sớm nhất đến chừng này năm sau năm hiện tại
+VTIMEZONE_YEARS_AHEAD = 10
+
+def _format_utc_offset(offset: timedelta) -> str:
+    """timedelta -> dạng UTC-OFFSET của RFC 5545, VD: +0700, -0430."""
+    seconds = int(offset.total_seconds())
+    sign = "-" if seconds < 0 else "+"
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{sign}{hours:02d}{minutes:02d}" + (f"{seconds:02d}" if seconds else "")
+
+def _zone_transitions(zone, first_year, last_year):
+    """
+    Các lần đổi độ lệch UTC của múi giờ trong [first_year, last_year]: danh sách
+    (thời điểm UTC, độ lệch trước, độ lệch sau). zoneinfo không cho đọc trực tiếp
+    bảng chuyển giờ nên dò theo từng ngày rồi chia đôi đến từng giây.
+    """
+    tz = tu.get_zone(zone)
+    utc = datetime(first_year, 1, 1, tzinfo=tz).astimezone(timezone.utc)
+    end = datetime(last_year + 1, 1, 1, tzinfo=tz).astimezone(timezone.utc)
+    offset = utc.astimezone(tz).utcoffset()
+    transitions = []
+    while utc < end:
+        step = utc + timedelta(days=1)
+        new_offset = step.astimezone(tz).utcoffset()
+        if new_offset != offset:
+            lo, hi = utc, step
+            while hi - lo > timedelta(seconds=1):
+                mid = lo + (hi - lo) / 2
+                if mid.astimezone(tz).utcoffset() == offset: lo = mid
+                else: hi = mid
+            transitions.append((hi.replace(microsecond=0), offset, new_offset))
+            offset = new_offset
+        utc = step
+    return transitions
+
+def _vtimezone_lines(zone, first_year, last_year):
+    """
+    Thành phần VTIMEZONE cho TZID=zone (RFC 5545 bắt buộc khi DTSTART / EXDATE dùng TZID):
+    một STANDARD / DAYLIGHT cho mỗi lần đổi giờ, mở đầu bằng độ lệch lúc 0h ngày 1/1 năm first_year.
+    """
+    tz = tu.get_zone(zone)
+    start = datetime(first_year, 1, 1, tzinfo=tz)
+    # (giờ địa phương theo độ lệch cũ, độ lệch cũ, độ lệch mới, thời điểm ngay sau khi đổi)
+    observances = [(start.replace(tzinfo=None), start.utcoffset(), start.utcoffset(), start)]
+    for utc, before, after in _zone_transitions(zone, first_year, last_year):
+        observances.append(((utc + before).replace(tzinfo=None), before, after, utc.astimezone(tz)))
+
+    lines = ["BEGIN:VTIMEZONE", f"TZID:{zone}"]
+    for local, before, after, moment in observances:
+        kind = "DAYLIGHT" if moment.dst() else "STANDARD"
+        lines.append(f"BEGIN:{kind}")
+        lines.append(f"DTSTART:{local.strftime('%Y%m%dT%H%M%S')}")
+        lines.append(f"TZOFFSETFROM:{_format_utc_offset(before)}")
+        lines.append(f"TZOFFSETTO:{_format_utc_offset(after)}")
+        if moment.tzname(): lines.append(f"TZNAME:{moment.tzname()}")
+        lines.append(f"END:{kind}")
+    lines.append("END:VTIMEZONE")
+    return lines
+
+def generate_ics_content(events):
+    """Tạo nội dung file ICS từ danh sách sự kiện."""
+    ics_lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Trợ lý Lịch trình//Personal Schedule Assistant//VN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-TIMEZONE:{tu.TIMEZONE}"
+    ]
+
+    # Chỉ chuỗi lặp dùng TZID: mỗi múi giờ được tham chiếu cần một VTIMEZONE
+    first_years = {}
+    for event in events:
+        if not event.get('recurrence') or event.get('start_epoch') is None: continue
+        zone = event.get('timezone') or tu.TIMEZONE
+        year = tu.from_epoch(event['start_epoch'], zone).year
+        first_years[zone] = min(year, first_years.get(zone, year))
+    last_year = datetime.now().year + VTIMEZONE_YEARS_AHEAD
+    for zone, first_year in sorted(first_years.items()):
+        try:
+            ics_lines.extend(_vtimezone_lines(zone, first_year, max(first_year, last_year)))
+        except Exception as e:
+            print(f"Could not build VTIMEZONE for {zone}: {e}")
+
+    for event in events:
+        try:
+            # Epoch đã là UTC nên không cần phân tích chuỗi ISO
+            dt_start_utc = datetime.fromtimestamp(event['start_epoch'], timezone.utc)
+
+            # Nếu không có end_time, đặt mặc định là 1 giờ sau start_time
+            if event.get('end_epoch') is not None:
+                dt_end_utc = datetime.fromtimestamp(event['end_epoch'], timezone.utc)
+            else:
+                dt_end_utc = dt_start_utc + timedelta(hours=1)
+
+            zone = event.get('timezone') or tu.TIMEZONE
+            local_start = tu.from_epoch(event['start_epoch'], zone)
+            uid = f"{local_start.strftime('%Y%m%dT%H%M%S')}-{event['id']}@personalschedule.app"
+
+            ics_lines.append("BEGIN:VEVENT")
+            ics_lines.append(f"UID:{uid}")
+            ics_lines.append(f"DTSTAMP:{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+            if event.get('recurrence'):
+                # Chuỗi lặp giữ giờ địa phương kèm TZID để lịch khác sinh các lần lặp
+                # đúng giờ trên đồng hồ khi qua mốc đổi giờ mùa hè (giống bộ nhắc nhở)
+                local_end = tu.from_epoch(event['end_epoch'], zone) if event.get('end_epoch') is not None else local_start + timedelta(hours=1)
+                ics_lines.append(f"DTSTART;TZID={zone}:{local_start.strftime('%Y%m%dT%H%M%S')}")
+                ics_lines.append(f"DTEND;TZID={zone}:{local_end.strftime('%Y%m%dT%H%M%S')}")
+            else:
+                ics_lines.append(f"DTSTART:{dt_start_utc.strftime('%Y%m%dT%H%M%SZ')}")
+                ics_lines.append(f"DTEND:{dt_end_utc.strftime('%Y%m%dT%H%M%SZ')}")
+            ics_lines.append(f"SUMMARY:{event['event']}")
+
+            if event['location']:
+                ics_lines.append(f"LOCATION:{event['location']}")
+
+            # Sự kiện lặp lại: xuất nguyên luật RRULE thay vì từng lần xảy ra
+            if event.get('recurrence'):
+                ics_lines.append(f"RRULE:{rrule_to_utc(event['recurrence'], zone)}")
+                if event.get('exdates'):
+                    exdates_local = [datetime.fromisoformat(d).strftime('%Y%m%dT%H%M%S')
+                                     for d in event['exdates'].split(',') if d]
+                    ics_lines.append(f"EXDATE;TZID={zone}:{','.join(exdates_local)}")
+
+            # Thêm nhắc nhở (mỗi mốc nhắc một VALARM)
+            for minutes in db._reminder_offsets(event):
+                ics_lines.append("BEGIN:VALARM")
+                ics_lines.append("ACTION:DISPLAY")
+                ics_lines.append(f"DESCRIPTION:{event['event']}")
+                ics_lines.append(f"TRIGGER:-PT{minutes}M") # PT = Period Time
+                ics_lines.append("END:VALARM")
+
+            ics_lines.append("END:VEVENT")
+
+        except Exception as e:
+            print(f"Could not process event ID {event.get('id')} for ICS export: {e}")
+
+    ics_lines.append("END:VCALENDAR")
+    return "\r\n".join(ics_lines)
+
+def rrule_to_utc(rule, zone=None):
+    """RFC 5545 yêu cầu UNTIL ở dạng UTC khi DTSTART có TZID."""
+    parsed = rec.parse_rrule(rule, zone)
+    if not parsed['UNTIL']:
+        return rule
+    until_utc = tu.to_utc(parsed['UNTIL'], zone).strftime('%Y%m%dT%H%M%SZ')
+    return ";".join(f"UNTIL={until_utc}" if part.startswith("UNTIL=") else part for part in rule.split(";"))
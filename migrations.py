@@ -0,0 +1,491 @@
+import sqlite3
+
+import database as db
+
+# ==============================================================================
+# NÂNG CẤP CSDL (MIGRATION)
+# Phiên bản lược đồ lưu trong PRAGMA user_version. Mỗi bước nâng cấp có số hiệu
+# tăng dần và chỉ chạy một lần. Các bước đều chạy lại được (IF NOT EXISTS, chỉ cập nhật
+# dòng chưa chuyển), còn bước chuyển dữ liệu chạy theo từng lô: mỗi lô một transaction
+# ngắn nên không giữ khóa ghi lâu, và vị trí đã xử lý được lưu lại (migration_progress)
+# để nếu bị ngắt giữa chừng thì lần khởi động sau chạy tiếp từ lô đó.
+# ==============================================================================
+
+# Số dòng mỗi lô khi chuyển dữ liệu
+MIGRATION_BATCH_SIZE = 2000
+# Chuyển sang auto_vacuum = INCREMENTAL cần VACUUM chép lại cả file: khi nâng cấp chỉ tự
+# chạy với CSDL nhỏ hơn mức này, CSDL lớn hơn chuyển bằng lệnh "python cli.py vacuum"
+AUTO_VACUUM_CONVERT_MAX_BYTES = 8 * 1024 * 1024
+
+# Khoảng thời gian [bắt đầu, kết thúc) của mỗi dòng trong events, tính bằng epoch (giây),
+# kèm calendar_id làm chiều thứ hai của R*Tree.
+# Chuỗi lặp được bao bởi khoảng từ lần đầu đến lần cuối (hoặc vô cực).
+_RTREE_BOUNDS = f"""
+    {{row}}.start_epoch,
+    MAX({{row}}.start_epoch,
+        CASE WHEN {{row}}.recurrence IS NOT NULL THEN
+            COALESCE({{row}}.recurrence_end_epoch
+                     + COALESCE({{row}}.end_epoch - {{row}}.start_epoch, {db.DEFAULT_DURATION_MINUTES * 60}),
+                     {db.MAX_TIMESTAMP})
+        ELSE
+            COALESCE({{row}}.end_epoch, {{row}}.start_epoch + {db.DEFAULT_DURATION_MINUTES * 60})
+        END),
+    {{row}}.calendar_id,
+    {{row}}.calendar_id
+"""
+
+def print_progress(version, description, done, total):
+    """Báo tiến độ mặc định: in ra màn hình."""
+    print(f"Nâng cấp CSDL v{version} ({description}): {done}/{total} dòng", flush=True)
+
+class _Step:
+    """Ngữ cảnh của một bước nâng cấp: chạy lệnh chuyển dữ liệu theo lô và báo tiến độ."""
+    def __init__(self, conn, version, description, batch_size, progress):
+        self.conn = conn
+        self.version = version
+        self.description = description
+        self.batch_size = batch_size
+        self.progress = progress
+
+    def batched(self, apply, where="1 = 1", columns="*"):
+        """
+        Duyệt bảng events theo khóa chính (id tăng dần), mỗi lô tối đa batch_size dòng
+        thỏa điều kiện `where`, gọi apply(cursor, rows) rồi commit cùng vị trí đã xử lý.
+        """
+        row = self.conn.execute("SELECT last_id FROM migration_progress WHERE version = ?", (self.version,)).fetchone()
+        last_id = row[0] if row else 0
+        total = self.conn.execute(f"SELECT COUNT(*) FROM events WHERE id > ? AND ({where})", (last_id,)).fetchone()[0]
+        done = 0
+        cursor = self.conn.cursor()
+        while done < total:
+            cursor.execute(f"SELECT {columns} FROM events WHERE id > ? AND ({where}) ORDER BY id LIMIT ?",
+                           (last_id, self.batch_size))
+            names = [d[0] for d in cursor.description]
+            rows = [dict(zip(names, r)) for r in cursor.fetchall()]
+            if not rows: break
+            apply(cursor, rows)
+            last_id = rows[-1]['id']
+            cursor.execute("INSERT OR REPLACE INTO migration_progress (version, last_id) VALUES (?, ?)", (self.version, last_id))
+            self.conn.commit()
+            done += len(rows)
+            if self.progress: self.progress(self.version, self.description, done, total)
+
+def database_bytes(conn) -> int:
+    """Kích thước file CSDL (byte) theo số trang."""
+    return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+def enable_incremental_vacuum(conn) -> bool:
+    """
+    Chuyển CSDL sang auto_vacuum = INCREMENTAL (archive.compact trả lại dung lượng từng phần).
+    Cần một lần VACUUM toàn bộ, chặn mọi thao tác ghi trong lúc chạy: với CSDL lớn chỉ gọi
+    từ lệnh bảo trì (cli.py vacuum), không gọi lúc khởi động. Trả về False nếu đã chuyển trước đó.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2: return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    return True
+
+def _ensure_columns(cursor, table, columns):
+    """Thêm các cột còn thiếu vào bảng (dùng cho CSDL tạo từ phiên bản cũ)."""
+    existing = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+# --- Các bước nâng cấp ---
+
+def _create_events(conn, step):
+    """Bảng events ban đầu. Cột 'reminded' để theo dõi các pop-up."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        event TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT,
+        location TEXT,
+        reminder_minutes INTEGER,
+        reminded INTEGER DEFAULT 0
+    )
+    """)
+
+def _add_recurrence_columns(conn, step):
+    """Sự kiện lặp lại: mỗi chuỗi lặp chỉ chiếm 1 dòng, các lần xảy ra được sinh khi truy vấn."""
+    _ensure_columns(conn.cursor(), "events", [
+        ("recurrence", "TEXT"),
+        ("exdates", "TEXT"),
+        ("last_reminded", "TEXT"),
+    ])
+
+def _add_epoch_columns(conn, step):
+    """
+    Thời gian được lưu thêm dưới dạng epoch (giây, kèm độ lệch múi giờ tính bằng phút)
+    để mọi truy vấn khoảng thời gian và nhắc nhở chỉ là phép so sánh số nguyên.
+    Cột 'timezone' lưu múi giờ IANA của sự kiện: chuỗi lặp được sinh theo giờ địa phương
+    của múi giờ này nên vẫn đúng giờ khi qua thời điểm đổi giờ mùa hè.
+    Các cột ISO (start_time, end_time) là giờ địa phương, giữ lại để tương thích với dữ liệu cũ.
+    """
+    _ensure_columns(conn.cursor(), "events", [
+        ("start_epoch", "INTEGER"),
+        ("end_epoch", "INTEGER"),
+        ("tz_offset", "INTEGER"),
+        ("recurrence_end_epoch", "INTEGER"),
+        ("remind_at", "INTEGER"),
+        ("timezone", "TEXT"),
+    ])
+
+def _backfill_epochs(conn, step):
+    """
+    Chuyển các dòng cũ (chỉ có chuỗi ISO, chưa có múi giờ) sang cột epoch theo múi giờ mặc định.
+    Dòng có thời gian không đọc được (VD: '25/12/2025 9h') được bỏ qua kèm cảnh báo, các cột
+    epoch để NULL, không làm dừng cả quá trình nâng cấp.
+    """
+    def apply(cursor, rows):
+        params = []
+        for event in rows:
+            try:
+                cols = db._time_columns(event, reminded=bool(event.get('reminded')))
+            except (ValueError, TypeError) as e:
+                print(f"Nâng cấp CSDL v{step.version}: bỏ qua sự kiện {event['id']} "
+                      f"(thời gian không hợp lệ {event.get('start_time')!r} / {event.get('end_time')!r}): {e}", flush=True)
+                continue
+            params.append((cols['start_epoch'], cols['end_epoch'], cols['tz_offset'], cols['recurrence_end_epoch'],
+                           cols['remind_at'], cols['timezone'], event['id']))
+        cursor.executemany("""
+        UPDATE events SET start_epoch = ?, end_epoch = ?, tz_offset = ?, recurrence_end_epoch = ?, remind_at = ?, timezone = ?
+        WHERE id = ?
+        """, params)
+    step.batched(apply, where="start_epoch IS NULL OR timezone IS NULL")
+    # Tạo chỉ mục sau khi đã chuyển xong dữ liệu (nhanh hơn cập nhật chỉ mục từng dòng)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_start_epoch ON events(start_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_remind_at ON events(remind_at) WHERE remind_at IS NOT NULL")
+
+def _add_calendars(conn, step):
+    """Mỗi sự kiện thuộc một lịch (calendar_id), mỗi lịch thuộc một người dùng."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS calendars (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        UNIQUE (user_id, name)
+    )
+    """)
+    conn.execute("INSERT OR IGNORE INTO users (id, name) VALUES (?, ?)", (db.DEFAULT_USER_ID, "default"))
+    conn.execute("INSERT OR IGNORE INTO calendars (id, user_id, name) VALUES (?, ?, ?)",
+                 (db.DEFAULT_CALENDAR_ID, db.DEFAULT_USER_ID, db.DEFAULT_CALENDAR_NAME))
+    conn.commit()
+    _ensure_columns(conn.cursor(), "events", [
+        ("calendar_id", "INTEGER REFERENCES calendars(id) ON DELETE CASCADE"),
+    ])
+
+def _backfill_calendar_id(conn, step):
+    """Gán các sự kiện cũ vào lịch mặc định, rồi tạo chỉ mục theo lịch."""
+    def apply(cursor, rows):
+        cursor.execute("UPDATE events SET calendar_id = ? WHERE id BETWEEN ? AND ? AND calendar_id IS NULL",
+                       (db.DEFAULT_CALENDAR_ID, rows[0]['id'], rows[-1]['id']))
+    step.batched(apply, where="calendar_id IS NULL", columns="id")
+    # Chỉ mục theo lịch: truy vấn của một lịch chỉ đọc dữ liệu của lịch đó
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_calendar_start ON events(calendar_id, start_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_calendar_remind_at ON events(calendar_id, remind_at) WHERE remind_at IS NOT NULL")
+
+def _build_interval_index(conn, step):
+    """
+    Chỉ mục khoảng thời gian (SQLite R*Tree) để tìm sự kiện trùng lịch trong O(log n).
+    Được đồng bộ tự động bằng trigger nên mọi thao tác ghi vào events đều cập nhật theo.
+    Chiều thứ hai là calendar_id (calendar_lo = calendar_hi) để truy vấn theo lịch
+    chỉ duyệt các nút của lịch đó.
+    """
+    rtree_columns = [row[1] for row in conn.execute("PRAGMA table_info(events_rtree)")]
+    if rtree_columns and 'calendar_lo' not in rtree_columns:
+        # Chỉ mục cũ (1 chiều) -> tạo lại
+        conn.execute("DROP TABLE events_rtree")
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS events_rtree USING rtree(id, start_ts, end_ts, calendar_lo, calendar_hi)")
+    # Tạo trigger trước khi dựng chỉ mục để các dòng ghi trong lúc dựng cũng được cập nhật
+    for trigger in ("events_rtree_insert", "events_rtree_update", "events_rtree_delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute(f"""
+    CREATE TRIGGER events_rtree_insert AFTER INSERT ON events BEGIN
+        INSERT OR REPLACE INTO events_rtree VALUES (new.id, {_RTREE_BOUNDS.format(row='new')});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER events_rtree_update
+    AFTER UPDATE OF start_epoch, end_epoch, recurrence, recurrence_end_epoch, calendar_id ON events BEGIN
+        INSERT OR REPLACE INTO events_rtree VALUES (new.id, {_RTREE_BOUNDS.format(row='new')});
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER events_rtree_delete AFTER DELETE ON events BEGIN
+        DELETE FROM events_rtree WHERE id = old.id;
+    END
+    """)
+    def apply(cursor, rows):
+        cursor.execute(f"""
+        INSERT OR REPLACE INTO events_rtree
+        SELECT events.id, {_RTREE_BOUNDS.format(row='events')} FROM events WHERE events.id BETWEEN ? AND ?
+        """, (rows[0]['id'], rows[-1]['id']))
+    step.batched(apply, columns="id")
+
+def _create_archive(conn, step):
+    """
+    Bảng lưu trữ sự kiện cũ (xem archive.py): cùng cột với events, thêm archived_at.
+    Thêm cột mới vào events thì thêm cả vào events_archive.
+    Chuyển CSDL sang auto_vacuum = INCREMENTAL để trả lại dung lượng từng phần
+    (PRAGMA incremental_vacuum) thay vì VACUUM toàn bộ; với CSDL đã có dữ liệu,
+    thiết lập này chỉ có hiệu lực sau một lần VACUUM. Lần VACUUM đó chỉ tự chạy khi CSDL
+    nhỏ (AUTO_VACUUM_CONVERT_MAX_BYTES) để không chặn lúc khởi động; CSDL lớn vẫn dùng được
+    (incremental_vacuum không có tác dụng) cho tới khi chạy "python cli.py vacuum".
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS events_archive (
+        id INTEGER PRIMARY KEY,
+        event TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT,
+        location TEXT,
+        reminder_minutes INTEGER,
+        reminded INTEGER DEFAULT 0,
+        recurrence TEXT,
+        exdates TEXT,
+        last_reminded TEXT,
+        start_epoch INTEGER,
+        end_epoch INTEGER,
+        tz_offset INTEGER,
+        recurrence_end_epoch INTEGER,
+        remind_at INTEGER,
+        timezone TEXT,
+        calendar_id INTEGER,
+        archived_at INTEGER
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_archive_calendar_start ON events_archive(calendar_id, start_epoch)")
+    conn.commit()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if database_bytes(conn) <= AUTO_VACUUM_CONVERT_MAX_BYTES:
+            enable_incremental_vacuum(conn)
+        else:
+            print("CSDL lớn: bỏ qua VACUUM khi khởi động, chạy 'python cli.py vacuum' để bật incremental VACUUM.", flush=True)
+
+def _create_reminders(conn, step):
+    """
+    Bảng reminders: mỗi mốc nhắc của sự kiện là một dòng (xem database.py, phần nhắc nhở),
+    chỉ mục một phần trên remind_at của các nhắc nhở đang chờ.
+    Cột reminder_offsets (VD: '1440,15') lưu các mốc nhắc của sự kiện.
+    Mốc đang chờ trong events.remind_at được chuyển sang reminders (giữ nguyên trạng thái),
+    sau đó cột này và các chỉ mục của nó không còn dùng.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY,
+        event_id INTEGER NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+        offset_minutes INTEGER,
+        occurrence_epoch INTEGER NOT NULL,
+        remind_at INTEGER NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        UNIQUE (event_id, offset_minutes)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders(remind_at) WHERE state = 'pending'")
+    cursor = conn.cursor()
+    _ensure_columns(cursor, "events", [("reminder_offsets", "TEXT")])
+    _ensure_columns(cursor, "events_archive", [("reminder_offsets", "TEXT")])
+    conn.commit()
+
+    def apply(cursor, rows):
+        cursor.executemany("UPDATE events SET reminder_offsets = ?, remind_at = NULL WHERE id = ?",
+                           [(str(row['reminder_minutes']), row['id']) for row in rows])
+        cursor.executemany("""
+        INSERT OR IGNORE INTO reminders (event_id, offset_minutes, occurrence_epoch, remind_at) VALUES (?, ?, ?, ?)
+        """, [(row['id'], row['reminder_minutes'], row['remind_at'] + row['reminder_minutes'] * 60, row['remind_at'])
+              for row in rows if row['remind_at'] is not None])
+    step.batched(apply, where="reminder_minutes > 0", columns="id, reminder_minutes, remind_at")
+    conn.execute("DROP INDEX IF EXISTS idx_events_remind_at")
+    conn.execute("DROP INDEX IF EXISTS idx_events_calendar_remind_at")
+
+def _dedupe_events(conn, step):
+    """
+    Cột content_hash (xem database._content_hash) và chỉ mục duy nhất (calendar_id, content_hash)
+    để nhập lại cùng dữ liệu không sinh sự kiện trùng.
+    CSDL cũ có thể đã có sự kiện trùng (VD: nhập một file JSON nhiều lần): duyệt theo lô,
+    giữ sự kiện có ID nhỏ nhất và xóa các bản trùng sau nó (nhắc nhở của chúng bị xóa theo).
+    Trong lúc duyệt dùng chỉ mục thường (calendar_id, content_hash) để tìm bản trùng đã gặp,
+    nên bộ nhớ không phụ thuộc số sự kiện.
+    Trigger cập nhật R*Tree được tạo lại bằng DELETE + INSERT: trong UPSERT (INSERT ... ON CONFLICT
+    DO UPDATE) SQLite dùng cách xử lý xung đột của câu lệnh ngoài thay cho INSERT OR REPLACE của trigger.
+    """
+    for trigger in ("events_rtree_insert", "events_rtree_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute(f"""
+    CREATE TRIGGER events_rtree_insert AFTER INSERT ON events BEGIN
+        DELETE FROM events_rtree WHERE id = new.id;
+        INSERT INTO events_rtree VALUES (new.id, {_RTREE_BOUNDS.format(row='new')});
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER events_rtree_update
+    AFTER UPDATE OF start_epoch, end_epoch, recurrence, recurrence_end_epoch, calendar_id ON events BEGIN
+        DELETE FROM events_rtree WHERE id = new.id;
+        INSERT INTO events_rtree VALUES (new.id, {_RTREE_BOUNDS.format(row='new')});
+    END
+    """)
+    cursor = conn.cursor()
+    _ensure_columns(cursor, "events", [("content_hash", "TEXT")])
+    _ensure_columns(cursor, "events_archive", [("content_hash", "TEXT")])
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_content_hash_scan ON events(calendar_id, content_hash)")
+    conn.commit()
+    removed = 0
+
+    def apply(cursor, rows):
+        nonlocal removed
+        for row in rows:
+            content_hash = db._content_hash(row)
+            cursor.execute("SELECT 1 FROM events WHERE calendar_id IS ? AND content_hash = ? AND id < ? LIMIT 1",
+                           (row['calendar_id'], content_hash, row['id']))
+            if cursor.fetchone():
+                cursor.execute("DELETE FROM events WHERE id = ?", (row['id'],))
+                removed += 1
+            else:
+                cursor.execute("UPDATE events SET content_hash = ? WHERE id = ?", (content_hash, row['id']))
+    step.batched(apply, columns="id, event, location, start_epoch, calendar_id")
+    if removed: print(f"Nâng cấp CSDL v{step.version}: đã xóa {removed} sự kiện trùng", flush=True)
+    conn.execute("DROP INDEX IF EXISTS idx_events_content_hash_scan")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_events_content_hash ON events(calendar_id, content_hash)")
+
+# Các cột được đồng bộ giữa các CSDL: sửa các cột này thì ghi vào change_log
+_SYNCED_COLUMNS = "event, start_time, end_time, location, reminder_minutes, reminder_offsets, recurrence, exdates, timezone, calendar_id"
+
+def _add_change_log(conn, step):
+    """
+    Nhật ký thay đổi để đồng bộ tăng dần giữa hai CSDL (xem sync.py):
+    - events.uid: mã định danh không đổi giữa các CSDL (id chỉ có nghĩa trong một file)
+    - change_log(seq, uid, op, changed_at): chỉ thêm vào, seq tăng dần không dùng lại (AUTOINCREMENT);
+      trigger ghi lại mọi thao tác thêm / sửa / xóa, kể cả từ cli.py hay api_server.py
+      (xóa do chuyển vào mục lưu trữ không được ghi: lưu trữ là việc riêng của từng CSDL)
+    - db_meta: mã định danh của chính CSDL này; sync_peers: seq cuối đã nhận từ mỗi CSDL khác
+    Sự kiện có sẵn được ghi vào change_log như vừa thêm, để lần đồng bộ đầu tiên gửi đủ dữ liệu.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        uid TEXT NOT NULL,
+        op TEXT NOT NULL,
+        changed_at INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS db_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT OR IGNORE INTO db_meta (key, value) VALUES ('uid', lower(hex(randomblob(16))))")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sync_peers (
+        peer_uid TEXT PRIMARY KEY,
+        last_seq INTEGER NOT NULL
+    )
+    """)
+    cursor = conn.cursor()
+    _ensure_columns(cursor, "events", [("uid", "TEXT")])
+    _ensure_columns(cursor, "events_archive", [("uid", "TEXT")])
+    conn.execute("UPDATE events_archive SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL")
+    conn.commit()
+
+    def apply(cursor, rows):
+        first, last = rows[0]['id'], rows[-1]['id']
+        cursor.execute("UPDATE events SET uid = lower(hex(randomblob(16))) WHERE id BETWEEN ? AND ? AND uid IS NULL", (first, last))
+        cursor.execute("""
+        INSERT INTO change_log (uid, op, changed_at)
+        SELECT uid, 'upsert', CAST(strftime('%s', 'now') AS INTEGER) FROM events WHERE id BETWEEN ? AND ? ORDER BY id
+        """, (first, last))
+    step.batched(apply, columns="id")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_events_uid ON events(uid)")
+
+    for trigger in ("events_log_insert", "events_log_update", "events_log_delete"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("""
+    CREATE TRIGGER events_log_insert AFTER INSERT ON events BEGIN
+        UPDATE events SET uid = lower(hex(randomblob(16))) WHERE id = new.id AND uid IS NULL;
+        INSERT INTO change_log (uid, op, changed_at)
+        VALUES ((SELECT uid FROM events WHERE id = new.id), 'upsert', CAST(strftime('%s', 'now') AS INTEGER));
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER events_log_update AFTER UPDATE OF {_SYNCED_COLUMNS} ON events BEGIN
+        INSERT INTO change_log (uid, op, changed_at) VALUES (new.uid, 'upsert', CAST(strftime('%s', 'now') AS INTEGER));
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER events_log_delete AFTER DELETE ON events
+    WHEN NOT EXISTS (SELECT 1 FROM events_archive WHERE id = old.id AND uid = old.uid) BEGIN
+        INSERT INTO change_log (uid, op, changed_at) VALUES (old.uid, 'delete', CAST(strftime('%s', 'now') AS INTEGER));
+    END
+    """)
+
+def _skip_restore_in_change_log(conn, step):
+    """
+    Lưu trữ là việc riêng của từng CSDL, nên cả hai chiều đều không ghi vào change_log:
+    chuyển vào mục lưu trữ (trigger xóa đã bỏ qua từ v11) và khôi phục từ mục lưu trữ
+    (archive.restore_event thêm lại dòng khi bản lưu trữ cùng id, uid vẫn còn).
+    Sửa sự kiện sau khi khôi phục vẫn được ghi như mọi lần sửa khác.
+    """
+    conn.execute("DROP TRIGGER IF EXISTS events_log_insert")
+    conn.execute("""
+    CREATE TRIGGER events_log_insert AFTER INSERT ON events BEGIN
+        UPDATE events SET uid = lower(hex(randomblob(16))) WHERE id = new.id AND uid IS NULL;
+        INSERT INTO change_log (uid, op, changed_at)
+        SELECT uid, 'upsert', CAST(strftime('%s', 'now') AS INTEGER) FROM events WHERE id = new.id
+        AND NOT EXISTS (SELECT 1 FROM events_archive WHERE id = new.id AND uid = new.uid);
+    END
+    """)
+
+# Danh sách các bước theo thứ tự: (phiên bản, mô tả, hàm).
+# Thêm cột / chỉ mục mới = thêm một bước với số hiệu kế tiếp, không sửa các bước cũ.
+MIGRATIONS = [
+    (1, "Tạo bảng events", _create_events),
+    (2, "Sự kiện lặp lại", _add_recurrence_columns),
+    (3, "Cột epoch và múi giờ", _add_epoch_columns),
+    (4, "Chuyển thời gian sang epoch", _backfill_epochs),
+    (5, "Người dùng và lịch", _add_calendars),
+    (6, "Gán sự kiện vào lịch mặc định", _backfill_calendar_id),
+    (7, "Chỉ mục khoảng thời gian", _build_interval_index),
+    (8, "Bảng lưu trữ sự kiện cũ", _create_archive),
+    (9, "Bảng nhắc nhở (nhiều mốc nhắc mỗi sự kiện)", _create_reminders),
+    (10, "Xóa sự kiện trùng, chỉ mục nội dung", _dedupe_events),
+    (11, "Nhật ký thay đổi để đồng bộ", _add_change_log),
+    (12, "Không ghi khôi phục từ lưu trữ vào nhật ký thay đổi", _skip_restore_in_change_log),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(batch_size: int = MIGRATION_BATCH_SIZE, progress=print_progress) -> int:
+    """
+    Chạy các bước nâng cấp còn thiếu theo thứ tự. Trả về phiên bản lược đồ sau khi nâng cấp.
+    progress(version, description, done, total) được gọi sau mỗi lô dữ liệu (None: không báo).
+    """
+    conn = db._connect()
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS migration_progress (
+        version INTEGER PRIMARY KEY,
+        last_id INTEGER NOT NULL
+    )
+    """)
+    current = get_version(conn)
+    try:
+        for version, description, migration in MIGRATIONS:
+            if version <= current: continue
+            migration(conn, _Step(conn, version, description, batch_size, progress))
+            conn.execute("DELETE FROM migration_progress WHERE version = ?", (version,))
+            conn.commit()
+            # PRAGMA không nhận tham số dạng ?
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            current = version
+    except sqlite3.Error as e:
+        print(f"Lỗi nâng cấp CSDL lên v{version}: {e}")
+        raise
+    finally:
+        conn.close()
+    return current
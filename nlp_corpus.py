@@ -0,0 +1,231 @@
+"""
+Sinh bộ câu lệnh có nhãn để kiểm thử nlp_pipeline (độ chính xác + độ trễ).
+
+    python nlp_corpus.py                     # ghi nlp_corpus.jsonl (mặc định 3000 câu)
+    python nlp_corpus.py --count 5000 --seed 7 --output /tmp/corpus.jsonl
+
+Mỗi dòng là một câu lệnh kèm mốc thời gian tham chiếu (ref) và kết quả đúng:
+    {"id": 1, "prompt": "...", "ref": "2025-11-03T09:00:00", "tags": [...],
+     "expected": {"event", "start_time", "end_time", "location", "reminder_offsets"}}
+Nhãn được tính trực tiếp từ các thành phần ghép câu (không chạy parser), nên phản
+ánh ý nghĩa đúng của câu chứ không phải kết quả hiện tại của parser.
+Câu không dấu chỉ dùng các từ có trong VIETNAMESE_DICT (và "7h toi" cho HOUR_TOI_PATTERN).
+Bộ sinh là tất định theo seed: cùng seed luôn cho cùng một file.
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+
+DEFAULT_OUTPUT = "nlp_corpus.jsonl"
+DEFAULT_COUNT = 3000
+DEFAULT_SEED = 2025
+
+# Mốc tham chiếu ("bây giờ") khác thứ trong tuần để kiểm tra cách tính thứ / tuần sau
+REFERENCE_TIMES = (
+    datetime(2025, 11, 3, 9, 0),    # Thứ 2
+    datetime(2025, 11, 6, 14, 30),  # Thứ 5
+    datetime(2025, 11, 9, 20, 0),   # Chủ nhật
+    datetime(2026, 1, 30, 7, 45),   # Thứ 6
+)
+
+# (có dấu, không dấu hoặc None nếu từ điển không khôi phục được)
+EVENTS = (
+    ("họp nhóm", "hop nhom"),
+    ("nộp bài tập", "nop bai tap"),
+    ("ăn tối với gia đình", "an toi voi gia dinh"),
+    ("nộp báo cáo", None),
+    ("gọi điện cho mẹ", None),
+    ("khám răng", None),
+    ("đi siêu thị", None),
+    ("học tiếng anh", None),
+    ("tập gym", None),
+    ("họp dự án", None),
+    ("đón con", None),
+    ("thuyết trình đồ án", None),
+)
+
+LOCATIONS = (
+    ("phòng 301", "phong 301"),
+    ("phòng 205", "phong 205"),
+    ("phòng a2", "phong a2"),
+    ("thư viện", None),
+    ("công viên thống nhất", None),
+    ("quán cà phê", None),
+    ("trường", None),
+)
+
+# Buổi trong ngày: (có dấu, không dấu, các giờ 12h hợp lệ, số giờ cộng thêm)
+PERIODS = (
+    ("sáng", "sang", range(6, 12), 0),
+    ("chiều", "chieu", range(1, 6), 12),
+    ("tối", "toi", range(6, 11), 12),
+)
+
+# Mốc nhắc: (cụm từ có dấu, không dấu hoặc None, các mốc tính bằng phút)
+OFFSETS = (
+    ("15 phút", "15 phut", [15]),
+    ("30 phút", "30 phut", [30]),
+    ("10p", "10p", [10]),
+    ("1h", "1h", [60]),
+    ("2 tiếng", None, [120]),
+    ("1 ngày", None, [1440]),
+    ("1 ngày và 15 phút", None, [1440, 15]),
+    ("2 tiếng, trước 10p", None, [120, 10]),
+    ("1h và 5 phút", None, [60, 5]),
+)
+
+WEEKDAYS = ("thứ 2", "thứ 3", "thứ 4", "thứ 5", "thứ 6", "thứ 7", "chủ nhật")
+
+def _time_text(rng, hour, minute, unaccented):
+    """Viết giờ theo một trong các kiểu "8h", "8h30", "8:30", "8 giờ", "8 giờ 30"."""
+    styles = ["h", ":", "giờ"] if not unaccented else ["h", ":", "gio"]
+    style = rng.choice(styles)
+    if style == "h":
+        return f"{hour}h{minute:02d}" if minute else f"{hour}h"
+    if style == ":":
+        return f"{hour}:{minute:02d}"
+    return f"{hour} {style} {minute}" if minute else f"{hour} {style}"
+
+def _day(rng, ref, unaccented):
+    """Chọn cách nói ngày, trả về (cụm từ, ngày đúng, tag)."""
+    kinds = ["tomorrow", "weekday", "date"] if unaccented else ["tomorrow", "today", "weekday", "next_week", "date"]
+    kind = rng.choice(kinds)
+    if kind == "tomorrow":
+        text = "mai" if unaccented else rng.choice(("mai", "ngày mai"))
+        return text, ref.date() + timedelta(days=1), "relative"
+    if kind == "today":
+        return "hôm nay", ref.date(), "relative"
+    if kind in ("weekday", "next_week"):
+        # Không dấu chỉ có "chu nhat" trong từ điển
+        wd = 6 if unaccented else rng.randrange(7)
+        days_ahead = (wd - ref.weekday()) % 7
+        text = "chu nhat" if unaccented else WEEKDAYS[wd]
+        if kind == "next_week":
+            # Thứ đó của tuần kế tiếp (tuần tính từ thứ 2 đến chủ nhật)
+            days_ahead = 7 - ref.weekday() + wd
+            text += rng.choice((" tuần sau", " tuần tới"))
+        return text, ref.date() + timedelta(days=days_ahead), kind
+    target = ref.date() + timedelta(days=rng.randint(1, 120))
+    text = f"{target.day}/{target.month}/{target.year}"
+    if not unaccented: text = rng.choice(("", "ngày ")) + text
+    return text, target, "date"
+
+def _pick(rng, options, unaccented):
+    """Chọn một thành phần; câu không dấu chỉ chọn thành phần có dạng không dấu."""
+    if unaccented: options = [o for o in options if o[1] is not None]
+    option = rng.choice(options)
+    return option, option[1] if unaccented else option[0]
+
+def make_entry(rng):
+    """Ghép một câu lệnh ngẫu nhiên và nhãn đúng của nó."""
+    ref = rng.choice(REFERENCE_TIMES)
+    unaccented = rng.random() < 0.3
+    tags = ["unaccented" if unaccented else "accented"]
+
+    (event, _), event_text = _pick(rng, EVENTS, unaccented)
+    period, period_text = _pick(rng, PERIODS, unaccented)
+    hours, shift = period[2], period[3]
+    if unaccented and period[0] == "tối": tags.append("hour_toi")
+    hour12 = rng.choice(hours)
+    minute = rng.choice((0, 0, 15, 30, 45))
+    day_text, date, day_tag = _day(rng, ref, unaccented)
+    tags.append(day_tag)
+    start = datetime.combine(date, datetime.min.time()) + timedelta(hours=hour12 + shift, minutes=minute)
+    end = None
+
+    # "7h toi": giờ phải viết kiểu "7h" / "7:30" để HOUR_TOI_PATTERN nhận ra
+    time_text = _time_text(rng, hour12, minute, unaccented)
+    if "hour_toi" in tags and "gio" in time_text:
+        time_text = f"{hour12}h{minute:02d}" if minute else f"{hour12}h"
+
+    if not unaccented and rng.random() < 0.25:
+        # Khoảng thời gian: "từ 9h đến 11h sáng mai"
+        tags.append("range")
+        duration = rng.choice((1, 2, 3))
+        end_hour12 = hour12 + duration
+        if end_hour12 not in hours: end_hour12, hour12 = hour12, hour12 - duration
+        if hour12 not in hours:
+            hour12, end_hour12 = min(hours), min(hours) + 1
+        start = datetime.combine(date, datetime.min.time()) + timedelta(hours=hour12 + shift, minutes=minute)
+        end = datetime.combine(date, datetime.min.time()) + timedelta(hours=end_hour12 + shift, minutes=minute)
+        start_text = _time_text(rng, hour12, minute, False)
+        end_text = _time_text(rng, end_hour12, minute, False)
+        if rng.random() < 0.5:
+            when = f"từ {start_text} đến {end_text} {period_text} {day_text}"
+        else:
+            when = f"từ {start_text} {period_text} {day_text} đến {end_text}"
+    else:
+        when = f"{'luc' if unaccented else 'lúc'} {time_text} {period_text} {day_text}"
+
+    location = None
+    where = ""
+    if rng.random() < 0.6:
+        tags.append("location")
+        (location, _), loc_text = _pick(rng, LOCATIONS, unaccented)
+        where = f" {'o' if unaccented else rng.choice(('ở', 'tại'))} {loc_text}"
+
+    offsets = None
+    if rng.random() < 0.5:
+        offset_option, offset_text = _pick(rng, OFFSETS, unaccented)
+        offsets = offset_option[2]
+        tags.append("multi_reminder" if len(offsets) > 1 else "reminder")
+
+    nhac_toi = "nhac toi" if unaccented else rng.choice(("nhắc tôi", "báo tôi", "nhắc mình"))
+    truoc = "truoc" if unaccented else "trước"
+    if offsets and rng.random() < 0.5:
+        # Nhắc trước ở đầu câu: "nhắc tôi trước 15 phút họp nhóm lúc ..."
+        prompt = f"{nhac_toi} {truoc} {offset_text} {event_text} {when}{where}"
+    else:
+        prefix = f"{nhac_toi} " if rng.random() < 0.6 else ""
+        prompt = f"{prefix}{event_text} {when}{where}"
+        if offsets:
+            prompt += f", {'nhac' if unaccented else 'nhắc'} {truoc} {offset_text}"
+    if rng.random() < 0.5: prompt = prompt[0].upper() + prompt[1:]
+
+    return {
+        "prompt": prompt,
+        "ref": ref.isoformat(),
+        "tags": tags,
+        "expected": {
+            "event": event,
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat() if end else None,
+            "location": location,
+            "reminder_offsets": offsets,
+        },
+    }
+
+def generate(count=DEFAULT_COUNT, seed=DEFAULT_SEED):
+    """Sinh count câu lệnh khác nhau (tất định theo seed)."""
+    rng = random.Random(seed)
+    entries, seen = [], set()
+    while len(entries) < count:
+        entry = make_entry(rng)
+        key = (entry["prompt"], entry["ref"])
+        if key in seen: continue
+        seen.add(key)
+        entries.append(dict(id=len(entries) + 1, **entry))
+    return entries
+
+def load(file_path=DEFAULT_OUTPUT):
+    """Đọc bộ câu lệnh từ file JSONL."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Sinh bộ câu lệnh có nhãn cho nlp_pipeline")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args(argv)
+    entries = generate(args.count, args.seed)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    print(f"Đã ghi {len(entries)} câu lệnh vào {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Đánh giá nlp_pipeline trên bộ câu lệnh có nhãn (nlp_corpus.jsonl): độ chính xác
+từng trường và độ trễ mỗi câu, so với kết quả nền (baseline) đã lưu.
+
+    python nlp_eval.py                       # so với nlp_eval_baseline.json
+    python nlp_eval.py --update-baseline     # ghi kết quả hiện tại làm baseline mới
+    python nlp_eval.py --tag unaccented --show-failures 20
+
+Trả về mã thoát 1 nếu độ chính xác của một trường giảm quá --max-accuracy-drop
+hoặc p95 độ trễ tăng quá --max-latency-regression (tỉ lệ) so với baseline.
+Dùng trước / sau mỗi thay đổi tối ưu parser để biết thay đổi có làm sai kết quả không.
+
+Bắt buộc tạo baseline trước (trên mã chưa sửa) bằng --update-baseline: chưa có file
+baseline thì không có gì để so, nên lệnh kiểm tra trả về mã thoát 1 thay vì báo đạt.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import nlp_corpus
+from nlp_pipeline import normalize_text, pipeline_
+
+DEFAULT_BASELINE = "nlp_eval_baseline.json"
+# Các trường được chấm điểm: (tên trong nhãn, tên trong kết quả pipeline_)
+FIELDS = (
+    ("event", "event"),
+    ("start_time", "start_time"),
+    ("end_time", "end_time"),
+    ("location", "location"),
+    ("reminder_offsets", "reminder_offsets"),
+)
+# Số lần chạy làm nóng (nạp mô hình NER) trước khi đo độ trễ
+WARMUP_RUNS = 5
+
+def _percentile(values, p):
+    if not values: return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def _normalize(field, value):
+    """Đưa giá trị về dạng so sánh được: chữ thường, bỏ dấu câu thừa; mốc nhắc không phụ thuộc thứ tự."""
+    if value in (None, "", []): return None
+    if field == "reminder_offsets": return sorted(int(v) for v in value)
+    if field in ("event", "location"): return normalize_text(str(value)).strip(" ,.")
+    return str(value)
+
+def evaluate(entries):
+    """
+    Chạy pipeline_ trên từng câu. Trả về (kết quả, các câu sai), trong đó kết quả gồm
+    độ chính xác từng trường, độ chính xác toàn câu, theo tag, và độ trễ (ms).
+    """
+    for entry in entries[:WARMUP_RUNS]:
+        pipeline_(entry["prompt"], ref=datetime.fromisoformat(entry["ref"]))
+
+    correct = {field: 0 for field, _ in FIELDS}
+    by_tag = {}
+    latencies, failures, errors, exact = [], [], 0, 0
+    for entry in entries:
+        ref = datetime.fromisoformat(entry["ref"])
+        t0 = time.perf_counter()
+        try:
+            out = pipeline_(entry["prompt"], ref=ref)
+        except Exception as e:
+            # Câu làm parser lỗi: tính là sai mọi trường
+            out, errors = {"error": repr(e)}, errors + 1
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+        wrong = []
+        for field, out_field in FIELDS:
+            if _normalize(field, out.get(out_field)) == _normalize(field, entry["expected"][field]):
+                correct[field] += 1
+            else:
+                wrong.append(field)
+        if not wrong: exact += 1
+        for tag in entry.get("tags", []):
+            total, ok = by_tag.get(tag, (0, 0))
+            by_tag[tag] = (total + 1, ok + (not wrong))
+        if wrong: failures.append((entry, out, wrong))
+
+    n = len(entries) or 1
+    result = {
+        "prompts": len(entries),
+        "errors": errors,
+        "accuracy": {field: round(correct[field] / n, 4) for field, _ in FIELDS},
+        "exact_match": round(exact / n, 4),
+        "tags": {tag: round(ok / total, 4) for tag, (total, ok) in sorted(by_tag.items())},
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(max(latencies, default=0), 3),
+        },
+    }
+    return result, failures
+
+def compare(result, baseline, max_accuracy_drop, max_latency_regression):
+    """Danh sách các hồi quy so với baseline (rỗng nếu đạt)."""
+    regressions = []
+    if result["prompts"] != baseline.get("prompts"):
+        regressions.append(f"Số câu khác baseline ({result['prompts']} != {baseline.get('prompts')}), "
+                           f"cần chạy lại --update-baseline khi đổi bộ câu lệnh")
+        return regressions
+    scores = dict(result["accuracy"], exact_match=result["exact_match"])
+    base_scores = dict(baseline.get("accuracy", {}), exact_match=baseline.get("exact_match", 0))
+    for field, base in base_scores.items():
+        if scores.get(field, 0) < base - max_accuracy_drop:
+            regressions.append(f"Độ chính xác '{field}' giảm: {base:.2%} -> {scores.get(field, 0):.2%}")
+    base_p95 = baseline.get("latency_ms", {}).get("p95")
+    if base_p95 and result["latency_ms"]["p95"] > base_p95 * (1 + max_latency_regression):
+        regressions.append(f"p95 độ trễ tăng: {base_p95:.2f}ms -> {result['latency_ms']['p95']:.2f}ms "
+                           f"(cho phép +{max_latency_regression:.0%})")
+    return regressions
+
+def _print_report(result, failures, show_failures):
+    latency = result["latency_ms"]
+    print(f"Câu lệnh: {result['prompts']}, lỗi parser: {result['errors']}, đúng toàn bộ: {result['exact_match']:.2%}")
+    for field, accuracy in result["accuracy"].items():
+        print(f"  {field:<17} {accuracy:.2%}")
+    print("Theo tag (đúng toàn bộ): " + ", ".join(f"{t}={a:.1%}" for t, a in result["tags"].items()))
+    print(f"Độ trễ (ms): p50={latency['p50']:.2f} p95={latency['p95']:.2f} "
+          f"p99={latency['p99']:.2f} max={latency['max']:.2f}")
+    for entry, out, wrong in failures[:show_failures]:
+        print(f"\n#{entry['id']} {entry['prompt']!r} (ref {entry['ref']})")
+        for field, out_field in FIELDS:
+            if field in wrong:
+                print(f"  {field}: mong đợi {entry['expected'][field]!r}, nhận {out.get(out_field)!r}")
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Đánh giá độ chính xác và độ trễ của nlp_pipeline")
+    parser.add_argument("--corpus", default=nlp_corpus.DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Ghi kết quả hiện tại làm baseline")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.0,
+                        help="Mức giảm độ chính xác cho phép mỗi trường (VD: 0.01 = 1 điểm phần trăm)")
+    parser.add_argument("--max-latency-regression", type=float, default=0.25,
+                        help="Mức tăng p95 độ trễ cho phép (tỉ lệ, mặc định 0.25 = 25%%)")
+    parser.add_argument("--tag", help="Chỉ đánh giá các câu có tag này (không so với baseline)")
+    parser.add_argument("--limit", type=int, help="Chỉ đánh giá N câu đầu (không so với baseline)")
+    parser.add_argument("--show-failures", type=int, default=0, help="In N câu sai đầu tiên")
+    args = parser.parse_args(argv)
+
+    entries = nlp_corpus.load(args.corpus)
+    if args.tag: entries = [e for e in entries if args.tag in e.get("tags", [])]
+    if args.limit: entries = entries[:args.limit]
+    result, failures = evaluate(entries)
+    _print_report(result, failures, args.show_failures)
+
+    if args.update_baseline:
+        if args.tag or args.limit:
+            print("Không ghi baseline khi lọc --tag / --limit.")
+            return 1
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=4)
+        print(f"Đã ghi baseline vào {args.baseline}")
+        return 0
+    if args.tag or args.limit:
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"Chưa có baseline ({args.baseline}): chạy với --update-baseline trên mã chưa sửa để tạo trước.")
+        return 1
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(result, baseline, args.max_accuracy_drop, args.max_latency_regression)
+    for line in regressions:
+        print(f"HỒI QUY: {line}")
+    if not regressions: print("Đạt: không có hồi quy so với baseline.")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
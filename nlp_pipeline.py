@@ -3,6 +3,9 @@ import unicodedata
 from datetime import datetime, timedelta
 from underthesea import ner
 
+import recurrence as rec
+import time_utils as tu
+
 # ==============================================================================
 # PHẦN 1: TỪ ĐIỂN & CHUẨN HÓA
 # Mục đích: Giúp máy hiểu được các từ viết tắt, không dấu, sai chính tả phổ biến.
@@ -15,6 +18,9 @@ VIETNAMESE_DICT = {
     'truoc': 'trước', 'phut': 'phút', 'an toi': 'ăn tối', 'voi': 'với',
     'gia dinh': 'gia đình', 'chu nhat': 'chủ nhật', 'nop bai': 'nộp bài', 'tap': 'tập',
     'chieu': 'chiều',
+    # Cụm từ chỉ lịch lặp lại
+    'moi ngay': 'mỗi ngày', 'moi tuan': 'mỗi tuần', 'moi thang': 'mỗi tháng', 'moi thu': 'mỗi thứ',
+    'hang ngay': 'hàng ngày', 'hang tuan': 'hàng tuần', 'hang thang': 'hàng tháng',
 }
 
 # Regex đặc biệt để xử lý trường hợp "7h toi".
@@ -164,9 +170,16 @@ def extract_entities(text: str):
 # PHẦN 3: RULE-BASED EXTRACTION (SỰ KIỆN & NHẮC NHỞ)
 # ==============================================================================
 
-# Regex tìm câu nhắc nhở: "nhắc trước 15 phút", "báo tôi trước 1h"
+# Regex tìm câu nhắc nhở: "nhắc trước 15 phút", "báo tôi trước 1h",
+# nhiều mốc: "nhắc trước 1 ngày và 15 phút", "nhắc trước 2 tiếng, trước 10p"
+# Group 1: Danh sách mốc ("1 ngày và 15 phút"), tách từng mốc bằng PATTERN_OFFSET_ITEM
+_OFFSET_ITEM = r'\d+\s*(?:phút|p|giờ|h|tiếng|ngày)'
+PATTERN_OFFSET = re.compile(
+    r'(?:nhắc|báo)(?:\s+(?:tôi|mình|em|anh|chị|bạn|giúp|giúp tôi))?\s+(?:trước|trc|sớm)\s*'
+    rf'({_OFFSET_ITEM}(?:(?:\s*,?\s*(?:và|với)\s*(?:(?:trước|trc|sớm)\s*)?|\s*,\s*(?:trước|trc|sớm)\s*){_OFFSET_ITEM})*)',
+    re.IGNORECASE)
 # Group 1: Số lượng (15), Group 2: Đơn vị (phút)
-PATTERN_OFFSET = re.compile(r'(?:nhắc|báo)(?:\s+(?:tôi|mình|em|anh|chị|bạn|giúp|giúp tôi))?\s+(?:trước|trc|sớm)\s*(\d+)\s*(phút|p|giờ|h|tiếng|ngày)', re.IGNORECASE)
+PATTERN_OFFSET_ITEM = re.compile(r'(\d+)\s*(phút|p|giờ|h|tiếng|ngày)', re.IGNORECASE)
 
 # Regex tìm tên sự kiện dựa vào vị trí sau từ khóa "nhắc tôi"
 PATTERN_EVENT = re.compile(r'(?:((nhắc|báo) (?:tôi|mình|nhớ|giúp tôi)|hãy (nhắc|báo)|(nhắc|báo) trước)(?:\s+về)?\s*)(.*?)(?=\s*(?:lúc|vào|sáng|chiều|tối|mai|ngày|,|$))', re.IGNORECASE)
@@ -181,12 +194,17 @@ def rule_extract(text: str):
     # 1. Xử lý Nhắc nhở (Reminder) trước
     off = PATTERN_OFFSET.search(text_copy)
     if off:
-        qty, unit = int(off.group(1)), off.group(2).lower()
-        # Quy đổi hết ra phút để lưu vào DB
-        if unit in ['giờ', 'h', 'tiếng']: minutes = qty * 60
-        elif unit in ['ngày']: minutes = qty * 24 * 60
-        else: minutes = qty
-        data['reminder_offset_minutes'] = minutes
+        offsets = []
+        for qty, unit in PATTERN_OFFSET_ITEM.findall(off.group(1)):
+            qty, unit = int(qty), unit.lower()
+            # Quy đổi hết ra phút để lưu vào DB
+            if unit in ['giờ', 'h', 'tiếng']: minutes = qty * 60
+            elif unit in ['ngày']: minutes = qty * 24 * 60
+            else: minutes = qty
+            offsets.append(minutes)
+        # Mốc đầu tiên (giữ như trước), và toàn bộ các mốc
+        data['reminder_offset_minutes'] = offsets[0]
+        data['reminder_offsets_minutes'] = offsets
         
         # Quan trọng: Xóa cụm từ "nhắc trước..." khỏi câu gốc 
         # để tránh nó bị nhận nhầm làm tên sự kiện.
@@ -227,6 +245,91 @@ def rule_extract(text: str):
 
     return data
 
+# ==============================================================================
+# PHẦN 3.5: LỊCH LẶP LẠI (RECURRENCE)
+# VD: "mỗi thứ 2", "thứ 3 và thứ 5 hàng tuần", "hàng ngày", "mỗi 2 tuần",
+#     "... đến 31/12", "... 10 lần", "... trong 8 tuần"
+# ==============================================================================
+
+_DAY = r'(?:thứ\s*(?:hai|ba|tư|năm|sáu|bảy|[2-7])|chủ nhật|cn)'
+
+# "hàng" sau các động từ này là "hàng hóa" chứ không phải "mỗi" (VD: "lấy hàng ngày mai", "giao hàng thứ 2").
+# Mỗi lookbehind có độ dài cố định nên tạo riêng cho từng từ (văn bản đã được normalize_text gộp khoảng trắng)
+_GOODS_VERBS = ('lấy', 'giao', 'nhận', 'mua', 'bán', 'đặt', 'gửi', 'chuyển', 'nhập', 'xuất', 'kiểm', 'soạn', 'trả', 'đổi', 'ship')
+_NOT_GOODS = ''.join(rf'(?<!\b{verb} )' for verb in _GOODS_VERBS)
+_EVERY = rf'(?:mỗi|{_NOT_GOODS}hàng|hằng)'
+# Sau đơn vị là từ chỉ ngày tương đối thì không phải lặp lại: "hàng ngày mai", "hàng tuần sau"
+_NOT_RELATIVE = r'(?!\s+(?:mai|kia|mốt|sau|tới|này)\b)'
+
+# "mỗi thứ 2", "các ngày thứ 2, thứ 4 và thứ 6"
+PATTERN_RECUR_WEEKDAYS = re.compile(r'\b(?:mỗi|hằng|các|' + _NOT_GOODS + r'hàng)\s+(?:ngày\s+)?(' + _DAY + r'(?:\s*(?:,|và)\s*' + _DAY + r')*)(?:\s+(?:hàng|hằng|mỗi)\s+tuần)?', re.IGNORECASE)
+# "thứ 2 hàng tuần", "thứ 2 và thứ 4 hằng tuần"
+PATTERN_WEEKDAYS_WEEKLY = re.compile(r'\b(' + _DAY + r'(?:\s*(?:,|và)\s*' + _DAY + r')*)\s+(?:hàng|hằng|mỗi)\s+tuần', re.IGNORECASE)
+# "hàng ngày", "mỗi 2 tuần", "hằng tháng"
+PATTERN_RECUR_FREQ = re.compile(r'\b' + _EVERY + r'\s+(?:(\d+)\s+)?(ngày|tuần|tháng)\b' + _NOT_RELATIVE, re.IGNORECASE)
+# "2 tuần một lần"
+PATTERN_RECUR_EVERY_N = re.compile(r'\b(\d+)\s+(ngày|tuần|tháng)\s+(?:một|1)\s+lần\b', re.IGNORECASE)
+# Giới hạn chuỗi: "đến 31/12", "cho đến hết ngày 31/12/2025"
+PATTERN_RECUR_UNTIL = re.compile(r'\b(?:cho\s+)?(?:đến|tới)\s+(?:hết\s+)?(?:ngày\s+)?(\d{1,2}/\d{1,2}(?:/\d{2,4})?)', re.IGNORECASE)
+# Giới hạn chuỗi: "10 lần", "trong 8 tuần"
+PATTERN_RECUR_COUNT = re.compile(r'\b(?:(\d+)\s+lần|trong\s+(\d+)\s+(ngày|tuần|tháng))\b', re.IGNORECASE)
+
+FREQ_UNITS = {'ngày': 'DAILY', 'tuần': 'WEEKLY', 'tháng': 'MONTHLY'}
+
+def _parse_weekdays(days_text: str):
+    days = []
+    for part in re.split(r'\s*(?:,|và)\s*', days_text.lower()):
+        part = re.sub(r'thứ\s*', 'thứ ', part.strip())
+        if part in RE_DAY_OF_WEEK: days.append(RE_DAY_OF_WEEK[part])
+    return days
+
+def extract_recurrence(text: str, now=None):
+    """
+    Tìm cụm từ lặp lại trong câu.
+    Trả về (rule, text_con_lai, anchor):
+    - rule: chuỗi RRULE hoặc None nếu không phải sự kiện lặp.
+    - text_con_lai: câu đã bỏ cụm lặp lại.
+    - anchor: thứ đầu tiên trong cụm lặp (VD: "thứ 2") để vẫn tính được ngày bắt đầu.
+    """
+    freq, interval, byday, anchor = None, 1, [], ""
+
+    m = PATTERN_RECUR_WEEKDAYS.search(text) or PATTERN_WEEKDAYS_WEEKLY.search(text)
+    if m:
+        byday = _parse_weekdays(m.group(1))
+        if byday:
+            freq = 'WEEKLY'
+            anchor = re.split(r'\s*(?:,|và)\s*', m.group(1).strip())[0]
+            text = text[:m.start()] + text[m.end():]
+    if not freq:
+        m = PATTERN_RECUR_FREQ.search(text) or PATTERN_RECUR_EVERY_N.search(text)
+        if m:
+            freq = FREQ_UNITS[m.group(2).lower()]
+            interval = int(m.group(1)) if m.group(1) else 1
+            text = text[:m.start()] + text[m.end():]
+    if not freq:
+        return None, text, anchor
+
+    until, count = None, None
+    m = PATTERN_RECUR_UNTIL.search(text)
+    if m:
+        until_iso = parse_vietnamese_time(m.group(1) + " 23:59", now=now)
+        until = datetime.fromisoformat(until_iso) if until_iso else None
+        text = text[:m.start()] + text[m.end():]
+    else:
+        m = PATTERN_RECUR_COUNT.search(text)
+        if m:
+            if m.group(1):
+                count = int(m.group(1))
+            else:
+                # "trong 8 tuần" với "mỗi thứ 2, thứ 4" -> 16 lần
+                span = int(m.group(2))
+                if FREQ_UNITS[m.group(3).lower()] == freq:
+                    count = max(1, span // interval) * max(1, len(byday))
+            text = text[:m.start()] + text[m.end():]
+
+    text = re.sub(r'\s+', ' ', text).strip(' ,')
+    return rec.build_rrule(freq, interval=interval, byday=byday, until=until, count=count), text, anchor
+
 # ==============================================================================
 # PHẦN 4: PHÂN TÍCH THỜI GIAN (DATETIME PARSING)
 # Mục đích: Chuyển ngôn ngữ tự nhiên sang datetime object của Python
@@ -245,9 +348,12 @@ RE_DAY_OF_WEEK = {
     'thứ 5': 3, 'thứ năm': 3, 'thứ 6': 4, 'thứ sáu': 4, 'thứ 7': 5, 'thứ bảy': 5, 'chủ nhật': 6, 'cn': 6
 }
 
-def parse_vietnamese_time(text, now=None, to_utc=False):
-    """Hàm phân tích logic thời gian."""
-    if now is None: now = datetime.now()
+def parse_vietnamese_time(text, now=None, to_utc=False, tz=None):
+    """Hàm phân tích logic thời gian.
+    Kết quả là giờ địa phương của múi giờ tz (mặc định: time_utils.TIMEZONE);
+    to_utc=True thì đổi sang UTC theo đúng độ lệch (kể cả giờ mùa hè) tại thời điểm đó.
+    """
+    if now is None: now = tu.now_local(tz)
     text = text.lower().strip()
     if not text: return None
 
@@ -327,7 +433,7 @@ def parse_vietnamese_time(text, now=None, to_utc=False):
     except ValueError: dt = datetime.combine(target_date, datetime.min.time()) + timedelta(hours=hour)
 
     if to_utc:
-        dt -= timedelta(hours=7) 
+        dt = tu.to_utc(dt, tz).replace(tzinfo=None)
         return dt.replace(microsecond=0).isoformat() + "Z"
     else:
         return dt.replace(microsecond=0).isoformat()
@@ -338,7 +444,7 @@ def parse_vietnamese_time(text, now=None, to_utc=False):
 
 def merge_and_validate(text, ner_out, rule_out, resolved_start_time, resolved_end_time, ref=None):
     """Đóng gói tất cả kết quả vào Dictionary cuối cùng."""
-    if ref is None: ref = datetime.now()
+    if ref is None: ref = tu.now_local()
     
     location = ner_out["merged_location"]
     # Nếu NER không tìm thấy location, thử fallback regex lần cuối
@@ -351,7 +457,9 @@ def merge_and_validate(text, ner_out, rule_out, resolved_start_time, resolved_en
         "start_time": resolved_start_time,
         "end_time": resolved_end_time,
         "reminder_minutes": rule_out.get("reminder_offset_minutes"),
+        "reminder_offsets": rule_out.get("reminder_offsets_minutes"),
         "location": location,
+        "recurrence": rule_out.get("recurrence"),
     }
     return out
 
@@ -360,21 +468,26 @@ def pipeline_(text: str, ref: datetime = None):
     # 1. Chuẩn hóa text
     text_norm = normalize_text(text)
     text_restored = restore_diacritics_text(text_norm)
+
+    # 1.5. Tách cụm lặp lại ("mỗi thứ 2") để không lẫn vào tên sự kiện/thời gian
+    recurrence, text_restored, anchor = extract_recurrence(text_restored, now=ref)
     
     # 2. Trích xuất thực thể thô
-    ner_out = extract_entities(text_restored)
+    # Thứ trong cụm lặp ("mỗi thứ 2") được nối lại vào câu để tính ngày bắt đầu
+    ner_out = extract_entities(f"{text_restored} {anchor}".strip())
     
     # 3. Trích xuất sự kiện & nhắc nhở
     rule_out = rule_extract(text_restored)
+    rule_out['recurrence'] = recurrence
     
-    # 4. Phân tích thời gian
-    start_dt = parse_vietnamese_time(ner_out['merged_time'])
+    # 4. Phân tích thời gian (theo mốc tham chiếu ref, mặc định là bây giờ)
+    start_dt = parse_vietnamese_time(ner_out['merged_time'], now=ref)
     end_dt = None
     
     if ner_out.get('merged_endtime'):
         # Khi parse giờ kết thúc, dùng giờ bắt đầu làm mốc tham chiếu (now)
         # Để hiểu ngữ cảnh "đến 9h tối" (cùng ngày với start_time)
-        start_datetime_obj = datetime.fromisoformat(start_dt) if start_dt else datetime.now()
+        start_datetime_obj = datetime.fromisoformat(start_dt) if start_dt else (ref or tu.now_local())
         end_dt = parse_vietnamese_time(ner_out['merged_endtime'], now=start_datetime_obj)
 
     # 5. Gói kết quả
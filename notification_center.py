@@ -0,0 +1,120 @@
+import itertools
+import tkinter as tk
+from tkinter import ttk
+
+import database as db
+
+# ==============================================================================
+# TRUNG TÂM THÔNG BÁO
+# Cửa sổ không chặn (non-modal) gom mọi nhắc nhở đến trong cùng một lượt kiểm tra,
+# thay cho mỗi sự kiện một messagebox (modal, chặn vòng lặp Tk cho tới khi bấm OK).
+# Hỗ trợ báo lại (snooze, một lần ghi CSDL cho cả nhóm) và bỏ qua tất cả.
+# ==============================================================================
+
+# Các lựa chọn báo lại (phút)
+SNOOZE_CHOICES = (5, 10, 15, 30, 60)
+DEFAULT_SNOOZE_MINUTES = 10
+
+class NotificationCenter:
+    def __init__(self, root, store, writer=None):
+        self.root = root
+        # EventStore: lấy bản ghi hiển thị (chuỗi đã định dạng sẵn)
+        self.store = store
+        # DatabaseWriter (db_writer.py): báo lại qua thread ghi, không chờ CSDL
+        self.writer = writer
+        # Các nhắc nhở đang hiển thị: (số thứ tự, EventRecord). EventStore trả về cùng một EventRecord
+        # cho các lần nhắc của cùng một sự kiện (VD: đã báo lại), nên mỗi mục được nhận diện bằng số thứ tự riêng
+        self.pending = []
+        self._tokens = itertools.count()
+        self.window = None  # Tạo khi có nhắc nhở đầu tiên, ẩn đi khi không còn nhắc nhở
+
+    def _build_window(self):
+        self.window = tk.Toplevel(self.root)
+        self.window.geometry("460x320")
+        # Đóng cửa sổ = bỏ qua tất cả
+        self.window.protocol("WM_DELETE_WINDOW", self.dismiss_all)
+
+        main_frame = ttk.Frame(self.window, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        list_frame = ttk.Frame(main_frame)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        self.listbox = tk.Listbox(list_frame, selectmode=tk.EXTENDED, height=6, yscrollcommand=scrollbar.set)
+        scrollbar.config(command=self.listbox.yview)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind('<<ListboxSelect>>', self.on_select)
+
+        # Chi tiết nhắc nhở đang chọn
+        self.detail_label = ttk.Label(main_frame, justify=tk.LEFT, wraplength=430)
+        self.detail_label.pack(fill=tk.X, pady=(8, 0))
+
+        button_frame = ttk.Frame(main_frame)
+        button_frame.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(button_frame, text="Báo lại sau (phút):").pack(side=tk.LEFT)
+        self.snooze_minutes = tk.IntVar(value=DEFAULT_SNOOZE_MINUTES)
+        ttk.Combobox(button_frame, textvariable=self.snooze_minutes, values=SNOOZE_CHOICES,
+                     width=4, state="readonly").pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Báo lại", command=self.snooze_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Bỏ qua", command=self.dismiss_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Bỏ qua tất cả", command=self.dismiss_all).pack(side=tk.LEFT, padx=5)
+
+    def add(self, events):
+        """Thêm các nhắc nhở của một lượt kiểm tra rồi hiện cửa sổ (một lần, không chặn main loop)."""
+        if not events: return
+        if self.window is None: self._build_window()
+        self.pending.extend((next(self._tokens), self.store.record(e)) for e in events)
+        self._refresh()
+        self.window.deiconify()
+        self.window.lift()
+        self.window.bell()
+
+    def _refresh(self):
+        if not self.pending:
+            self.window.withdraw()
+            return
+        self.window.title(f"NHẮC NHỞ SỰ KIỆN ({len(self.pending)})")
+        self.listbox.delete(0, tk.END)
+        for _, record in self.pending:
+            self.listbox.insert(tk.END, record.display)
+        self.listbox.selection_set(0)
+        self.on_select()
+
+    def on_select(self, event=None):
+        selection = self.listbox.curselection()
+        self.detail_label.config(text=self.pending[selection[0]][1].reminder_text if selection else "")
+
+    def _selected(self):
+        """Các mục (số thứ tự, EventRecord) đang chọn (không chọn gì = tất cả)."""
+        selection = self.listbox.curselection()
+        return [self.pending[i] for i in selection] if selection else list(self.pending)
+
+    def _remove(self, entries):
+        removed = {token for token, _ in entries}
+        self.pending = [entry for entry in self.pending if entry[0] not in removed]
+        self._refresh()
+
+    def snooze_selected(self):
+        """Báo lại các nhắc nhở đang chọn sau N phút."""
+        entries = self._selected()
+        records = [record for _, record in entries]
+        minutes = self.snooze_minutes.get()
+        # Thêm nhắc nhở báo lại vào CSDL (một transaction cho cả nhóm, kể cả lần xảy ra của chuỗi lặp)
+        if self.writer is None:
+            db.snooze_reminders(records, minutes)
+        else:
+            self.writer.snooze_reminders(records, minutes).add_done_callback(self._on_snooze_done)
+        # (Sự kiện đã bắt đầu thì không được báo lại, chỉ đóng thông báo)
+        self._remove(entries)
+
+    def _on_snooze_done(self, future):
+        # Chạy ở thread ghi: chỉ ghi log, không động vào Tk
+        if future.exception() is not None:
+            print(f"Lỗi báo lại nhắc nhở: {future.exception()}")
+
+    def dismiss_selected(self):
+        self._remove(self._selected())
+
+    def dismiss_all(self):
+        self._remove(list(self.pending))
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+import calendar
+
+import time_utils as tu
+
+# ==============================================================================
+# LUẬT LẶP LẠI (RECURRENCE RULES)
+# Lưu chuỗi lặp theo cú pháp RRULE (RFC 5545) rút gọn:
+#   FREQ=DAILY|WEEKLY|MONTHLY ; INTERVAL=n ; BYDAY=MO,WE ; UNTIL=YYYYMMDDTHHMMSS ; COUNT=n
+# UNTIL không có hậu tố Z là giờ địa phương của chuỗi; có Z (file ICS nhập vào)
+# là giờ UTC và được đổi sang múi giờ tz của chuỗi khi phân tích.
+# Mỗi chuỗi chỉ lưu 1 dòng trong CSDL, các lần xảy ra được sinh "lười" (lazy)
+# trong đúng khoảng thời gian cần xem.
+# ==============================================================================
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+
+# Mã thứ trong RRULE (0=Thứ 2 ... 6=Chủ nhật, giống datetime.weekday())
+WEEKDAY_CODES = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+WEEKDAY_NAMES_VI = ['thứ 2', 'thứ 3', 'thứ 4', 'thứ 5', 'thứ 6', 'thứ 7', 'chủ nhật']
+
+UNTIL_FORMAT = '%Y%m%dT%H%M%S'
+
+def build_rrule(freq, interval=1, byday=None, until=None, count=None) -> str:
+    """Tạo chuỗi RRULE từ các tham số. byday là danh sách số thứ (0-6)."""
+    freq = freq.upper()
+    if freq not in FREQUENCIES:
+        raise ValueError(f"Tần suất không hỗ trợ: {freq}")
+    parts = [f"FREQ={freq}"]
+    if interval and interval > 1:
+        parts.append(f"INTERVAL={interval}")
+    if byday:
+        parts.append("BYDAY=" + ",".join(WEEKDAY_CODES[d] for d in sorted(set(byday))))
+    if until:
+        if isinstance(until, str): until = datetime.fromisoformat(until)
+        parts.append(f"UNTIL={until.strftime(UNTIL_FORMAT)}")
+    elif count:
+        parts.append(f"COUNT={int(count)}")
+    return ";".join(parts)
+
+def parse_rrule(rule: str, tz: str = None) -> dict:
+    """
+    Phân tích chuỗi RRULE thành dict: FREQ, INTERVAL, BYDAY, UNTIL, COUNT.
+    UNTIL luôn trả về theo giờ địa phương của múi giờ tz (mặc định: múi giờ ứng dụng).
+    """
+    if rule.upper().startswith('RRULE:'): rule = rule[6:]
+    out = {'FREQ': None, 'INTERVAL': 1, 'BYDAY': [], 'UNTIL': None, 'COUNT': None}
+    for part in rule.split(';'):
+        if '=' not in part: continue
+        key, value = part.split('=', 1)
+        key, value = key.strip().upper(), value.strip()
+        if key == 'FREQ':
+            out['FREQ'] = value.upper()
+        elif key == 'INTERVAL':
+            out['INTERVAL'] = max(1, int(value))
+        elif key == 'BYDAY':
+            out['BYDAY'] = sorted({WEEKDAY_CODES.index(code.strip().upper()[-2:]) for code in value.split(',') if code.strip()})
+        elif key == 'UNTIL':
+            is_utc = value.upper().endswith('Z')
+            value = value.rstrip('Zz')
+            until = datetime.strptime(value, UNTIL_FORMAT) if 'T' in value else datetime.strptime(value + 'T235959', UNTIL_FORMAT)
+            if is_utc:
+                until = tu.from_epoch(tu.to_epoch(until, 'UTC'), tz)
+            out['UNTIL'] = until
+        elif key == 'COUNT':
+            out['COUNT'] = int(value)
+    if out['FREQ'] not in FREQUENCIES:
+        raise ValueError(f"RRULE không hợp lệ: {rule}")
+    return out
+
+def _add_months(year, month, n):
+    month_index = year * 12 + (month - 1) + n
+    return month_index // 12, month_index % 12 + 1
+
+def _iter_raw(dtstart: datetime, r: dict, skip_to: datetime = None):
+    """Sinh các lần xảy ra theo luật (chưa xét UNTIL/COUNT/EXDATE).
+    skip_to: nhảy thẳng tới gần mốc này thay vì duyệt từ đầu chuỗi.
+    """
+    interval = r['INTERVAL']
+    freq = r['FREQ']
+    jump = skip_to is not None and skip_to > dtstart
+
+    if freq == 'DAILY':
+        k = ((skip_to - dtstart).days // interval) if jump else 0
+        while True:
+            yield dtstart + timedelta(days=k * interval)
+            k += 1
+
+    elif freq == 'WEEKLY':
+        byday = r['BYDAY'] or [dtstart.weekday()]
+        week0 = dtstart - timedelta(days=dtstart.weekday()) # Thứ 2 của tuần đầu tiên
+        k = (((skip_to - week0).days // 7) // interval) if jump else 0
+        while True:
+            week_start = week0 + timedelta(weeks=k * interval)
+            for wd in byday:
+                occ = week_start + timedelta(days=wd)
+                if occ >= dtstart: yield occ
+            k += 1
+
+    elif freq == 'MONTHLY':
+        k = 0
+        if jump:
+            months = (skip_to.year - dtstart.year) * 12 + (skip_to.month - dtstart.month)
+            k = max(0, months // interval)
+        while True:
+            y, m = _add_months(dtstart.year, dtstart.month, k * interval)
+            # Theo RFC 5545: tháng không có ngày đó (VD: 31/2) thì bỏ qua
+            if dtstart.day <= calendar.monthrange(y, m)[1]:
+                yield dtstart.replace(year=y, month=m)
+            k += 1
+
+def _parse_exdates(exdates):
+    if not exdates: return set()
+    if isinstance(exdates, str): exdates = exdates.split(',')
+    return {datetime.fromisoformat(d.strip()) if isinstance(d, str) else d for d in exdates if d}
+
+def iter_occurrences(dtstart: datetime, rule, window_start: datetime = None, window_end: datetime = None, exdates=None,
+                     tz: str = None):
+    """
+    Sinh lười các lần xảy ra của chuỗi trong khoảng [window_start, window_end).
+    Khi không có COUNT, bộ sinh nhảy thẳng tới window_start nên chi phí
+    chỉ tỉ lệ với số lần xảy ra nằm trong khoảng cần xem.
+    tz: múi giờ của chuỗi (dtstart và các mốc đều là giờ địa phương của múi giờ này).
+    """
+    r = parse_rrule(rule, tz) if isinstance(rule, str) else rule
+    until, count = r['UNTIL'], r['COUNT']
+    skipped = _parse_exdates(exdates)
+    # COUNT tính từ đầu chuỗi nên không được nhảy cóc
+    skip_to = None if count else window_start
+    n = 0
+    for occ in _iter_raw(dtstart, r, skip_to=skip_to):
+        if until and occ > until: return
+        if window_end and occ >= window_end: return
+        n += 1
+        if count and n > count: return
+        if window_start and occ < window_start: continue
+        if occ in skipped: continue
+        yield occ
+
+def next_occurrence(dtstart: datetime, rule, after: datetime, exdates=None, tz: str = None):
+    """Lần xảy ra đầu tiên sau mốc `after` (không tính `after`), hoặc None."""
+    for occ in iter_occurrences(dtstart, rule, window_start=after, exdates=exdates, tz=tz):
+        if occ > after: return occ
+    return None
+
+def series_end(dtstart: datetime, rule, tz: str = None):
+    """Cận trên của lần xảy ra cuối cùng (None nếu chuỗi lặp vô hạn)."""
+    r = parse_rrule(rule, tz) if isinstance(rule, str) else rule
+    if r['UNTIL']: return r['UNTIL']
+    if r['COUNT']:
+        last = None
+        for last in iter_occurrences(dtstart, r): pass
+        return last
+    return None
+
+def describe_rrule(rule, tz: str = None) -> str:
+    """Mô tả chuỗi lặp bằng tiếng Việt. VD: 'mỗi thứ 2, thứ 4 đến 31/12/2025'."""
+    r = parse_rrule(rule, tz) if isinstance(rule, str) else rule
+    unit = {'DAILY': 'ngày', 'WEEKLY': 'tuần', 'MONTHLY': 'tháng'}[r['FREQ']]
+    if r['FREQ'] == 'WEEKLY' and r['BYDAY']:
+        text = "mỗi " + ", ".join(WEEKDAY_NAMES_VI[d] for d in r['BYDAY'])
+        if r['INTERVAL'] > 1: text += f" ({r['INTERVAL']} tuần một lần)"
+    elif r['INTERVAL'] > 1:
+        text = f"mỗi {r['INTERVAL']} {unit}"
+    else:
+        text = f"hàng {unit}"
+    if r['UNTIL']:
+        text += f" đến {r['UNTIL'].strftime('%d/%m/%Y')}"
+    elif r['COUNT']:
+        text += f" {r['COUNT']} lần"
+    return text
@@ -0,0 +1,162 @@
+import json
+import logging
+import threading
+import urllib.request
+
+import database as db
+import time_utils as tu
+
+# ==============================================================================
+# DỊCH VỤ NHẮC NHỞ (CHẠY KHÔNG CẦN GIAO DIỆN)
+# Vòng lặp kiểm tra nhắc nhở tách khỏi ScheduleApp để chạy được trên máy chủ
+# (cli.py run-daemon). Không import tkinter.
+# ==============================================================================
+
+# Kiểm tra định kỳ (mỗi 60 giây)
+REMINDER_CHECK_INTERVAL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+def format_event_time(event: dict) -> str:
+    """Chuỗi thời gian của sự kiện, VD: '09:00 - 10:00 ngày 20/11/2025'."""
+    dt_start = tu.from_epoch(event['start_epoch'])
+    time_str = dt_start.strftime('%H:%M ngày %d/%m/%Y')
+
+    # Nếu có giờ kết thúc, hiển thị dạng "09:00 - 21:00"
+    if event.get('end_epoch') is not None:
+        dt_end = tu.from_epoch(event['end_epoch'])
+        # Nếu cùng ngày thì chỉ hiện giờ kết thúc
+        if dt_start.date() == dt_end.date():
+            time_str = f"{dt_start.strftime('%H:%M')} - {dt_end.strftime('%H:%M')} ngày {dt_start.strftime('%d/%m/%Y')}"
+        else:
+            time_str = f"{dt_start.strftime('%H:%M %d/%m')} - {dt_end.strftime('%H:%M %d/%m')}"
+    return time_str
+
+def format_offset(minutes: int) -> str:
+    """VD: 1440 -> '1 ngày', 120 -> '2 tiếng', 15 -> '15p'."""
+    if minutes % (24 * 60) == 0: return f"{minutes // (24 * 60)} ngày"
+    if minutes % 60 == 0: return f"{minutes // 60} tiếng"
+    return f"{minutes}p"
+
+def format_offsets(event: dict) -> str:
+    """Các mốc nhắc của sự kiện, VD: '1 ngày, 15p' (rỗng nếu không nhắc)."""
+    return ", ".join(format_offset(m) for m in db._reminder_offsets(event))
+
+def format_reminder(event: dict) -> str:
+    """Nội dung thông báo nhắc nhở."""
+    return (
+        f"Sự kiện sắp diễn ra!\n\n"
+        f"Nội dung: {event['event']}\n"
+        f"Thời gian: {format_event_time(event)}\n"
+        f"Địa điểm: {event['location'] or 'Không có'}"
+    )
+
+# --- Các kênh nhận thông báo (notification sink) ---
+# Mỗi sink chỉ cần có phương thức notify(event).
+
+class StdoutSink:
+    """In thông báo ra màn hình."""
+    def notify(self, event):
+        print(f"[NHẮC NHỞ] {format_reminder(event)}\n", flush=True)
+
+class LogFileSink:
+    """Ghi thông báo vào file log (mỗi nhắc nhở một dòng)."""
+    def __init__(self, path):
+        self.logger = logging.getLogger(f"{__name__}.file")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        handler = logging.FileHandler(path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        self.logger.addHandler(handler)
+
+    def notify(self, event):
+        self.logger.info(f"ID {event['id']}: {event['event']} | {format_event_time(event)} | {event['location'] or ''}")
+
+class WebhookSink:
+    """Gửi thông báo dạng JSON (POST) tới một địa chỉ HTTP cục bộ."""
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def notify(self, event):
+        payload = {
+            "id": event['id'],
+            "event": event['event'],
+            "start_time": event['start_time'],
+            "end_time": event.get('end_time'),
+            "location": event.get('location'),
+            "message": format_reminder(event),
+        }
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+class QueueSink:
+    """Đẩy sự kiện vào queue (dùng cho giao diện Tk: main thread sẽ lấy ra hiển thị)."""
+    def __init__(self, target_queue):
+        self.queue = target_queue
+
+    def notify(self, event):
+        self.queue.put(event)
+
+# --- Dịch vụ nhắc nhở ---
+
+class ReminderService:
+    def __init__(self, sinks, interval=REMINDER_CHECK_INTERVAL_SECONDS, calendar_id=None, source=db, writer=None):
+        self.sinks = list(sinks)
+        self.interval = interval
+        # Nguồn sự kiện cần nhắc: module database hoặc EventStore (đọc từ bộ nhớ)
+        self.source = source
+        # DatabaseWriter (db_writer.py): đánh dấu đã nhắc / kết thúc mốc đã lỡ qua thread ghi
+        self.writer = writer
+        # None: kiểm tra mọi lịch trong CSDL
+        self.calendar_id = calendar_id
+        self._stop = threading.Event()
+
+    def check_once(self) -> int:
+        """Kiểm tra một lượt, gửi thông báo tới mọi sink. Trả về số nhắc nhở đã gửi."""
+        # Có writer: mốc đã lỡ cũng được kết thúc qua thread ghi (lượt đọc không ghi CSDL)
+        events_to_remind = self.source.get_events_to_remind(self.calendar_id, writer=self.writer)
+        for event in events_to_remind:
+            for sink in self.sinks:
+                try:
+                    sink.notify(event)
+                except Exception as e:
+                    logger.error(f"Lỗi gửi thông báo qua {type(sink).__name__}: {e}")
+        # Đánh dấu là đã nhắc (chuỗi lặp: chỉ đánh dấu lần xảy ra này)
+        if self.writer is None:
+            for event in events_to_remind:
+                db.mark_as_reminded(event['id'], event.get('occurrence_start'), event.get('reminder_ids'))
+        else:
+            futures = [self.writer.mark_as_reminded(event['id'], event.get('occurrence_start'), event.get('reminder_ids'))
+                       for event in events_to_remind]
+            # Chờ ghi xong để lượt kiểm tra sau không nhắc lại cùng các mốc này
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Lỗi đánh dấu đã nhắc: {e}")
+        return len(events_to_remind)
+
+    def run_forever(self):
+        """Vòng lặp kiểm tra cho tới khi stop() được gọi."""
+        while not self._stop.is_set():
+            try:
+                self.check_once()
+            except Exception as e:
+                logger.error(f"Lỗi thread nhắc nhở: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        """Chạy vòng lặp ở thread nền (daemon)."""
+        thread = threading.Thread(target=self.run_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
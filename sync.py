@@ -0,0 +1,180 @@
+import json
+import sqlite3
+
+import database as db
+import migrations
+from import_export import EXPORT_FIELDS
+
+# ==============================================================================
+# ĐỒNG BỘ TĂNG DẦN GIỮA HAI CSDL
+# Mọi thao tác thêm / sửa / xóa sự kiện được trigger ghi vào bảng change_log với
+# số thứ tự seq tăng dần (xem migrations.py, v11). Thay vì xuất toàn bộ CSDL,
+# chỉ cần gửi các thay đổi sau mốc seq mà CSDL bên kia đã nhận:
+#   export_changes_since(N) -> bộ thay đổi (dict, ghi được ra JSON)
+#   apply_changes(bộ thay đổi) -> áp dụng vào CSDL này, ghi nhớ seq đã nhận (sync_peers)
+#   sync_with(đường dẫn CSDL khác) -> đồng bộ hai chiều hai file schedule.db
+# Sự kiện được nhận diện bằng uid (không đổi giữa các CSDL). Khi cả hai bên cùng sửa
+# một sự kiện, thay đổi được áp dụng sau ghi đè thay đổi trước.
+# Hai CSDL cần có cùng các lịch (calendar_id); thay đổi thuộc lịch không tồn tại bị bỏ qua.
+# ==============================================================================
+
+# Các trường của sự kiện được gửi kèm thay đổi
+SYNC_FIELDS = EXPORT_FIELDS + ('timezone', 'calendar_id')
+
+def _open(path: str):
+    """Mở một CSDL khác (không phải db.DB_NAME), kiểm tra đã ở phiên bản lược đồ mới nhất."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    if migrations.get_version(conn) != migrations.SCHEMA_VERSION:
+        conn.close()
+        raise ValueError(f"CSDL {path} chưa được nâng cấp (chạy: python cli.py --db {path} migrate)")
+    return conn
+
+def _database_uid(conn) -> str:
+    return conn.execute("SELECT value FROM db_meta WHERE key = 'uid'").fetchone()[0]
+
+def _peer_seq(conn, peer_uid: str) -> int:
+    row = conn.execute("SELECT last_seq FROM sync_peers WHERE peer_uid = ?", (peer_uid,)).fetchone()
+    return row[0] if row else 0
+
+def _export(conn, since_seq: int) -> dict:
+    """Các thay đổi có seq > since_seq, mỗi sự kiện chỉ lấy thay đổi cuối cùng kèm dữ liệu hiện tại."""
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    # Đọc nhất quán trong một transaction: seq cuối và dữ liệu sự kiện cùng một thời điểm
+    cursor.execute("BEGIN")
+    last_seq = cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    # Với MAX(seq), SQLite lấy cột op của chính dòng có seq lớn nhất trong nhóm
+    cursor.execute("""
+        SELECT uid, op, MAX(seq) AS seq FROM change_log
+        WHERE seq > ? AND seq <= ? GROUP BY uid ORDER BY seq
+    """, (since_seq, last_seq))
+    changes = []
+    for row in cursor.fetchall():
+        change = {'seq': row['seq'], 'op': row['op'], 'uid': row['uid']}
+        if row['op'] == 'upsert':
+            event = cursor.execute("SELECT * FROM events WHERE uid = ?", (row['uid'],)).fetchone()
+            # Sự kiện đã đổi uid (gộp với sự kiện trùng của CSDL khác) hoặc đã chuyển vào lưu trữ
+            if event is None: continue
+            change['event'] = {field: event[field] for field in SYNC_FIELDS}
+        changes.append(change)
+    conn.commit()
+    return {'source': _database_uid(conn), 'since': since_seq, 'last_seq': last_seq, 'changes': changes}
+
+def _apply_upsert(cursor, uid: str, data: dict):
+    """Thêm / sửa sự kiện theo uid. Trả về 'added', 'updated' hoặc None (không có gì khác)."""
+    cursor.execute("SELECT * FROM events WHERE uid = ?", (uid,))
+    row = cursor.fetchone()
+    if row is None:
+        # Sự kiện trùng nội dung đã có sẵn với uid khác (VD: cùng nhập một file JSON ở hai máy):
+        # dùng uid của bên gửi để các lần sửa sau khớp đúng sự kiện
+        cols = db._time_columns(data)
+        cursor.execute("SELECT * FROM events WHERE calendar_id = ? AND content_hash = ?",
+                       (data.get('calendar_id') or db.DEFAULT_CALENDAR_ID, db._content_hash(dict(data, **cols))))
+        row = cursor.fetchone()
+        if row is None:
+            db._upsert_event(cursor, dict(data, uid=uid))
+            return 'added'
+        cursor.execute("UPDATE events SET uid = ? WHERE id = ?", (uid, row['id']))
+    if all(row[field] == data.get(field) for field in SYNC_FIELDS):
+        return None
+    db._update_event(cursor, row['id'], data)
+    return 'updated'
+
+def _apply(conn, change_set: dict) -> dict:
+    """Áp dụng bộ thay đổi trong một transaction. Trả về số thay đổi {'added', 'updated', 'deleted', 'unchanged', 'failed'}."""
+    counts = {'added': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'failed': 0}
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        for change in change_set.get('changes', []):
+            try:
+                if change['op'] == 'delete':
+                    cursor.execute("DELETE FROM events WHERE uid = ?", (change['uid'],))
+                    counts['deleted' if cursor.rowcount else 'unchanged'] += 1
+                else:
+                    counts[_apply_upsert(cursor, change['uid'], change['event']) or 'unchanged'] += 1
+            except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+                print(f"Lỗi áp dụng thay đổi {change.get('seq')} ({change.get('uid')}): {e}")
+                counts['failed'] += 1
+        # Ghi nhớ mốc đã nhận để lần sau chỉ lấy các thay đổi mới hơn
+        if change_set.get('source'):
+            cursor.execute("""
+                INSERT INTO sync_peers (peer_uid, last_seq) VALUES (?, ?)
+                ON CONFLICT (peer_uid) DO UPDATE SET last_seq = MAX(last_seq, excluded.last_seq)
+            """, (change_set['source'], change_set.get('last_seq', 0)))
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return counts
+
+# --- API dùng với CSDL hiện tại (db.DB_NAME) ---
+
+def database_uid() -> str:
+    """Mã định danh của CSDL hiện tại."""
+    conn = db._connect()
+    uid = _database_uid(conn)
+    conn.close()
+    return uid
+
+def peer_seq(peer_uid: str) -> int:
+    """Seq cuối cùng đã nhận từ CSDL peer_uid (0 nếu chưa từng đồng bộ)."""
+    conn = db._connect()
+    seq = _peer_seq(conn, peer_uid)
+    conn.close()
+    return seq
+
+def export_changes_since(since_seq: int = 0) -> dict:
+    """Bộ thay đổi của CSDL hiện tại sau mốc since_seq (0: toàn bộ)."""
+    conn = db._connect()
+    try:
+        return _export(conn, since_seq)
+    finally:
+        conn.close()
+
+def apply_changes(change_set: dict) -> dict:
+    """Áp dụng bộ thay đổi (từ export_changes_since của CSDL khác) vào CSDL hiện tại."""
+    conn = db._connect()
+    try:
+        counts = _apply(conn, change_set)
+    finally:
+        conn.close()
+    if counts['added'] or counts['updated'] or counts['deleted']: db._notify('reset')
+    return counts
+
+def export_changes_file(file_path, since_seq: int = 0) -> dict:
+    change_set = export_changes_since(since_seq)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(change_set, f, ensure_ascii=False, indent=4)
+    return change_set
+
+def apply_changes_file(file_path) -> dict:
+    """Đọc bộ thay đổi từ file JSON. Báo ValueError nếu file không đúng định dạng."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        change_set = json.load(f)
+    if not isinstance(change_set, dict) or not isinstance(change_set.get('changes'), list):
+        raise ValueError("File thay đổi không đúng định dạng.")
+    return apply_changes(change_set)
+
+def sync_with(other_path: str) -> dict:
+    """
+    Đồng bộ hai chiều CSDL hiện tại với file CSDL khác: mỗi bên chỉ nhận các thay đổi
+    mà nó chưa nhận từ bên kia. Trả về {'pushed': số thay đổi gửi đi, 'pulled': số thay đổi nhận về}.
+    """
+    local = db._connect()
+    other = _open(other_path)
+    try:
+        local_uid, other_uid = _database_uid(local), _database_uid(other)
+        if local_uid == other_uid:
+            raise ValueError("Hai CSDL có cùng mã định danh (là cùng một file hoặc bản sao chép).")
+        pushed = _apply(other, _export(local, _peer_seq(other, local_uid)))
+        # Thay đổi vừa nhận ở bên kia cũng được ghi vào change_log của nó; khi gửi lại đây
+        # chúng trùng với dữ liệu hiện có nên được bỏ qua ('unchanged')
+        pulled = _apply(local, _export(other, _peer_seq(local, other_uid)))
+    finally:
+        local.close()
+        other.close()
+    if pulled['added'] or pulled['updated'] or pulled['deleted']: db._notify('reset')
+    return {'pushed': pushed, 'pulled': pulled}
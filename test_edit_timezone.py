@@ -0,0 +1,86 @@
+"""
+Kiểm tra sửa sự kiện có múi giờ khác múi giờ mặc định: form sửa (app.py) hiện và nhập giờ
+theo db.local_times, gửi kèm 'timezone' của sự kiện; lưu lại mà không đổi gì thì giờ
+sự kiện (epoch) không được lệch, và các lần đã bỏ qua (exdates) của chuỗi lặp được giữ.
+
+    python -m unittest test_edit_timezone
+
+Chạy trên CSDL tạm, không đụng tới schedule.db.
+"""
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+
+import database as db
+import time_utils as tu
+
+def _other_zone():
+    """Một múi giờ có độ lệch khác múi giờ mặc định."""
+    for zone in ("America/New_York", "Europe/Berlin", "Asia/Tokyo"):
+        if tu.utc_offset_minutes(tu.now_local(), zone) != tu.utc_offset_minutes(tu.now_local()):
+            return zone
+
+def _form_data(event, start, end):
+    """Dữ liệu save_changes gửi đi khi nhập start / end (giờ theo múi giờ của sự kiện)."""
+    return {
+        'event': event['event'],
+        'start_time': start.isoformat(),
+        'end_time': end.isoformat() if end else None,
+        'location': event['location'],
+        'reminder_offsets': db._reminder_offsets(event),
+        'recurrence': event['recurrence'],
+        'exdates': event['exdates'] if event['recurrence'] and start.isoformat() == event['start_time'] else None,
+        'timezone': event.get('timezone') or tu.TIMEZONE,
+    }
+
+class EditNonDefaultZoneTest(unittest.TestCase):
+    def setUp(self):
+        self.zone = _other_zone()
+        self._old_db_name = db.DB_NAME
+        self._tmpdir = tempfile.TemporaryDirectory()
+        db.DB_NAME = os.path.join(self._tmpdir.name, "test.db")
+        db.init_db(progress=lambda *a: None)
+        start = tu.now_local(self.zone).replace(hour=9, minute=0, second=0) + timedelta(days=7)
+        self.event_id = db.add_event({
+            'event': 'họp với đối tác',
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=1)).isoformat(),
+            'location': None,
+            'reminder_offsets': [15],
+            'recurrence': "FREQ=WEEKLY;COUNT=5",
+            'exdates': [(start + timedelta(weeks=1)).isoformat()],
+            'timezone': self.zone,
+        })
+
+    def tearDown(self):
+        db.DB_NAME = self._old_db_name
+        self._tmpdir.cleanup()
+
+    def test_unchanged_edit_keeps_time_and_exdates(self):
+        event = db.get_event(self.event_id)
+        start, end = db.local_times(event)
+        self.assertEqual(start.hour, 9)
+        db.update_event(self.event_id, _form_data(event, start, end))
+        edited = db.get_event(self.event_id)
+        self.assertEqual(edited['timezone'], self.zone)
+        self.assertEqual((edited['start_epoch'], edited['end_epoch']), (event['start_epoch'], event['end_epoch']))
+        self.assertEqual(edited['exdates'], event['exdates'])
+
+    def test_repeated_edits_do_not_drift(self):
+        event = db.get_event(self.event_id)
+        for _ in range(3):
+            current = db.get_event(self.event_id)
+            db.update_event(self.event_id, _form_data(current, *db.local_times(current)))
+        self.assertEqual(db.get_event(self.event_id)['start_epoch'], event['start_epoch'])
+
+    def test_changed_time_is_read_in_event_zone(self):
+        event = db.get_event(self.event_id)
+        start, end = db.local_times(event)
+        db.update_event(self.event_id, _form_data(event, start + timedelta(hours=1), end + timedelta(hours=1)))
+        edited = db.get_event(self.event_id)
+        self.assertEqual(edited['start_epoch'], event['start_epoch'] + 3600)
+        self.assertEqual(db.local_times(edited)[0].hour, 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+"""
+Kiểm tra chuỗi lặp hàng tuần đi qua mốc đổi giờ mùa hè: các lần xảy ra và mốc nhắc
+(bảng reminders) phải khớp với cách một lịch khác hiểu file ICS xuất ra
+(DTSTART;TZID + RRULE + EXDATE, độ lệch lấy từ VTIMEZONE).
+
+    python -m unittest test_recurrence_dst
+    SCHEDULE_TEST_TZ=America/New_York python -m unittest test_recurrence_dst
+
+Chạy trên CSDL tạm, không đụng tới schedule.db.
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import database as db
+import import_export
+import time_utils as tu
+
+ZONE = os.environ.get("SCHEDULE_TEST_TZ", "Europe/Berlin")
+OFFSET_MINUTES = 15
+COUNT = 8
+
+def _first_transition(zone, year):
+    """Ngày (giờ địa phương) của lần đổi độ lệch UTC đầu tiên trong năm, None nếu múi giờ không đổi giờ."""
+    tz = tu.get_zone(zone)
+    day = datetime(year, 1, 1)
+    offset = day.replace(tzinfo=tz).utcoffset()
+    while day.year == year:
+        day += timedelta(days=1)
+        if day.replace(tzinfo=tz).utcoffset() != offset:
+            return day - timedelta(days=1)
+    return None
+
+def _parse_ics_event(content):
+    """Các dòng của VEVENT đầu tiên và các VTIMEZONE: ({tên thuộc tính: (tham số, giá trị)}, {tzid: [(dtstart, offset)]})."""
+    props, zones, tzid, component = {}, {}, None, None
+    for line in content.split("\r\n"):
+        name, _, value = line.partition(":")
+        key, _, params = name.partition(";")
+        if key == "BEGIN":
+            component = value
+            if value in ("STANDARD", "DAYLIGHT"): observance = {}
+        elif key == "END":
+            if value in ("STANDARD", "DAYLIGHT"):
+                zones[tzid].append((datetime.strptime(observance["DTSTART"], "%Y%m%dT%H%M%S"), observance["TZOFFSETTO"]))
+            component = "VTIMEZONE" if value in ("STANDARD", "DAYLIGHT") else None
+        elif component == "VTIMEZONE" and key == "TZID":
+            tzid = value
+            zones[tzid] = []
+        elif component in ("STANDARD", "DAYLIGHT"):
+            observance[key] = value
+        elif component == "VEVENT":
+            props.setdefault(key, (params, value))
+    return props, zones
+
+def _vtimezone_offset(observances, local):
+    """Độ lệch (giây) tại giờ địa phương local theo các STANDARD / DAYLIGHT của VTIMEZONE."""
+    offset = max((o for o in observances if o[0] <= local), key=lambda o: o[0])[1]
+    sign = -1 if offset[0] == "-" else 1
+    return sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+
+def _expand_ics(content):
+    """
+    Tự khai triển chuỗi lặp trong ICS (không dùng recurrence.py): epoch của các lần xảy ra,
+    tính từ DTSTART;TZID, RRULE (FREQ=WEEKLY;COUNT), EXDATE và độ lệch của VTIMEZONE.
+    """
+    props, zones = _parse_ics_event(content)
+    params, value = props["DTSTART"]
+    tzid = params.split("=", 1)[1]
+    dtstart = datetime.strptime(value, "%Y%m%dT%H%M%S")
+    rule = dict(part.split("=") for part in props["RRULE"][1].split(";"))
+    assert rule["FREQ"] == "WEEKLY" and "BYDAY" not in rule, rule
+    interval = int(rule.get("INTERVAL", 1))
+    exdates = set()
+    if "EXDATE" in props:
+        exdates = {datetime.strptime(d, "%Y%m%dT%H%M%S") for d in props["EXDATE"][1].split(",")}
+    epochs = []
+    # COUNT tính cả các lần bị EXDATE loại bỏ (RFC 5545, mục 3.8.5.1)
+    for k in range(int(rule["COUNT"])):
+        local = dtstart + timedelta(weeks=k * interval)
+        if local in exdates: continue
+        utc = local.replace(tzinfo=timezone.utc) - timedelta(seconds=_vtimezone_offset(zones[tzid], local))
+        epochs.append(int(utc.timestamp()))
+    return tzid, epochs
+
+class WeeklySeriesAcrossDstTest(unittest.TestCase):
+    def setUp(self):
+        # Năm đủ xa để mọi lần xảy ra còn ở tương lai (mốc nhắc chỉ lập cho tương lai)
+        year = tu.now_local(ZONE).year + 2
+        transition = _first_transition(ZONE, year)
+        if transition is None:
+            self.skipTest(f"Múi giờ {ZONE} không đổi giờ trong năm {year}")
+        # Bắt đầu 3 tuần trước mốc đổi giờ, cùng thứ, 9h sáng: chuỗi đi qua mốc đổi giờ
+        start = (transition - timedelta(weeks=3)).replace(hour=9, minute=0)
+
+        self._old_db_name = db.DB_NAME
+        self._tmpdir = tempfile.TemporaryDirectory()
+        db.DB_NAME = os.path.join(self._tmpdir.name, "test.db")
+        db.init_db(progress=lambda *a: None)
+        self.event_id = db.add_event({
+            'event': 'họp tuần',
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(hours=1)).isoformat(),
+            'location': None,
+            'reminder_offsets': [OFFSET_MINUTES],
+            'recurrence': f"FREQ=WEEKLY;COUNT={COUNT}",
+            # Bỏ lần ngay sau mốc đổi giờ
+            'exdates': [(start + timedelta(weeks=3)).isoformat()],
+            'timezone': ZONE,
+        })
+        self.event = db.get_event(self.event_id)
+
+    def tearDown(self):
+        db.DB_NAME = self._old_db_name
+        self._tmpdir.cleanup()
+
+    def _reminder(self):
+        conn = sqlite3.connect(db.DB_NAME)
+        row = conn.execute("SELECT id, occurrence_epoch, remind_at, state FROM reminders WHERE event_id = ?",
+                           (self.event_id,)).fetchone()
+        conn.close()
+        return row
+
+    def test_ics_references_vtimezone(self):
+        content = import_export.generate_ics_content([self.event])
+        props, zones = _parse_ics_event(content)
+        self.assertEqual(props["DTSTART"][0], f"TZID={ZONE}")
+        self.assertIn(ZONE, zones)
+        # VTIMEZONE có cả hai độ lệch trước và sau mốc đổi giờ
+        self.assertGreaterEqual(len({offset for _, offset in zones[ZONE]}), 2)
+
+    def test_occurrences_match_ics_expansion(self):
+        _, expected = _expand_ics(import_export.generate_ics_content([self.event]))
+        self.assertEqual(len(expected), COUNT - 1)
+        # Khoảng xem tính theo múi giờ mặc định của ứng dụng
+        start = tu.from_epoch(self.event['start_epoch'])
+        occurrences = db.get_occurrences_between(self.event, start, start + timedelta(weeks=COUNT + 1))
+        self.assertEqual([occ['start_epoch'] for occ in occurrences], expected)
+        # Giờ trên đồng hồ giữ nguyên 9h dù độ lệch UTC đổi
+        self.assertEqual({tu.from_epoch(epoch, ZONE).hour for epoch in expected}, {9})
+        self.assertEqual(len({tu.utc_offset_minutes(tu.from_epoch(epoch, ZONE), ZONE) for epoch in expected}), 2)
+
+    def test_reminders_follow_ics_expansion(self):
+        _, expected = _expand_ics(import_export.generate_ics_content([self.event]))
+        seen = []
+        for _ in expected:
+            rid, occ_epoch, remind_at, state = self._reminder()
+            self.assertEqual(state, 'pending')
+            self.assertEqual(remind_at, occ_epoch - OFFSET_MINUTES * 60)
+            seen.append(occ_epoch)
+            # Đã nhắc -> mốc nhắc chuyển sang lần xảy ra kế tiếp
+            db.mark_as_reminded(self.event_id, tu.from_epoch(occ_epoch, ZONE).isoformat(), [rid])
+        self.assertEqual(seen, expected)
+        self.assertEqual(self._reminder()[3], 'sent')
+
+if __name__ == "__main__":
+    unittest.main()
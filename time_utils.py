@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# ==============================================================================
+# MÚI GIỜ (TIMEZONE)
+# Toàn bộ ứng dụng làm việc với "giờ địa phương" (datetime không kèm tzinfo)
+# theo một múi giờ IANA cấu hình được, và lưu trữ dưới dạng epoch (UTC).
+# Đổi múi giờ bằng biến môi trường SCHEDULE_TZ, VD: SCHEDULE_TZ=Europe/Berlin
+# ==============================================================================
+
+DEFAULT_TIMEZONE = "Asia/Ho_Chi_Minh"
+TIMEZONE = os.environ.get("SCHEDULE_TZ", DEFAULT_TIMEZONE)
+
+@lru_cache(maxsize=None)
+def _zone_info(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+def get_zone(name: str = None) -> ZoneInfo:
+    """Lấy đối tượng ZoneInfo (được cache, mỗi múi giờ chỉ tạo một lần).
+    Không có name thì dùng múi giờ mặc định hiện tại (đọc lại mỗi lần, vì set_timezone có thể đổi)."""
+    return _zone_info(name or TIMEZONE)
+
+def set_timezone(name: str):
+    """Đổi múi giờ mặc định của ứng dụng (báo lỗi nếu tên không hợp lệ)."""
+    global TIMEZONE
+    get_zone(name)
+    TIMEZONE = name
+
+def localize(value: datetime, tz: str = None) -> datetime:
+    """
+    Gắn múi giờ cho giờ địa phương.
+    Theo PEP 495 (fold=0): giờ không tồn tại khi chuyển sang giờ mùa hè (VD: 2:30)
+    được hiểu theo độ lệch cũ, tức dời về sau 1 tiếng; giờ bị lặp khi quay về
+    giờ chuẩn được hiểu là lần xuất hiện đầu tiên.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone(get_zone(tz))
+    return value.replace(tzinfo=get_zone(tz))
+
+def now_local(tz: str = None) -> datetime:
+    """Thời điểm hiện tại theo giờ địa phương của múi giờ (không kèm tzinfo)."""
+    return datetime.now(get_zone(tz)).replace(tzinfo=None, microsecond=0)
+
+def to_epoch(value, tz: str = None) -> int:
+    """Đổi chuỗi ISO hoặc datetime (giờ địa phương của múi giờ tz) sang epoch (giây)."""
+    if value is None: return None
+    if isinstance(value, str): value = datetime.fromisoformat(value)
+    return int(localize(value, tz).timestamp())
+
+def from_epoch(epoch: int, tz: str = None) -> datetime:
+    """Đổi epoch sang giờ địa phương của múi giờ tz (không kèm tzinfo)."""
+    if epoch is None: return None
+    return datetime.fromtimestamp(epoch, get_zone(tz)).replace(tzinfo=None)
+
+def utc_offset_minutes(value: datetime, tz: str = None) -> int:
+    """Độ lệch so với UTC (phút) tại thời điểm value, đã tính giờ mùa hè."""
+    return int(localize(value, tz).utcoffset().total_seconds() // 60)
+
+def to_utc(value: datetime, tz: str = None) -> datetime:
+    """Đổi giờ địa phương sang UTC (kèm tzinfo)."""
+    return localize(value, tz).astimezone(timezone.utc)
+
+def view_range(view_mode: str, now: datetime = None):
+    """Khoảng thời gian [start, end) theo chế độ xem: today / week / month.
+    Trả về None nếu xem tất cả ("all")."""
+    if view_mode == "all":
+        return None
+    if now is None: now = now_local()
+
+    today = datetime.combine(now.date(), datetime.min.time())
+    if view_mode == "today":
+        # Hôm nay
+        return today, today + timedelta(days=1)
+    elif view_mode == "week":
+        # Tuần này (Thứ 2 đến Chủ Nhật)
+        start_of_week = today - timedelta(days=today.weekday())
+        return start_of_week, start_of_week + timedelta(days=7)
+    elif view_mode == "month":
+        # Tháng này
+        start_of_month = today.replace(day=1)
+        next_month = (start_of_month + timedelta(days=32)).replace(day=1)
+        return start_of_month, next_month
+    return None